@@ -0,0 +1,130 @@
+"""
+Shared helpers for the benchmark scripts.
+
+The benchmarks run against throwaway SQLite databases so they can be run
+without a MySQL server. Run them from the repository root, e.g.
+`python -m benchmarks.load_home`.
+"""
+
+import os
+import statistics
+import tempfile
+from cryptography.fernet import Fernet
+
+
+def configure_env(database: str = "bench.db") -> None:
+    """
+    Provides the settings required by `src.settings.Settings` when they are
+    not already present in the environment or the `.env` file.
+
+    Unless `DATABASE_URL` is set, the benchmarks run on a fresh SQLite file.
+    Rate limiting is off unless `RATE_LIMIT_ENABLED` is set, so load scenarios
+    sending many logins from one client measure the routes, not 429s.
+
+    Args:
+        database (str): The file name of the SQLite database.
+    """
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+    os.environ.setdefault("SECRET_FERNET", Fernet.generate_key().decode())
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{sqlite_path(database)}")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+
+def sqlite_path(name: str) -> str:
+    """
+    Returns a fresh SQLite database path inside a temporary directory.
+
+    Args:
+        name (str): The file name of the database.
+
+    Returns:
+        str: The absolute path of the (not yet created) database file.
+    """
+    return os.path.join(tempfile.mkdtemp(prefix="pn-bench-"), name)
+
+
+def make_note(size: int, seed: int) -> str:
+    """
+    Builds a deterministic, text-like note body of roughly `size` characters.
+
+    Args:
+        size (int): The approximate length of the note.
+        seed (int): A number mixed into the text so notes differ.
+
+    Returns:
+        str: The note body.
+    """
+    words = (
+        "meeting notes idea project follow up remember call draft review "
+        "budget travel weekend reading list personal journal today tomorrow"
+    ).split()
+    out, i = [], seed
+    while sum(len(w) + 1 for w in out) < size:
+        out.append(words[i % len(words)])
+        i = i * 31 + 7
+    return " ".join(out)
+
+
+def seed_database(engine, users: int, notes_per_user: int, note_size: int) -> list:
+    """
+    Creates the schema and fills it with users and encrypted notes.
+
+    Args:
+        engine: A synchronous SQLAlchemy engine.
+        users (int): The number of users to create.
+        notes_per_user (int): The number of notes each user owns.
+        note_size (int): The approximate size of every note body.
+
+    Returns:
+        list: The usernames that were created.
+    """
+    from sqlmodel import SQLModel, Session
+    from src.db.models import DataDb, UserDb
+    from src.utils.utilities import FernetUtility
+
+    SQLModel.metadata.create_all(engine)
+    usernames = []
+    with Session(engine) as session:
+        for u in range(users):
+            user = UserDb(username=f"user{u}", password="not-a-real-hash")
+            session.add(user)
+            session.flush()
+            for n in range(notes_per_user):
+                content = FernetUtility.fernet_crypt(make_note(note_size, n))
+                session.add(
+                    DataDb(
+                        title=f"note {n}",
+                        content=content,
+                        user_id=user.id,
+                        content_length=len(content),
+                    )
+                )
+            usernames.append(user.username)
+        session.commit()
+    return usernames
+
+
+def summarize(samples: list) -> dict:
+    """
+    Summarizes latency samples (in seconds) as milliseconds.
+
+    Args:
+        samples (list): The measured latencies, in seconds.
+
+    Returns:
+        dict: Count, mean, p50, p95, p99 and max latency in milliseconds.
+    """
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
@@ -0,0 +1,104 @@
+"""
+Compares the JSON API with the HTML routes serving the same data, and the
+NDJSON stream with paging through the whole listing.
+
+    python -m benchmarks.api --notes 5000 --repeat 200
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from benchmarks._common import configure_env, seed_database, summarize
+
+configure_env("api.db")
+
+import httpx  # noqa: E402
+import orjson  # noqa: E402
+from src.main import app  # noqa: E402
+from src.db.database import ASYNC_ENGINE, ENGINE  # noqa: E402
+from src.utils.utilities import JWTUtility  # noqa: E402
+
+
+async def measure(client, url: str, repeat: int, headers: dict | None = None) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, (url, response.status_code)
+    return summarize(samples) | {"bytes": len(response.content)}
+
+
+async def all_pages(client) -> int:
+    notes, cursor = 0, None
+    while True:
+        url = "/api/v1/notes?limit=1000" + (f"&after={cursor}" if cursor else "")
+        page = (await client.get(url)).json()
+        notes += len(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return notes
+
+
+def encoders(payload: dict, repeat: int) -> dict:
+    results = {}
+    for label, dumps in (
+        ("json", lambda p: json.dumps(p).encode()),
+        ("orjson", orjson.dumps),
+    ):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            dumps(payload)
+            samples.append(time.perf_counter() - start)
+        results[label] = summarize(samples)
+    return results
+
+
+async def main(args) -> dict:
+    (username,) = seed_database(ENGINE, 1, args.notes, args.note_size)
+    access_token, _ = JWTUtility.create_tokens(username, 1)
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(
+        transport=transport,
+        base_url="http://bench",
+        cookies={"access_token": access_token},
+    ) as client:
+        for label, url in (
+            ("html_home", "/user/home"),
+            ("api_notes_page", "/api/v1/notes"),
+            ("html_note", "/user/home/content/note/1"),
+            ("api_note", "/api/v1/notes/1"),
+        ):
+            results[label] = await measure(client, url, args.repeat)
+
+        repeat = max(3, args.repeat // 20)
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            assert await all_pages(client) == args.notes
+            samples.append(time.perf_counter() - start)
+        results["api_all_pages"] = summarize(samples)
+        results["api_ndjson_titles"] = await measure(
+            client, "/api/v1/notes", repeat, {"Accept": "application/x-ndjson"}
+        )
+        results["api_ndjson_content"] = await measure(
+            client,
+            "/api/v1/notes?content=true",
+            repeat,
+            {"Accept": "application/x-ndjson"},
+        )
+        page = (await client.get("/api/v1/notes?limit=1000")).json()
+        results["encode_page"] = encoders(page, args.repeat)
+    await ASYNC_ENGINE.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=5_000)
+    parser.add_argument("--note-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
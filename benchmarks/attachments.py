@@ -0,0 +1,175 @@
+"""
+Measures attachment uploads, downloads and range requests through the API,
+and the peak memory they allocate (with `tracemalloc`), which should stay
+around a few chunks whatever the file size.
+
+    python -m benchmarks.attachments --size-mb 64 --ranges 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from benchmarks._common import configure_env, seed_database, summarize
+
+configure_env("attachments.db")
+os.environ.setdefault("ATTACHMENT_DIR", tempfile.mkdtemp(prefix="pn-chunks-"))
+
+import httpx  # noqa: E402
+from src.main import app  # noqa: E402
+from src.db.database import ASYNC_ENGINE, ENGINE  # noqa: E402
+from src.utils.attachments import ChunkStore  # noqa: E402
+from src.utils.utilities import JWTUtility  # noqa: E402
+
+PIECE = 256 * 1024
+
+
+async def body(size: int, seed: int):
+    """Yields `size` pseudo-random bytes without holding them all."""
+    generator = random.Random(seed)
+    for offset in range(0, size, PIECE):
+        yield generator.randbytes(min(PIECE, size - offset))
+
+
+def stored_bytes() -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(ChunkStore.DIRECTORY)
+        for name in names
+    )
+
+
+async def upload(client, size: int, seed: int) -> tuple[int, float]:
+    start = time.perf_counter()
+    response = await client.post(
+        "/api/v1/notes/1/attachments?filename=bench.bin", content=body(size, seed)
+    )
+    assert response.status_code == 201, response.status_code
+    return response.json()["id"], time.perf_counter() - start
+
+
+async def download(client, attachment_id: int) -> tuple[int, float]:
+    start, received = time.perf_counter(), 0
+    url = f"/api/v1/notes/1/attachments/{attachment_id}"
+    async with client.stream("GET", url) as response:
+        async for piece in response.aiter_bytes():
+            received += len(piece)
+    return received, time.perf_counter() - start
+
+
+async def asgi_download(attachment_id: int, access_token: str) -> int:
+    """
+    Downloads an attachment by calling the app directly, because
+    `httpx.ASGITransport` buffers whole response bodies.
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": f"/api/v1/notes/1/attachments/{attachment_id}",
+        "raw_path": b"",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"authorization", f"Bearer {access_token}".encode())],
+        "client": ("127.0.0.1", 5000),
+        "server": ("bench", 80),
+    }
+    received, requested = 0, False
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            # The client never disconnects.
+            await asyncio.Event().wait()
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return received
+
+
+async def peak_memory(call) -> int:
+    tracemalloc.start()
+    await call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+async def main(args) -> dict:
+    (username,) = seed_database(ENGINE, 1, 1, 100)
+    access_token, _ = JWTUtility.create_tokens(username, 1)
+    size = args.size_mb * 1024 * 1024
+    mb = size / 1024 / 1024
+    results = {}
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://bench",
+        headers={"Authorization": f"Bearer {access_token}"},
+        timeout=None,
+    ) as client:
+        attachment_id, elapsed = await upload(client, size, 1)
+        results["upload"] = {
+            "seconds": round(elapsed, 3),
+            "mb_per_s": round(mb / elapsed, 1),
+        }
+        results["stored_bytes_ratio"] = round(stored_bytes() / size, 4)
+
+        _, elapsed = await upload(client, size, 1)
+        results["duplicate_upload"] = {
+            "seconds": round(elapsed, 3),
+            "mb_per_s": round(mb / elapsed, 1),
+            "stored_bytes_ratio": round(stored_bytes() / size, 4),
+        }
+
+        received, elapsed = await download(client, attachment_id)
+        assert received == size
+        results["download"] = {
+            "seconds": round(elapsed, 3),
+            "mb_per_s": round(mb / elapsed, 1),
+        }
+
+        samples, generator = [], random.Random(2)
+        for _ in range(args.ranges):
+            first = generator.randrange(size - args.range_bytes)
+            start = time.perf_counter()
+            response = await client.get(
+                f"/api/v1/notes/1/attachments/{attachment_id}",
+                headers={"Range": f"bytes={first}-{first + args.range_bytes - 1}"},
+            )
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 206
+        results[f"range_{args.range_bytes}_bytes"] = summarize(samples)
+
+        results["peak_memory_mb"] = {
+            "upload": round(
+                await peak_memory(lambda: upload(client, size, 3)) / 2**20, 1
+            ),
+            "download": round(
+                await peak_memory(lambda: asgi_download(attachment_id, access_token))
+                / 2**20,
+                1,
+            ),
+            "file": round(mb, 1),
+        }
+    await ASYNC_ENGINE.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--ranges", type=int, default=200)
+    parser.add_argument("--range-bytes", type=int, default=64 * 1024)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,108 @@
+"""
+Measures the per-request cost of authenticating a request.
+
+Compares the claims-only `verify_cookies` with the previous lookup of the
+user through `AsyncUserSQL.get_user` (from `UserCache` and from the
+database), and the overhead of `TokenRefreshMiddleware` on a bare ASGI app
+with a valid token and when it has to rotate the tokens.
+
+    python -m benchmarks.auth --iterations 20000 --revoked 100000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from benchmarks._common import configure_env, seed_database, summarize
+
+configure_env("auth.db")
+
+from sqlmodel.ext.asyncio.session import AsyncSession  # noqa: E402
+from src.db.database import ASYNC_ENGINE, ENGINE, AsyncUserSQL  # noqa: E402
+from src.middleware import TokenRefreshMiddleware  # noqa: E402
+from src.routes.auth import verify_cookies  # noqa: E402
+from src.utils.cache import UserCache  # noqa: E402
+from src.utils.utilities import JWTUtility, RevokedTokens  # noqa: E402
+
+
+async def timed(call, iterations: int) -> dict:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def bare_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def asgi_request(app, cookie: str) -> None:
+    scope = {
+        "type": "http",
+        "path": "/user/home",
+        "headers": [(b"cookie", cookie.encode("latin-1"))],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def main(args) -> dict:
+    seed_database(ENGINE, 1, 0, 0)
+    for i in range(args.revoked):
+        RevokedTokens.TOKENS[f"revoked-{i}"] = time.time() + 3600
+
+    async with AsyncSession(ASYNC_ENGINE) as session:
+        user = await AsyncUserSQL.get_user("user0", session)
+        access_token, refresh_token = JWTUtility.create_tokens(user.username, user.id)
+
+        async def previous_cached():
+            claims = JWTUtility.decode_jwt(access_token)
+            await AsyncUserSQL.get_user(claims["sub"], session)
+
+        async def previous_database():
+            UserCache.invalidate("user0")
+            await previous_cached()
+
+        async def claims_only():
+            await verify_cookies(access_token=access_token)
+
+        results = {
+            "previous_user_cache_hit": await timed(previous_cached, args.iterations),
+            "previous_database": await timed(previous_database, args.iterations // 10),
+            "claims_only": await timed(claims_only, args.iterations),
+        }
+
+    middleware = TokenRefreshMiddleware(bare_app)
+    valid = f"access_token={access_token}; refresh_token={refresh_token}"
+    results["asgi_without_middleware"] = await timed(
+        lambda: asgi_request(bare_app, valid), args.iterations
+    )
+    results["asgi_middleware_valid_token"] = await timed(
+        lambda: asgi_request(middleware, valid), args.iterations
+    )
+
+    async def rotate():
+        nonlocal refresh_token
+        await asgi_request(middleware, f"refresh_token={refresh_token}")
+        _, refresh_token = JWTUtility.create_tokens(user.username, user.id)
+
+    results["asgi_middleware_refresh"] = await timed(rotate, args.iterations // 10)
+    results["revoked_tokens"] = len(RevokedTokens.TOKENS)
+    await ASYNC_ENGINE.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--revoked", type=int, default=100_000)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
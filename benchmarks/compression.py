@@ -0,0 +1,111 @@
+"""
+Measures stored size and encrypt/decrypt latency of note bodies with and
+without compression.
+
+The default corpus is generated: prose, lists and a few URLs and numbers, in
+sizes from a short reminder to a long journal entry. Pass `--corpus` with a
+directory of `.md`/`.txt` files to measure real notes instead.
+
+    python -m benchmarks.compression --notes 2000
+"""
+
+import argparse
+import json
+import pathlib
+import random
+import time
+from benchmarks._common import configure_env, summarize
+
+configure_env("compression.db")
+
+from src.utils.utilities import FernetUtility, settings  # noqa: E402
+
+TEXT = (
+    "Spent the morning going through the quarterly budget with the team and we "
+    "agreed to move the launch to the second week of next month because the "
+    "vendor still hasn't confirmed the delivery dates for the new hardware. "
+    "Remember to call the dentist, pick up groceries on the way home and send "
+    "the draft of the proposal to Laura before Friday. I finished reading the "
+    "book about habits; the chapter on environment design was the most useful "
+    "one, especially the idea of making the good option the easiest one. "
+    "Ideas for the trip: rent a car at the airport, stay two nights near the "
+    "lake, check whether the museum is open on Mondays, book the train back."
+).split()
+SIZES = [80, 200, 500, 1_000, 2_000, 5_000, 20_000]
+
+
+def generate_note(rng: random.Random) -> str:
+    size = rng.choice(SIZES)
+    lines = []
+    while sum(len(line) + 1 for line in lines) < size:
+        kind = rng.random()
+        if kind < 0.15:
+            lines.append(f"- [ ] {' '.join(rng.choices(TEXT, k=rng.randint(3, 8)))}")
+        elif kind < 0.2:
+            lines.append(f"https://example.com/{rng.getrandbits(48):x}")
+        elif kind < 0.25:
+            lines.append(
+                f"{rng.randint(1, 28)}/{rng.randint(1, 12)}: ${rng.uniform(5, 900):.2f}"
+            )
+        else:
+            start = rng.randrange(len(TEXT) - 30)
+            lines.append(" ".join(TEXT[start : start + rng.randint(8, 30)]))
+    return "\n".join(lines)
+
+
+def load_corpus(path: str | None, notes: int) -> list[str]:
+    if path:
+        files = sorted(pathlib.Path(path).rglob("*"))
+        return [
+            file.read_text("utf-8")
+            for file in files
+            if file.suffix in {".md", ".txt"} and file.is_file()
+        ]
+    rng = random.Random(42)
+    return [generate_note(rng) for _ in range(notes)]
+
+
+def measure(corpus: list[str]) -> dict:
+    tokens, encrypt, decrypt = [], [], []
+    for note in corpus:
+        start = time.perf_counter()
+        tokens.append(FernetUtility.fernet_crypt(note))
+        encrypt.append(time.perf_counter() - start)
+    for token, note in zip(tokens, corpus):
+        start = time.perf_counter()
+        assert FernetUtility.fernet_decrypt(token) == note
+        decrypt.append(time.perf_counter() - start)
+    plaintext = sum(len(note.encode("utf-8")) for note in corpus)
+    stored = sum(len(token) for token in tokens)
+    return {
+        "stored_bytes": stored,
+        "stored_to_plaintext": round(stored / plaintext, 3),
+        "encrypt": summarize(encrypt),
+        "decrypt": summarize(decrypt),
+    }
+
+
+def main(args) -> dict:
+    corpus = load_corpus(args.corpus, args.notes)
+    results = {
+        "notes": len(corpus),
+        "plaintext_bytes": sum(len(note.encode("utf-8")) for note in corpus),
+    }
+    settings.NOTE_COMPRESSION = False
+    results["uncompressed"] = measure(corpus)
+    legacy = [FernetUtility.cypher.encrypt(note.encode("utf-8")) for note in corpus]
+    settings.NOTE_COMPRESSION = True
+    for level in args.levels:
+        settings.NOTE_COMPRESSION_LEVEL = level
+        results[f"zlib_{level}"] = measure(corpus)
+    # Rows written before the payload header existed must still decrypt.
+    assert [FernetUtility.fernet_decrypt(token) for token in legacy] == corpus
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=2_000)
+    parser.add_argument("--corpus", help="Directory of .md/.txt notes to use.")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9])
+    print(json.dumps(main(parser.parse_args()), indent=2))
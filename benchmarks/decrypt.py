@@ -0,0 +1,58 @@
+"""
+Compares decrypting batches of notes one by one with the batch API of
+`FernetUtility`, which spreads large batches across a thread pool.
+
+    python -m benchmarks.decrypt --sizes 1 10 1000 10000 --note-size 2000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from benchmarks._common import configure_env, make_note, summarize
+
+configure_env("decrypt.db")
+
+from src.utils.utilities import FernetUtility  # noqa: E402
+
+
+def serial(tokens: list[bytes]) -> list[str]:
+    return [FernetUtility.fernet_decrypt(token) for token in tokens]
+
+
+async def time_call(call, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = call()
+        if asyncio.iscoroutine(result):
+            result = await result
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def main(args) -> dict:
+    results = {}
+    for size in args.sizes:
+        # Distinct ciphertexts, but only a hundred distinct bodies to build.
+        notes = [make_note(args.note_size, n) for n in range(min(size, 100))]
+        tokens = [
+            FernetUtility.fernet_crypt(notes[n % len(notes)]) for n in range(size)
+        ]
+        assert await FernetUtility.fernet_decrypt_batch(tokens) == serial(tokens)
+        repeat = max(3, min(args.repeat, 20_000 // size))
+        results[str(size)] = {
+            "serial": await time_call(lambda: serial(tokens), repeat),
+            "batch": await time_call(
+                lambda: FernetUtility.fernet_decrypt_batch(tokens), repeat
+            ),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 1_000, 10_000])
+    parser.add_argument("--note-size", type=int, default=2_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,85 @@
+"""
+Compares note creation with one commit per note and with group commits of
+several windows, under concurrent `POST /api/v1/notes` requests.
+
+Run it against the production database engine (`DATABASE_URL`) for
+realistic numbers: the gain comes from saving durable commits, whose cost
+depends on the storage.
+
+    python -m benchmarks.group_commit --notes 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from benchmarks._common import configure_env, make_note, seed_database, summarize
+
+configure_env("group_commit.db")
+
+import httpx  # noqa: E402
+from src.main import app  # noqa: E402
+from src.db.database import ASYNC_ENGINE, ENGINE  # noqa: E402
+from src.db.groupcommit import NOTE_WRITER  # noqa: E402
+from src.utils.utilities import JWTUtility, settings  # noqa: E402
+
+
+async def burst(client, notes: int, concurrency: int, note_size: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/v1/notes",
+                json={"title": f"note {i}", "content": make_note(note_size, i % 100)},
+            )
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 201, response.status_code
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(notes)))
+    elapsed = time.perf_counter() - start
+    return summarize(samples) | {"notes_per_second": round(notes / elapsed, 1)}
+
+
+async def main(args) -> dict:
+    (username,) = seed_database(ENGINE, 1, 0, 0)
+    access_token, _ = JWTUtility.create_tokens(username, 1)
+    results = {}
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://bench",
+        headers={"Authorization": f"Bearer {access_token}"},
+    ) as client:
+        settings.GROUP_COMMIT_ENABLED = False
+        results["commit_per_note"] = await burst(
+            client, args.notes, args.concurrency, args.note_size
+        )
+        settings.GROUP_COMMIT_ENABLED = True
+        for window in args.windows:
+            NOTE_WRITER.window = window
+            batches, rows = NOTE_WRITER.batches, NOTE_WRITER.rows
+            result = await burst(client, args.notes, args.concurrency, args.note_size)
+            result["mean_batch"] = round(
+                (NOTE_WRITER.rows - rows) / (NOTE_WRITER.batches - batches), 1
+            )
+            results[f"group_commit_{window * 1000:g}ms"] = result
+    await ASYNC_ENGINE.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--note-size", type=int, default=500)
+    parser.add_argument(
+        "--windows",
+        type=float,
+        nargs="+",
+        default=[0.001, 0.005, 0.02],
+        help="Group commit windows to compare, in seconds.",
+    )
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
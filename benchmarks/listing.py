@@ -0,0 +1,56 @@
+"""
+Compares the homepage listing paths for a user with many notes.
+
+`get_data` loads and decrypts every note body, `get_titles` only selects the
+ids and titles.
+
+    python -m benchmarks.listing --notes 10000 --note-size 2000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from benchmarks._common import configure_env, seed_database, summarize
+
+configure_env("listing.db")
+
+from sqlmodel.ext.asyncio.session import AsyncSession  # noqa: E402
+from src.db.database import (  # noqa: E402
+    ASYNC_ENGINE,
+    ENGINE,
+    AsyncDataSQL,
+    AsyncUserSQL,
+)
+
+
+async def main(args) -> dict:
+    seed_database(ENGINE, 1, args.notes, args.note_size)
+
+    async with AsyncSession(ASYNC_ENGINE) as session:
+        user = await AsyncUserSQL.get_user("user0", session)
+        paths = {
+            "get_data": lambda: AsyncDataSQL.get_data(user.username, session),
+            "get_titles": lambda: AsyncDataSQL.get_titles(user.id, session),
+        }
+        results = {}
+        for label, call in paths.items():
+            await call()
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                rows = await call()
+                samples.append(time.perf_counter() - start)
+            results[label] = summarize(samples)
+            results[label]["rows"] = len(rows)
+            results[label]["payload_bytes"] = len(json.dumps(rows))
+    await ASYNC_ENGINE.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=10_000)
+    parser.add_argument("--note-size", type=int, default=2_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
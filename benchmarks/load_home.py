@@ -0,0 +1,94 @@
+"""
+Load test for `/user/home` with many concurrent requests.
+
+Compares the async handler against the previous pattern, where an `async def`
+handler called the synchronous `DataSQL` on a blocking `Session`. The old
+pattern is reproduced on a benchmark-only route so both run in one process
+against the same database (a fresh SQLite file unless `DATABASE_URL` is set).
+
+    python -m benchmarks.load_home --users 20 --notes 200 --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from benchmarks._common import configure_env, seed_database, summarize
+
+configure_env("load_home.db")
+
+import httpx  # noqa: E402
+from typing import Annotated  # noqa: E402
+from fastapi import Depends, Request  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+from src.main import app  # noqa: E402
+from src.db.database import ASYNC_ENGINE, ENGINE, DataSQL, get_session  # noqa: E402
+from src.db.models import UserDb  # noqa: E402
+from src.routes.auth import verify_cookies  # noqa: E402
+from src.utils.utilities import JWTUtility, TEMPLATES  # noqa: E402
+
+
+async def run_load(client, url: str, cookies: list, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(url, cookies=cookies[i % len(cookies)])
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    result = summarize(samples)
+    result["requests_per_second"] = round(total / elapsed, 1)
+    return result
+
+
+async def main(args) -> dict:
+    usernames = seed_database(ENGINE, args.users, args.notes, args.note_size)
+
+    @app.get("/bench/blocking-home")
+    async def blocking_home(
+        request: Request,
+        current_user: Annotated[UserDb, Depends(verify_cookies)],
+        session: Annotated[Session, Depends(get_session)],
+    ):
+        result = DataSQL.get_data(username=current_user.username, session=session)
+        return TEMPLATES.TemplateResponse(
+            "C_homepage.html",
+            {"request": request, "user": current_user, "items": result},
+        )
+
+    # seed_database creates the users in order, with ids starting at 1.
+    cookies = [
+        {"access_token": JWTUtility.create_tokens(name, user_id)[0]}
+        for user_id, name in enumerate(usernames, start=1)
+    ]
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for label, url in (
+            ("blocking", "/bench/blocking-home"),
+            ("async", "/user/home"),
+        ):
+            await run_load(client, url, cookies, args.concurrency, args.concurrency)
+            results[label] = await run_load(
+                client, url, cookies, args.requests, args.concurrency
+            )
+    await ASYNC_ENGINE.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--notes", type=int, default=100)
+    parser.add_argument("--note-size", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
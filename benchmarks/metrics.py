@@ -0,0 +1,74 @@
+"""
+Measures the overhead of the instrumentation: one histogram observation, an
+instrumented call against the plain function, and `MetricsMiddleware` around
+a bare ASGI app.
+
+    python -m benchmarks.metrics --iterations 200000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from benchmarks._common import configure_env
+
+configure_env("metrics.db")
+
+from src.middleware import MetricsMiddleware  # noqa: E402
+from src.utils.metrics import CALLS, _timed_function, render  # noqa: E402
+
+
+def per_call_ns(call, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call()
+    return round((time.perf_counter() - start) / iterations * 1e9, 1)
+
+
+async def per_request_ns(app, iterations: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await app(dict(scope), receive, send)
+    return round((time.perf_counter() - start) / iterations * 1e9, 1)
+
+
+async def bare_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def plain() -> None:
+    pass
+
+
+async def main(args) -> dict:
+    instrumented = _timed_function(plain, "bench", "plain")
+    results = {
+        "observe_ns": per_call_ns(
+            lambda: CALLS.observe(("bench", "observe"), 0.001), args.iterations
+        ),
+        "plain_call_ns": per_call_ns(plain, args.iterations),
+        "instrumented_call_ns": per_call_ns(instrumented, args.iterations),
+        "bare_asgi_ns": await per_request_ns(bare_app, args.iterations // 10),
+        "metrics_middleware_ns": await per_request_ns(
+            MetricsMiddleware(bare_app), args.iterations // 10
+        ),
+    }
+    start = time.perf_counter()
+    render()
+    results["render_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200_000)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
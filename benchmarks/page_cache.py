@@ -0,0 +1,69 @@
+"""
+Measures the bytes transferred and the latency of a first and a repeat load
+of `/user/home` and its stylesheet, the repeat load sending the ETags of the
+first one as a browser does.
+
+    python -m benchmarks.page_cache --notes 200 --repeat 200
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import time
+from benchmarks._common import configure_env, seed_database, summarize
+
+configure_env("page_cache.db")
+
+import httpx  # noqa: E402
+from src.main import app  # noqa: E402
+from src.db.database import ASYNC_ENGINE, ENGINE  # noqa: E402
+from src.utils.utilities import JWTUtility  # noqa: E402
+
+
+async def load(client, url: str, etag: str | None) -> tuple[httpx.Response, int]:
+    headers = {"Accept-Encoding": "gzip, br"}
+    if etag:
+        headers["If-None-Match"] = etag
+    response = await client.get(url, headers=headers)
+    # Bytes on the wire, before httpx decompresses the body.
+    return response, int(response.headers.get("content-length", 0))
+
+
+async def main(args) -> dict:
+    (username,) = seed_database(ENGINE, 1, args.notes, 200)
+    access_token, _ = JWTUtility.create_tokens(username, 1)
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(
+        transport=transport,
+        base_url="http://bench",
+        cookies={"access_token": access_token},
+    ) as client:
+        page, _ = await load(client, "/user/home", None)
+        stylesheet = re.search(r'href="([^"]+\.css)"', page.text).group(1)
+        etags = {}
+        for label, url in (("page", "/user/home"), ("stylesheet", stylesheet)):
+            for visit in ("first", "repeat"):
+                samples, transferred = [], 0
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    response, transferred = await load(
+                        client, url, etags.get(url) if visit == "repeat" else None
+                    )
+                    samples.append(time.perf_counter() - start)
+                etags[url] = response.headers["etag"]
+                results[f"{label}_{visit}"] = summarize(samples) | {
+                    "status": response.status_code,
+                    "bytes": transferred,
+                    "cache_control": response.headers["cache-control"],
+                }
+    await ASYNC_ENGINE.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,137 @@
+"""
+Measures the cost of the login rate limiting.
+
+Reports the latency and memory per key of `LocalRateLimitBackend.take`, the
+overhead of `RateLimitMiddleware` on an allowed login (reading and parsing
+the form) over a bare ASGI app, and the latency of a rejected login compared
+to a login that runs bcrypt.
+
+    python -m benchmarks.ratelimit --keys 100000 --iterations 20000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from benchmarks._common import configure_env, seed_database, summarize
+
+configure_env("ratelimit.db")
+
+import httpx  # noqa: E402
+from sqlmodel import update  # noqa: E402
+from src.main import app  # noqa: E402
+from src.db.database import ASYNC_ENGINE, ENGINE  # noqa: E402
+from src.db.models import UserDb  # noqa: E402
+from src.middleware import RateLimitMiddleware  # noqa: E402
+from src.utils.ratelimit import LocalRateLimitBackend, RateLimiter  # noqa: E402
+from src.utils.utilities import PWD, settings  # noqa: E402
+
+PASSWORD = "benchmark-password"
+
+
+def backend(keys: int) -> dict:
+    store = LocalRateLimitBackend(max_keys=keys)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    samples = []
+    for i in range(keys):
+        key = f"ip:10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"
+        start = time.perf_counter()
+        store.take(key, 1, 30)
+        samples.append(time.perf_counter() - start)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return summarize(samples) | {"bytes_per_key": round(used / keys)}
+
+
+async def bare_app(scope, receive, send):
+    while (await receive()).get("more_body"):
+        pass
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def asgi_login(asgi, username: str) -> int:
+    body = f"username={username}&password={PASSWORD}".encode()
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/token",
+        "client": ("127.0.0.1", 5000),
+        "headers": [
+            (b"content-type", b"application/x-www-form-urlencoded"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await asgi(scope, receive, send)
+    return status
+
+
+async def middleware(iterations: int) -> dict:
+    results = {}
+    for label, asgi in (
+        ("bare_app", bare_app),
+        ("rate_limited_app", RateLimitMiddleware(bare_app)),
+    ):
+        samples = []
+        for i in range(iterations):
+            start = time.perf_counter()
+            assert await asgi_login(asgi, f"user{i}") == 200
+            samples.append(time.perf_counter() - start)
+        results[label] = summarize(samples)
+    return results
+
+
+async def rejection(attempts: int) -> dict:
+    (username,) = seed_database(ENGINE, 1, 0, 0)
+    with ENGINE.begin() as connection:
+        connection.execute(update(UserDb).values(password=PWD.hash(PASSWORD)))
+    data = {"username": username, "password": PASSWORD}
+    results = {}
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench"
+    ) as client:
+        for label, status in (("allowed_login", 302), ("rejected_login", 429)):
+            samples = []
+            for _ in range(attempts):
+                start = time.perf_counter()
+                response = await client.post("/token", data=data)
+                samples.append(time.perf_counter() - start)
+                assert response.status_code == status, response.status_code
+            results[label] = summarize(samples)
+            # Empties the username's bucket for the rejected logins.
+            RateLimiter.set_backend(LocalRateLimitBackend(max_keys=10))
+            settings.RATE_LIMIT_USER_RATE = 1e-9
+            settings.RATE_LIMIT_USER_BURST = 0
+    await ASYNC_ENGINE.dispose()
+    return results
+
+
+async def main(args) -> dict:
+    settings.RATE_LIMIT_ENABLED = True
+    settings.RATE_LIMIT_IP_RATE = settings.RATE_LIMIT_USER_RATE = 1e9
+    settings.RATE_LIMIT_IP_BURST = settings.RATE_LIMIT_USER_BURST = 10**9
+    return {
+        "backend_take": backend(args.keys),
+        "middleware": await middleware(args.iterations),
+        "login": await rejection(args.logins),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--logins", type=int, default=10)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
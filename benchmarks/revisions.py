@@ -0,0 +1,129 @@
+"""
+Measures the note revisions on one note edited many times: storage against
+a full snapshot per revision, update latency with revisions on and off,
+reconstruction latency across the history, history listing and compaction.
+
+    python -m benchmarks.revisions --edits 1000 --lines 200
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from benchmarks._common import configure_env, seed_database, summarize
+
+configure_env("revisions.db")
+
+import httpx  # noqa: E402
+from sqlalchemy import Integer, func, select  # noqa: E402
+from src.main import app  # noqa: E402
+from src.db.database import ASYNC_ENGINE, ENGINE  # noqa: E402
+from src.db.models import RevisionDb  # noqa: E402
+from src.db.revisions import compact  # noqa: E402
+from src.utils.utilities import FernetUtility, JWTUtility, settings  # noqa: E402
+
+
+def edit(lines: list[str], rng: random.Random, i: int) -> None:
+    """Applies a typical small edit: changes, inserts or deletes a line."""
+    action, index = rng.random(), rng.randrange(len(lines))
+    if action < 0.6:
+        lines[index] = f"edit {i}: " + "lorem ipsum " * rng.randrange(1, 8)
+    elif action < 0.85 or len(lines) < 10:
+        lines.insert(index, f"added {i}: " + "dolor sit " * rng.randrange(1, 8))
+    else:
+        del lines[index]
+
+
+async def edits(client, note_id: int, version: int, count: int, lines, rng) -> tuple:
+    samples, texts = [], {}
+    for i in range(count):
+        edit(lines, rng, i)
+        content = "\n".join(lines)
+        start = time.perf_counter()
+        response = await client.put(
+            f"/api/v1/notes/{note_id}",
+            json={"title": f"note {i % 5}", "content": content, "version": version},
+        )
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+        version = response.json()["version"]
+        texts[version] = content
+    return samples, texts, version
+
+
+async def main(args) -> dict:
+    (username,) = seed_database(ENGINE, 1, 0, 0)
+    access_token, _ = JWTUtility.create_tokens(username, 1)
+    rng = random.Random(7)
+    lines = [
+        f"line {i}: " + "lorem ipsum " * rng.randrange(1, 8) for i in range(args.lines)
+    ]
+    results = {}
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://bench",
+        headers={"Authorization": f"Bearer {access_token}"},
+    ) as client:
+        for enabled in (False, True):
+            response = await client.post(
+                "/api/v1/notes", json={"title": "note", "content": "\n".join(lines)}
+            )
+            note_id = response.json()["id"]
+            settings.REVISIONS_ENABLED = enabled
+            samples, texts, version = await edits(
+                client, note_id, 1, args.edits, list(lines), random.Random(11)
+            )
+            key = "update_with_revisions" if enabled else "update_without_revisions"
+            results[key] = summarize(samples)
+
+        # Every stored version but the head, which stays in `datadb`.
+        texts = {1: "\n".join(lines)} | texts
+        texts.pop(version)
+        with ENGINE.connect() as connection:
+            stored, snapshots = connection.execute(
+                select(
+                    func.sum(RevisionDb.payload_length),
+                    func.sum(RevisionDb.is_snapshot, type_=Integer),
+                ).where(RevisionDb.note_id == note_id)
+            ).one()
+        full = sum(len(FernetUtility.fernet_crypt(text)) for text in texts.values())
+        results["storage"] = {
+            "revisions": len(texts),
+            "snapshots": int(snapshots),
+            "stored_bytes": int(stored),
+            "full_snapshot_bytes": full,
+            "ratio": round(full / stored, 1),
+        }
+
+        samples, mismatches = [], 0
+        for revision in rng.sample(sorted(texts), min(args.reads, len(texts))):
+            start = time.perf_counter()
+            response = await client.get(f"/api/v1/notes/{note_id}/revisions/{revision}")
+            samples.append(time.perf_counter() - start)
+            mismatches += response.json()["content"] != texts[revision]
+        results["reconstruct"] = summarize(samples) | {"mismatches": mismatches}
+
+        samples = []
+        for _ in range(50):
+            start = time.perf_counter()
+            response = await client.get(f"/api/v1/notes/{note_id}/revisions")
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200
+        results["history_listing"] = summarize(samples)
+
+    results["compaction"] = compact(
+        ENGINE, keep_last=args.keep_last, keep_days=0, chain_max=args.chain_max
+    )
+    await ASYNC_ENGINE.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--edits", type=int, default=1_000)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--keep-last", type=int, default=100)
+    parser.add_argument("--chain-max", type=int, default=20)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,107 @@
+"""
+Benchmarks the encrypted search index against decrypting and scanning notes.
+
+    python -m benchmarks.search --notes 100000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from benchmarks._common import configure_env, summarize
+
+configure_env("search.db")
+
+from sqlalchemy import insert  # noqa: E402
+from sqlmodel import SQLModel, Session, select  # noqa: E402
+from sqlmodel.ext.asyncio.session import AsyncSession  # noqa: E402
+from src.db.database import ASYNC_ENGINE, ENGINE, AsyncSearchSQL  # noqa: E402
+from src.db.models import DataDb, SearchTokenDb, UserDb  # noqa: E402
+from src.utils.search import note_tokens, words  # noqa: E402
+from src.utils.utilities import FernetUtility  # noqa: E402
+
+SYLLABLES = "ka lo mi ter van su pre dor al ben qui fa ro nel tis gu".split()
+
+
+def vocabulary(size: int, rng: random.Random) -> list[str]:
+    return [
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        for _ in range(size)
+    ]
+
+
+def seed(notes: int, words_per_note: int, vocab: list[str], rng: random.Random):
+    SQLModel.metadata.create_all(ENGINE)
+    with Session(ENGINE) as session:
+        user = UserDb(username="searcher", password="not-a-real-hash")
+        session.add(user)
+        session.commit()
+        for start in range(0, notes, 1000):
+            batch = []
+            for _ in range(min(1000, notes - start)):
+                text = " ".join(rng.choice(vocab) for _ in range(words_per_note))
+                batch.append((text, FernetUtility.fernet_crypt(text)))
+            rows = [
+                DataDb(title="note", content=c, user_id=user.id, content_length=len(c))
+                for _, c in batch
+            ]
+            session.add_all(rows)
+            session.flush()
+            tokens = [
+                {"user_id": user.id, "token": token, "note_id": row.id}
+                for row, (text, _) in zip(rows, batch)
+                for token in note_tokens(user.id, text)
+            ]
+            session.execute(insert(SearchTokenDb), tokens)
+            session.commit()
+        return user.id
+
+
+async def scan(user_id: int, query: str, session) -> list[int]:
+    terms = words(query)
+    statement = select(DataDb.id, DataDb.content).where(DataDb.user_id == user_id)
+    return [
+        row.id
+        for row in (await session.exec(statement)).all()
+        if terms <= words(FernetUtility.fernet_decrypt(row.content))
+    ]
+
+
+async def main(args) -> dict:
+    rng = random.Random(42)
+    vocab = vocabulary(args.vocabulary, rng)
+    started = time.perf_counter()
+    user_id = seed(args.notes, args.words, vocab, rng)
+    results = {"seed_seconds": round(time.perf_counter() - started, 2)}
+    queries = {
+        "term": vocab[0],
+        "two_terms": f"{vocab[1]} {vocab[2]}",
+        "prefix": f"{vocab[3][:4]}*",
+    }
+    async with AsyncSession(ASYNC_ENGINE) as session:
+        for label, query in queries.items():
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                found = await AsyncSearchSQL.search(user_id, query, session, limit=50)
+                samples.append(time.perf_counter() - start)
+            results[f"index_{label}"] = summarize(samples) | {"matches": len(found)}
+        if not args.skip_scan:
+            start = time.perf_counter()
+            found = await scan(user_id, queries["term"], session)
+            results["scan_term"] = summarize([time.perf_counter() - start]) | {
+                "matches": len(found)
+            }
+    await ASYNC_ENGINE.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--words", type=int, default=40)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-scan", action="store_true")
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,197 @@
+"""
+Runs the application on several SQLite files standing in for shards: creates
+users and notes through the routed code paths, reports how they spread over
+the shards, checks that ids are unique across shards and that every user
+only sees their own notes, then moves a user to another shard while they
+keep reading and writing, and checks the moved data.
+
+    python -m benchmarks.sharding --users 200 --notes 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from benchmarks._common import configure_env, make_note, sqlite_path, summarize
+
+SHARDS = 4
+
+configure_env("shard0.db")
+os.environ.setdefault(
+    "SHARD_URLS",
+    ",".join(f"sqlite:///{sqlite_path(f'shard{i}.db')}" for i in range(1, SHARDS)),
+)
+os.environ.setdefault("SHARD_DIRECTORY_TTL", "0.5")
+
+import httpx  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from sqlmodel.ext.asyncio.session import AsyncSession  # noqa: E402
+from src.main import app  # noqa: E402
+from src.db.database import ASYNC_ENGINE, AsyncUserSQL  # noqa: E402
+from src.db.models import DataDb  # noqa: E402
+from src.db.shards import (  # noqa: E402
+    ShardedSession,
+    ShardRouter,
+    move_user,
+    prepare,
+    shard_status,
+)
+from src.utils.utilities import JWTUtility, settings  # noqa: E402
+
+
+async def create_user(username: str) -> str:
+    # Each call runs in its own task, so its route doesn't leak to the others.
+    async with AsyncSession(
+        ASYNC_ENGINE, expire_on_commit=False, sync_session_class=ShardedSession
+    ) as session:
+        user = await AsyncUserSQL.add_user(username, "not-a-real-hash", session)
+    access_token, _ = JWTUtility.create_tokens(user.username, user.id)
+    return access_token
+
+
+def headers(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def timed(samples: list, request):
+    start = time.perf_counter()
+    response = await request
+    samples.append(time.perf_counter() - start)
+    return response
+
+
+async def load(client, tokens: dict, notes: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    writes, reads = [], []
+
+    async def one(username: str, i: int):
+        async with semaphore:
+            response = await timed(
+                writes,
+                client.post(
+                    "/api/v1/notes",
+                    json={"title": f"{username} {i}", "content": make_note(300, i)},
+                    headers=headers(tokens[username]),
+                ),
+            )
+            assert response.status_code == 201, response.text
+
+    await asyncio.gather(*(one(u, i) for u in tokens for i in range(notes)))
+
+    async def listing(username: str):
+        async with semaphore:
+            response = await timed(
+                reads,
+                client.get(
+                    "/api/v1/notes?limit=100", headers=headers(tokens[username])
+                ),
+            )
+            items = response.json()["items"]
+            # Every user sees their own notes only.
+            assert len(items) == notes, (username, len(items))
+            assert all(item["title"].startswith(f"{username} ") for item in items)
+
+    await asyncio.gather(*(listing(u) for u in tokens))
+    return {"create_note": summarize(writes), "list_notes": summarize(reads)}
+
+
+def check_ids() -> dict:
+    ids = []
+    for shard in ShardRouter.SHARDS:
+        with shard.engine.connect() as connection:
+            shard_ids = connection.execute(select(DataDb.id)).scalars().all()
+        residues = {note_id % settings.SHARD_ID_STRIDE for note_id in shard_ids}
+        assert residues <= {shard.index + 1}, (shard.index, residues)
+        ids += shard_ids
+    assert len(ids) == len(set(ids))
+    return {"notes": len(ids), "unique_ids": len(set(ids))}
+
+
+async def move_while_used(client, username: str, token: str, settle: float) -> dict:
+    source = ShardRouter.hash_shard(username)
+    target = (source + 1) % len(ShardRouter.SHARDS)
+    listing = await client.get("/api/v1/notes?limit=100", headers=headers(token))
+    before = {item["id"]: item for item in listing.json()["items"]}
+    note_id = next(iter(before))
+    note = await client.get(f"/api/v1/notes/{note_id}", headers=headers(token))
+    version = note.json()["version"]
+    counts = {"reads": 0, "read_errors": 0, "writes": 0, "writes_refused": 0}
+    done = asyncio.Event()
+
+    async def use():
+        nonlocal version
+        while not done.is_set():
+            response = await client.get(
+                f"/api/v1/notes/{note_id}", headers=headers(token)
+            )
+            counts["reads"] += 1
+            counts["read_errors"] += response.status_code != 200
+            response = await client.put(
+                f"/api/v1/notes/{note_id}",
+                json={
+                    "title": "moving",
+                    "content": f"edit {version}",
+                    "version": version,
+                },
+                headers=headers(token),
+            )
+            if response.status_code == 503:
+                counts["writes_refused"] += 1
+            else:
+                assert response.status_code == 200, response.text
+                counts["writes"] += 1
+                version = response.json()["version"]
+            await asyncio.sleep(0.01)
+
+    user = asyncio.ensure_future(use())
+    started = time.perf_counter()
+    summary = await asyncio.to_thread(
+        move_user, username, target, settle, settings.BULK_BATCH_SIZE
+    )
+    summary["move_seconds"] = round(time.perf_counter() - started, 3)
+    await asyncio.sleep(settle)
+    done.set()
+    await user
+
+    listing = await client.get("/api/v1/notes?limit=100", headers=headers(token))
+    after = {item["id"]: item for item in listing.json()["items"]}
+    assert after.keys() == before.keys()
+    note = (await client.get(f"/api/v1/notes/{note_id}", headers=headers(token))).json()
+    assert note["version"] == version and note["content"] == f"edit {version - 1}"
+    with ShardRouter.SHARDS[source].engine.connect() as connection:
+        left = connection.execute(
+            select(DataDb.id).where(DataDb.id.in_(list(before)))
+        ).all()
+    assert not left
+    return summary | counts
+
+
+async def main(args) -> dict:
+    prepare(ShardRouter.SHARDS)
+    results = {}
+    usernames = [f"user{i}" for i in range(args.users)]
+    tokens = dict(zip(usernames, await asyncio.gather(*map(create_user, usernames))))
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench"
+    ) as client:
+        results |= await load(client, tokens, args.notes, args.concurrency)
+        results["ids"] = check_ids()
+        results["status_before_move"] = shard_status()
+        username = random.Random(5).choice(usernames)
+        results["move"] = await move_while_used(
+            client, username, tokens[username], settings.SHARD_DIRECTORY_TTL + 0.2
+        )
+    results["status_after_move"] = shard_status()
+    for shard in ShardRouter.SHARDS:
+        await shard.async_engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--notes", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=50)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,111 @@
+"""
+Measures the startup of a worker: the time to import the application in a
+fresh interpreter, then for each startup mode the time from launching
+uvicorn to its first response and the latency of the first and second
+registrations (the first one pays for the pool connection and the bcrypt
+backend unless they were prewarmed).
+
+    python -m benchmarks.startup --runs 5
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from benchmarks._common import configure_env, summarize
+
+configure_env("startup.db")
+
+import httpx  # noqa: E402
+
+# Settings of each startup mode, on top of the environment.
+MODES = {
+    "default": {},
+    "no_ddl": {"STARTUP_CREATE_TABLES": "false"},
+    "no_ddl_prewarm": {"STARTUP_CREATE_TABLES": "false", "STARTUP_PREWARM": "true"},
+}
+
+IMPORT = (
+    "import time; s = time.perf_counter(); import {}; print(time.perf_counter() - s)"
+)
+
+
+def import_seconds(module: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT.format(module)],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return float(output.split()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_worker(env: dict, run: int) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port)],
+        env=os.environ | env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=url) as client:
+            while True:
+                try:
+                    response = client.get("/token")
+                    break
+                except httpx.TransportError:
+                    assert process.poll() is None, "uvicorn exited"
+                    time.sleep(0.005)
+            first_response = time.perf_counter() - started
+            assert response.status_code == 200, response.status_code
+            registrations = []
+            for i in range(2):
+                start = time.perf_counter()
+                response = client.post(
+                    "/user/register",
+                    data={"username": f"user{run}-{i}-{port}", "password": "pw"},
+                )
+                registrations.append(time.perf_counter() - start)
+                assert response.status_code == 302, response.text
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        "first_response": first_response,
+        "first_register": registrations[0],
+        "second_register": registrations[1],
+    }
+
+
+def main(args) -> dict:
+    # The tables exist before the workers start, as after the migrations.
+    subprocess.run(
+        [sys.executable, "-c", "import src.db.database as d; d.create_db_and_tables()"],
+        check=True,
+    )
+    results = {
+        "import_python": summarize([import_seconds("sys") for _ in range(args.runs)]),
+        "import_app": summarize([import_seconds("src.main") for _ in range(args.runs)]),
+    }
+    for mode, env in MODES.items():
+        runs = [start_worker(env, run) for run in range(args.runs)]
+        results[mode] = {key: summarize([run[key] for run in runs]) for key in runs[0]}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    print(json.dumps(main(parser.parse_args()), indent=2))
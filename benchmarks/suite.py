@@ -0,0 +1,238 @@
+"""
+Benchmark suite of the whole request pipeline, with a regression check.
+
+Seeds a database (a fresh SQLite file, or the one in `DATABASE_URL`, which
+must be empty) and runs:
+
+- microbenchmarks of `FernetUtility`, `PWD`, `JWTUtility` and the
+  `AsyncDataSQL` listing queries;
+- load scenarios through an in-process ASGI client: a login storm, the
+  homepage of a user with `--notes` notes, and a note creation burst.
+
+Results are printed as JSON and optionally written to `--output`. With
+`--baseline`, every scenario whose mean latency grew by more than
+`--tolerance` compared to the baseline is reported and the exit code is 1.
+Baselines depend on the machine: record one with `--save-baseline` on the
+machine that runs the check.
+
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from benchmarks._common import configure_env, make_note, seed_database, summarize
+
+configure_env("suite.db")
+
+import httpx  # noqa: E402
+from sqlmodel import update  # noqa: E402
+from sqlmodel.ext.asyncio.session import AsyncSession  # noqa: E402
+from src.main import app  # noqa: E402
+from src.db.database import ASYNC_ENGINE, ENGINE, AsyncDataSQL  # noqa: E402
+from src.db.models import UserDb  # noqa: E402
+from src.utils.utilities import PWD, FernetUtility, JWTUtility  # noqa: E402
+
+PASSWORD = "benchmark-password"
+
+
+async def micro(call, iterations: int) -> dict:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = call()
+        if asyncio.iscoroutine(result):
+            await result
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def load(client, requests: list, concurrency: int, expected: int) -> dict:
+    """
+    Sends `requests` (`(method, url, kwargs)` tuples) with at most
+    `concurrency` in flight, checking every status code.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(method: str, url: str, kwargs: dict):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == expected, (url, response.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(*request) for request in requests))
+    elapsed = time.perf_counter() - start
+    return summarize(samples) | {
+        "requests_per_second": round(len(samples) / elapsed, 1)
+    }
+
+
+async def micro_benchmarks(args, usernames: list) -> dict:
+    iterations = args.iterations
+    note = make_note(args.note_size, 1)
+    token = FernetUtility.fernet_crypt(note)
+    access_token, _ = JWTUtility.create_tokens(usernames[0], 1)
+    hashed = PWD.hash(PASSWORD)
+    results = {
+        "fernet_crypt": await micro(
+            lambda: FernetUtility.fernet_crypt(note), iterations
+        ),
+        "fernet_decrypt": await micro(
+            lambda: FernetUtility.fernet_decrypt(token), iterations
+        ),
+        "fernet_decrypt_batch_1000": await micro(
+            lambda: FernetUtility.fernet_decrypt_batch([token] * 1000),
+            max(3, iterations // 200),
+        ),
+        "jwt_create": await micro(
+            lambda: JWTUtility.create_tokens(usernames[0], 1), iterations
+        ),
+        "jwt_decode": await micro(
+            lambda: JWTUtility.decode_jwt(access_token), iterations
+        ),
+        "pwd_hash": await micro(lambda: PWD.hash(PASSWORD), args.bcrypt_iterations),
+        "pwd_verify": await micro(
+            lambda: PWD.verify_hash(PASSWORD, hashed), args.bcrypt_iterations
+        ),
+    }
+    async with AsyncSession(ASYNC_ENGINE) as session:
+        results["db_get_data"] = await micro(
+            lambda: AsyncDataSQL.get_data(usernames[0], session),
+            max(3, iterations // 100),
+        )
+        results["db_get_titles_page"] = await micro(
+            lambda: AsyncDataSQL.get_titles_page(1, session), iterations // 10
+        )
+    return results
+
+
+async def load_scenarios(args, usernames: list) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        results["login_storm"] = await load(
+            client,
+            [
+                ("POST", "/token", {"data": {"username": name, "password": PASSWORD}})
+                for name in usernames[: args.logins]
+            ],
+            args.concurrency,
+            expected=302,
+        )
+        cookies = [
+            {"access_token": JWTUtility.create_tokens(name, user_id)[0]}
+            for user_id, name in enumerate(usernames, start=1)
+        ]
+        results["homepage"] = await load(
+            client,
+            [
+                ("GET", "/user/home", {"cookies": cookies[i % len(cookies)]})
+                for i in range(args.requests)
+            ],
+            args.concurrency,
+            expected=200,
+        )
+        results["note_creation_burst"] = await load(
+            client,
+            [
+                (
+                    "POST",
+                    "/user/home/content/new",
+                    {
+                        "cookies": cookies[i % len(cookies)],
+                        "data": {
+                            "title": f"burst {i}",
+                            "content": make_note(args.note_size, i),
+                        },
+                    },
+                )
+                for i in range(args.requests)
+            ],
+            args.concurrency,
+            expected=303,
+        )
+    return results
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Lists the scenarios whose mean latency exceeds the baseline's by more
+    than `tolerance` (a fraction).
+    """
+    found = []
+    for group, scenarios in baseline["results"].items():
+        for name, base in scenarios.items():
+            current = results.get(group, {}).get(name)
+            if current is None:
+                continue
+            limit = base["mean_ms"] * (1 + tolerance)
+            if current["mean_ms"] > limit:
+                found.append(
+                    f"{group}.{name}: {current['mean_ms']} ms > {limit:.3f} ms "
+                    f"(baseline {base['mean_ms']} ms)"
+                )
+    return found
+
+
+async def main(args) -> int:
+    usernames = seed_database(ENGINE, args.users, args.notes, args.note_size)
+    with ENGINE.begin() as connection:
+        connection.execute(update(UserDb).values(password=PWD.hash(PASSWORD)))
+
+    results = {}
+    if args.only in (None, "micro"):
+        results["micro"] = await micro_benchmarks(args, usernames)
+    if args.only in (None, "load"):
+        results["load"] = await load_scenarios(args, usernames)
+    await ASYNC_ENGINE.dispose()
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": ENGINE.url.get_backend_name(),
+            "parameters": vars(args),
+        },
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as file:
+                json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(results, json.load(file), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--notes", type=int, default=200, help="Notes per user.")
+    parser.add_argument("--note-size", type=int, default=1_000)
+    parser.add_argument("--iterations", type=int, default=2_000)
+    parser.add_argument("--bcrypt-iterations", type=int, default=5)
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--only", choices=["micro", "load"])
+    parser.add_argument("--output", help="Also write the results to this file.")
+    parser.add_argument("--baseline", help="Fail on regressions against this file.")
+    parser.add_argument("--save-baseline", help="Write the results as a baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,133 @@
+"""
+Maintenance of the attachment chunks stored under `ATTACHMENT_DIR`.
+
+    python -m src.db.chunks gc --grace 3600   # delete unreferenced chunks
+    python -m src.db.chunks rotate            # re-encrypt with the primary key
+
+Deleting an attachment only deletes its rows, because its chunks may be
+shared with other attachments. `gc` reads the ids of the chunks referenced
+on every shard and deletes the other chunk files, unless they were written or reused in
+the last `--grace` seconds: an upload stores its chunks before the
+attachment row is committed, and reusing a chunk refreshes its mtime.
+
+`rotate` re-encrypts the chunks that are not encrypted with the first key
+of `SECRET_FERNET`; run it along with `src.db.reencrypt` when rotating keys.
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+from sqlalchemy import create_engine, select
+from .models import AttachmentChunkDb
+
+
+def chunk_files(directory: str):
+    """Yields the path and id of every chunk file under `directory`."""
+    if not os.path.isdir(directory):
+        return
+    for prefix in os.scandir(directory):
+        if not prefix.is_dir():
+            continue
+        for entry in os.scandir(prefix.path):
+            try:
+                yield entry.path, bytes.fromhex(entry.name)
+            except ValueError:
+                # Temporary file of a write in progress or interrupted.
+                continue
+
+
+def collect_garbage(engines: list, directory: str, grace: float) -> dict:
+    """
+    Deletes the chunk files that no attachment references.
+
+    Args:
+        engines (list): Synchronous SQLAlchemy engines, one per shard.
+        directory (str): The chunk directory.
+        grace (float): Files modified in the last `grace` seconds are kept.
+
+    Returns:
+        dict: The number of chunk files kept and deleted, and the bytes freed.
+    """
+    referenced = set()
+    for engine in engines:
+        with engine.connect() as connection:
+            referenced.update(
+                connection.execute(
+                    select(AttachmentChunkDb.chunk_id).distinct()
+                ).scalars()
+            )
+    cutoff = time.time() - grace
+    summary = {"kept": 0, "deleted": 0, "freed_bytes": 0}
+    for path, chunk_id in chunk_files(directory):
+        stat = os.stat(path)
+        if chunk_id in referenced or stat.st_mtime > cutoff:
+            summary["kept"] += 1
+            continue
+        os.remove(path)
+        summary["deleted"] += 1
+        summary["freed_bytes"] += stat.st_size
+    return summary
+
+
+def rotate(directory: str) -> dict:
+    """
+    Re-encrypts every chunk file with the primary key of `SECRET_FERNET`.
+
+    Chunk ids are keyed hashes of the plaintext, so they don't change.
+
+    Returns:
+        dict: The number of chunk files rewritten and left as they were.
+    """
+    from cryptography.fernet import Fernet, InvalidToken
+    from src.utils.utilities import FernetUtility
+
+    primary = Fernet(FernetUtility.KEYS[0])
+    summary = {"rotated": 0, "unchanged": 0}
+    for path, _ in chunk_files(directory):
+        with open(path, "rb") as file:
+            token = base64.urlsafe_b64encode(file.read())
+        try:
+            primary.decrypt(token)
+            summary["unchanged"] += 1
+            continue
+        except InvalidToken:
+            pass
+        rotated = base64.urlsafe_b64decode(FernetUtility.cypher.rotate(token))
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(rotated)
+        os.replace(f"{path}.tmp", path)
+        summary["rotated"] += 1
+    return summary
+
+
+def main(argv: list[str] | None = None) -> int:
+    from src.utils.utilities import settings
+
+    parser = argparse.ArgumentParser(description="Attachment chunk maintenance.")
+    parser.add_argument("command", choices=["gc", "rotate"])
+    parser.add_argument(
+        "--url", help="Database URL, defaults to the application's shards."
+    )
+    parser.add_argument("--dir", default=settings.ATTACHMENT_DIR)
+    parser.add_argument("--grace", type=float, default=3600)
+    args = parser.parse_args(argv)
+
+    if args.command == "gc":
+        if args.url:
+            engines = [create_engine(args.url)]
+        else:
+            from .database import ShardRouter
+
+            engines = [shard.engine for shard in ShardRouter.SHARDS]
+        summary = collect_garbage(engines, args.dir, args.grace)
+    else:
+        summary = rotate(args.dir)
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Group commit of note insertions.
+
+Each `AsyncDataSQL.add_data` call commits its own transaction, so a burst
+of note creations pays for one durable commit (an fsync on MySQL and
+SQLite) per note. With `GROUP_COMMIT_ENABLED`, the creation routes hand
+their notes to `NOTE_WRITER` instead, which gathers the notes submitted
+within `GROUP_COMMIT_WINDOW` seconds, or until `GROUP_COMMIT_MAX_BATCH` are
+waiting, and inserts them with their search tokens in one transaction per
+shard. Every caller still waits for the commit and gets the id of its own note.
+
+A request therefore waits up to the window longer when it's alone; the
+window only pays off under concurrent writes.
+"""
+
+import asyncio
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.utils.metrics import COLLECTORS
+from src.utils.search import note_tokens
+from src.utils.utilities import FernetUtility, settings
+from .database import AsyncSearchSQL, bump_listing
+from .models import DataDb
+from .shards import ShardRouter
+
+
+class GroupCommitWriter:
+    """
+    Batches note insertions from concurrent requests into shared transactions.
+
+    If a batch fails, its notes are retried one per transaction, so a single
+    invalid note only fails its own request.
+
+    Args:
+        window (float): The number of seconds a batch stays open for more notes.
+        max_batch (int): The number of notes that closes a batch early.
+    """
+
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        # The column values, search tokens, future and engine of each waiting note.
+        self._pending: list[tuple[dict, set[bytes], asyncio.Future, object]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._writes: set[asyncio.Task] = set()
+
+    async def add(
+        self, title: str, encrypted_content: bytes, user_id: int, content: str
+    ) -> int:
+        """
+        Adds a note in the next group commit, like `AsyncDataSQL.add_data`.
+
+        The note is written to the shard the request was routed to.
+
+        Args:
+            title (str): The title of the note.
+            encrypted_content (bytes): The encrypted content of the note.
+            user_id (int): The ID of the user who owns the note.
+            content (str): The plaintext content, indexed along with the title.
+
+        Returns:
+            int: The ID of the new note, once its batch is committed.
+
+        Raises:
+            HTTPException: If the user is being moved to another shard (503).
+        """
+        ShardRouter.check_writable()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        values = {
+            "title": title,
+            "content": encrypted_content,
+            "user_id": user_id,
+            "content_length": len(encrypted_content),
+            "content_hash": FernetUtility.content_hash(content),
+        }
+        tokens = note_tokens(user_id, f"{title}\n{content}")
+        engine = ShardRouter.current().async_engine
+        self._pending.append((values, tokens, future, engine))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "largest_batch": self.largest_batch,
+        }
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batches: dict[object, list] = {}
+        for item in self._pending:
+            batches.setdefault(item[3], []).append(item)
+        self._pending = []
+        for engine, batch in batches.items():
+            # Referenced until done, since the event loop keeps only weak references.
+            task = asyncio.ensure_future(self._write(engine, batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, engine, batch: list) -> None:
+        try:
+            ids = await self._commit(engine, batch)
+        except Exception as error:
+            if len(batch) == 1:
+                future = batch[0][2]
+                if not future.done():
+                    future.set_exception(error)
+                return
+            for item in batch:
+                await self._write(engine, [item])
+            return
+        for (_, _, future, _), note_id in zip(batch, ids):
+            # The request may have been cancelled; its note is saved anyway.
+            if not future.done():
+                future.set_result(note_id)
+
+    async def _commit(self, engine, batch: list) -> list[int]:
+        rows = [DataDb(**values) for values, _, _, _ in batch]
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            session.add_all(rows)
+            await session.flush()
+            tokens_by_user: dict[int, dict[int, set[bytes]]] = {}
+            for row, (_, tokens, _, _) in zip(rows, batch):
+                tokens_by_user.setdefault(row.user_id, {})[row.id] = tokens
+            for user_id, tokens_by_note in tokens_by_user.items():
+                await AsyncSearchSQL.add_tokens(
+                    user_id=user_id, tokens_by_note=tokens_by_note, session=session
+                )
+                await session.exec(bump_listing(user_id))
+            await session.commit()
+        self.batches += 1
+        self.rows += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        return [row.id for row in rows]
+
+
+NOTE_WRITER = GroupCommitWriter(
+    window=settings.GROUP_COMMIT_WINDOW,
+    max_batch=settings.GROUP_COMMIT_MAX_BATCH,
+)
+
+COLLECTORS.append(
+    lambda: {f"group_commit_{key}": value for key, value in NOTE_WRITER.stats().items()}
+)
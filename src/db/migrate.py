@@ -0,0 +1,222 @@
+"""
+Versioned schema migrations, applied outside of the application startup.
+
+Every module in `src/db/migrations` defines a `VERSION` number and an
+`upgrade(connection)` function. Applied versions are recorded in the
+`schema_version` table, and migrations check for existing columns and
+indexes so a database first created by `create_db_and_tables()` can be
+migrated as well.
+
+    python -m src.db.migrate upgrade   # apply the pending migrations
+    python -m src.db.migrate current   # print the applied version
+    python -m src.db.migrate check     # EXPLAIN the hot queries and check their indexes
+"""
+
+import argparse
+import importlib
+import pkgutil
+import sys
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    Table,
+    func,
+    inspect,
+    insert,
+    select,
+    text,
+)
+from .models import DataDb, UserDb, utc_now
+
+VERSION_TABLE = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def has_column(connection, table: str, column: str) -> bool:
+    """
+    Checks whether a table already has a column.
+
+    Args:
+        connection: The connection the migration runs on.
+        table (str): The name of the table.
+        column (str): The name of the column.
+
+    Returns:
+        bool: True if the column exists.
+    """
+    return any(c["name"] == column for c in inspect(connection).get_columns(table))
+
+
+def has_index(connection, table: str, index: str) -> bool:
+    """
+    Checks whether a table already has an index.
+
+    Args:
+        connection: The connection the migration runs on.
+        table (str): The name of the table.
+        index (str): The name of the index.
+
+    Returns:
+        bool: True if the index exists.
+    """
+    return any(i["name"] == index for i in inspect(connection).get_indexes(table))
+
+
+def load_migrations() -> list:
+    """
+    Imports the migration modules.
+
+    Returns:
+        list: The migration modules, ordered by `VERSION`.
+    """
+    from . import migrations
+
+    modules = [
+        importlib.import_module(f"{migrations.__name__}.{info.name}")
+        for info in pkgutil.iter_modules(migrations.__path__)
+    ]
+    return sorted(modules, key=lambda module: module.VERSION)
+
+
+def current_version(engine) -> int:
+    """
+    Returns the latest applied migration version, 0 for an unmigrated database.
+    """
+    with engine.begin() as connection:
+        VERSION_TABLE.create(connection, checkfirst=True)
+        version = connection.execute(select(func.max(VERSION_TABLE.c.version)))
+        return version.scalar() or 0
+
+
+def upgrade(engine, target: int | None = None) -> list[int]:
+    """
+    Applies the pending migrations, each one in its own transaction.
+
+    MySQL commits DDL statements implicitly, so a migration that fails halfway
+    is not rolled back; migrations are written to be safely re-run.
+
+    Args:
+        engine: A synchronous SQLAlchemy engine.
+        target (int | None): The version to stop at, or None for the latest one.
+
+    Returns:
+        list[int]: The versions that were applied.
+    """
+    applied = []
+    version = current_version(engine)
+    for module in load_migrations():
+        if module.VERSION <= version or (
+            target is not None and module.VERSION > target
+        ):
+            continue
+        with engine.begin() as connection:
+            module.upgrade(connection)
+            connection.execute(
+                insert(VERSION_TABLE).values(
+                    version=module.VERSION, applied_at=utc_now()
+                )
+            )
+        applied.append(module.VERSION)
+    return applied
+
+
+# Hot queries and the indexes that are expected to serve them. PRIMARY stands
+# for the primary key, which SQLite reports as "INTEGER PRIMARY KEY".
+EXPLAINED_QUERIES = {
+    "listing": (
+        select(DataDb.id, DataDb.title)
+        .where(DataDb.user_id == 1, DataDb.id > 0)
+        .order_by(DataDb.id)
+        .limit(51),
+        {"ix_datadb_user_id_id"},
+    ),
+    "lookup": (
+        select(DataDb).where(DataDb.id == 1, DataDb.user_id == 1),
+        {"PRIMARY", "ix_datadb_user_id_id"},
+    ),
+    "listing_version": (
+        select(UserDb.listing_version).where(UserDb.id == 1),
+        {"PRIMARY"},
+    ),
+}
+
+
+def explain_indexes(connection, statement) -> set:
+    """
+    Runs EXPLAIN for a statement and collects the indexes used by its plan.
+
+    Args:
+        connection: A connection to a MySQL or SQLite database.
+        statement: The SQLAlchemy statement to explain.
+
+    Returns:
+        set: The names of the indexes in the query plan.
+    """
+    sql = str(
+        statement.compile(
+            dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+    if connection.dialect.name == "sqlite":
+        used = set()
+        for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+            detail = row.detail
+            if "INTEGER PRIMARY KEY" in detail:
+                used.add("PRIMARY")
+            elif " INDEX " in detail:
+                used.add(detail.split(" INDEX ", 1)[1].split(" ")[0])
+        return used
+    rows = connection.execute(text(f"EXPLAIN {sql}")).mappings()
+    return {row["key"] for row in rows if row["key"]}
+
+
+def check_indexes(engine) -> dict:
+    """
+    Explains every query of `EXPLAINED_QUERIES`.
+
+    Returns:
+        dict: For each query, the indexes used and whether one of the expected
+              indexes is among them.
+    """
+    report = {}
+    with engine.connect() as connection:
+        for name, (statement, expected) in EXPLAINED_QUERIES.items():
+            used = explain_indexes(connection, statement)
+            report[name] = {"indexes": sorted(used), "ok": bool(used & expected)}
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    from .database import ENGINE
+    from sqlalchemy import create_engine
+
+    parser = argparse.ArgumentParser(description="Database schema migrations.")
+    parser.add_argument("command", choices=["upgrade", "current", "check"])
+    parser.add_argument("--url", help="Database URL, defaults to the application's.")
+    parser.add_argument("--target", type=int, help="Version to upgrade to.")
+    args = parser.parse_args(argv)
+    engine = create_engine(args.url) if args.url else ENGINE
+
+    if args.command == "upgrade":
+        applied = upgrade(engine, args.target)
+        print(f"applied: {applied or 'nothing'}, now at {current_version(engine)}")
+    elif args.command == "current":
+        print(current_version(engine))
+    else:
+        report = check_indexes(engine)
+        for name, result in report.items():
+            status = "ok" if result["ok"] else "MISSING INDEX"
+            print(f"{name}: {status} {result['indexes']}")
+        if not all(result["ok"] for result in report.values()):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
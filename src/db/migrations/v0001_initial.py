@@ -0,0 +1,25 @@
+"""Original schema: user accounts and their encrypted notes."""
+
+from sqlalchemy import Column, ForeignKey, Integer, LargeBinary, MetaData, String, Table
+
+VERSION = 1
+
+
+def upgrade(connection) -> None:
+    metadata = MetaData()
+    Table(
+        "userdb",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("username", String(255), nullable=False, unique=True),
+        Column("password", String(255), nullable=False),
+    )
+    Table(
+        "datadb",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("title", String(255), nullable=False),
+        Column("content", LargeBinary, nullable=False),
+        Column("user_id", Integer, ForeignKey("userdb.id"), nullable=True),
+    )
+    metadata.create_all(connection, checkfirst=True)
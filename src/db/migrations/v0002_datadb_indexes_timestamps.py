@@ -0,0 +1,50 @@
+"""
+Adds `content_length`, `created_at` and `updated_at` to `datadb`, widens
+`content` to LONGBLOB on MySQL and indexes `(user_id, id)` and
+`(user_id, updated_at)`.
+"""
+
+from sqlalchemy import DateTime, bindparam, text
+from src.db.migrate import has_column, has_index
+from src.db.models import utc_now
+
+VERSION = 2
+
+
+def upgrade(connection) -> None:
+    mysql = connection.dialect.name == "mysql"
+
+    if mysql:
+        connection.execute(text("ALTER TABLE datadb MODIFY content LONGBLOB NOT NULL"))
+
+    if not has_column(connection, "datadb", "content_length"):
+        connection.execute(
+            text(
+                "ALTER TABLE datadb ADD COLUMN content_length INTEGER NOT NULL DEFAULT 0"
+            )
+        )
+        connection.execute(text("UPDATE datadb SET content_length = LENGTH(content)"))
+
+    # The backfill is bound as a DateTime, like the values the models write:
+    # CURRENT_TIMESTAMP is in the session's time zone on MySQL and has no
+    # microseconds on SQLite, so it wouldn't sort with them.
+    now = bindparam("now", utc_now(), type_=DateTime())
+    for column in ("created_at", "updated_at"):
+        if not has_column(connection, "datadb", column):
+            # SQLite can't add a column with a non-constant default, so the
+            # column is added empty and backfilled.
+            connection.execute(text(f"ALTER TABLE datadb ADD COLUMN {column} DATETIME"))
+            connection.execute(
+                text(f"UPDATE datadb SET {column} = :now").bindparams(now)
+            )
+            if mysql:
+                connection.execute(
+                    text(f"ALTER TABLE datadb MODIFY {column} DATETIME NOT NULL")
+                )
+
+    for name, columns in (
+        ("ix_datadb_user_id_id", "user_id, id"),
+        ("ix_datadb_user_id_updated_at", "user_id, updated_at"),
+    ):
+        if not has_index(connection, "datadb", name):
+            connection.execute(text(f"CREATE INDEX {name} ON datadb ({columns})"))
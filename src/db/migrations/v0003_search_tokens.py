@@ -0,0 +1,20 @@
+"""Adds the `searchtokendb` table holding the encrypted search index."""
+
+from sqlalchemy import BINARY, Column, ForeignKey, Index, Integer, MetaData, Table
+
+VERSION = 3
+
+
+def upgrade(connection) -> None:
+    metadata = MetaData()
+    Table("userdb", metadata, Column("id", Integer, primary_key=True))
+    Table("datadb", metadata, Column("id", Integer, primary_key=True))
+    Table(
+        "searchtokendb",
+        metadata,
+        Column("user_id", Integer, ForeignKey("userdb.id"), primary_key=True),
+        Column("token", BINARY(16), primary_key=True),
+        Column("note_id", Integer, ForeignKey("datadb.id"), primary_key=True),
+        Index("ix_searchtokendb_note_id", "note_id"),
+    )
+    metadata.tables["searchtokendb"].create(connection, checkfirst=True)
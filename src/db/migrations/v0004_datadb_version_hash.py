@@ -0,0 +1,21 @@
+"""
+Adds `version`, used for optimistic concurrency on updates, and
+`content_hash`, used to skip rewriting unchanged contents, to `datadb`.
+"""
+
+from sqlalchemy import text
+from src.db.migrate import has_column
+
+VERSION = 4
+
+
+def upgrade(connection) -> None:
+    if not has_column(connection, "datadb", "version"):
+        connection.execute(
+            text("ALTER TABLE datadb ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        )
+    if not has_column(connection, "datadb", "content_hash"):
+        # Existing rows keep a NULL hash; their first update rewrites the content.
+        connection.execute(
+            text("ALTER TABLE datadb ADD COLUMN content_hash BINARY(32)")
+        )
@@ -0,0 +1,51 @@
+"""Adds the `attachmentdb` and `attachmentchunkdb` tables holding note attachments."""
+
+from sqlalchemy import (
+    BINARY,
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+)
+
+VERSION = 5
+
+
+def upgrade(connection) -> None:
+    metadata = MetaData()
+    Table("userdb", metadata, Column("id", Integer, primary_key=True))
+    Table("datadb", metadata, Column("id", Integer, primary_key=True))
+    Table(
+        "attachmentdb",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("note_id", Integer, ForeignKey("datadb.id"), nullable=False),
+        Column("user_id", Integer, ForeignKey("userdb.id"), nullable=False),
+        Column("filename", String(255), nullable=False),
+        Column("content_type", String(255), nullable=False),
+        Column("size", BigInteger, nullable=False),
+        Column("chunk_size", Integer, nullable=False),
+        Column("content_hash", BINARY(32), nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        Index("ix_attachmentdb_note_id", "note_id"),
+    )
+    Table(
+        "attachmentchunkdb",
+        metadata,
+        Column(
+            "attachment_id",
+            Integer,
+            ForeignKey("attachmentdb.id"),
+            primary_key=True,
+            autoincrement=False,
+        ),
+        Column("position", Integer, primary_key=True, autoincrement=False),
+        Column("chunk_id", BINARY(32), nullable=False),
+    )
+    metadata.tables["attachmentdb"].create(connection, checkfirst=True)
+    metadata.tables["attachmentchunkdb"].create(connection, checkfirst=True)
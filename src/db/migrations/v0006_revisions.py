@@ -0,0 +1,42 @@
+"""Adds the `revisiondb` table holding the past versions of notes."""
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+)
+from sqlalchemy.dialects import mysql
+
+VERSION = 6
+
+
+def upgrade(connection) -> None:
+    metadata = MetaData()
+    Table("userdb", metadata, Column("id", Integer, primary_key=True))
+    Table("datadb", metadata, Column("id", Integer, primary_key=True))
+    Table(
+        "revisiondb",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("note_id", Integer, ForeignKey("datadb.id"), nullable=False),
+        Column("user_id", Integer, ForeignKey("userdb.id"), nullable=False),
+        Column("revision", Integer, nullable=False),
+        Column("title", String(255), nullable=False),
+        Column("is_snapshot", Boolean, nullable=False),
+        Column(
+            "payload",
+            LargeBinary().with_variant(mysql.LONGBLOB(), "mysql"),
+            nullable=False,
+        ),
+        Column("payload_length", Integer, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        Index("ix_revisiondb_note_id_revision", "note_id", "revision", unique=True),
+    )
+    metadata.tables["revisiondb"].create(connection, checkfirst=True)
@@ -0,0 +1,18 @@
+"""Adds the `sharddirectorydb` table recording the shard of moved users."""
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table
+
+VERSION = 7
+
+
+def upgrade(connection) -> None:
+    metadata = MetaData()
+    Table(
+        "sharddirectorydb",
+        metadata,
+        Column("username", String(255), primary_key=True),
+        Column("shard", Integer, nullable=False),
+        Column("moving_to", Integer, nullable=True),
+        Column("updated_at", DateTime, nullable=False),
+    )
+    metadata.tables["sharddirectorydb"].create(connection, checkfirst=True)
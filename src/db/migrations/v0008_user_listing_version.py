@@ -0,0 +1,18 @@
+"""
+Adds `listing_version` to `userdb`, the version of the user's list of notes
+that the homepage ETag is built from.
+"""
+
+from sqlalchemy import text
+from src.db.migrate import has_column
+
+VERSION = 8
+
+
+def upgrade(connection) -> None:
+    if not has_column(connection, "userdb", "listing_version"):
+        connection.execute(
+            text(
+                "ALTER TABLE userdb ADD COLUMN listing_version INTEGER NOT NULL DEFAULT 0"
+            )
+        )
@@ -1,16 +1,92 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import BINARY, BigInteger, Index, LargeBinary
+from sqlalchemy.dialects import mysql
+from datetime import datetime, timezone
 from typing import Optional
 
+# BLOB is capped at 64 KB on MySQL, LONGBLOB holds up to 4 GB.
+CONTENT_TYPE = LargeBinary().with_variant(mysql.LONGBLOB(), "mysql")
+
+
+def utc_now() -> datetime:
+    """Current UTC time as a naive datetime, as stored by MySQL DATETIME columns."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class UserDb(SQLModel, table=True):
     id: int = Field(primary_key=True, nullable=True)
     username: str = Field(unique=True, nullable=False)
     password: str = Field(nullable=False)
+    listing_version: int = Field(default=0, nullable=False)  # Bumped by every note write
 
 class DataDb(SQLModel, table=True):
+    # Keep in sync with the migrations in src/db/migrations.
+    __table_args__ = (
+        Index("ix_datadb_user_id_id", "user_id", "id"),
+        Index("ix_datadb_user_id_updated_at", "user_id", "updated_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str = Field(nullable=False)
-    content: bytes = Field(nullable=False)
+    content: bytes = Field(sa_type=CONTENT_TYPE, nullable=False)
     user_id: Optional[int] = Field(default=None, foreign_key="userdb.id")
+    content_length: int = Field(default=0, nullable=False)  # Stored bytes
+    created_at: datetime = Field(default_factory=utc_now, nullable=False)
+    updated_at: datetime = Field(default_factory=utc_now, nullable=False)
+    version: int = Field(default=1, nullable=False)  # Bumped by every update
+    content_hash: Optional[bytes] = Field(default=None, sa_type=BINARY(32))
+
+
+class SearchTokenDb(SQLModel, table=True):
+    # One row per keyed hash of a word or prefix found in a note, see src/utils/search.py.
+    user_id: int = Field(primary_key=True, foreign_key="userdb.id")
+    token: bytes = Field(primary_key=True, sa_type=BINARY(16))
+    note_id: int = Field(primary_key=True, foreign_key="datadb.id", index=True)
+
+
+class AttachmentDb(SQLModel, table=True):
+    # A file attached to a note, stored as encrypted chunks, see src/utils/attachments.py.
+    __table_args__ = (Index("ix_attachmentdb_note_id", "note_id"),)
 
+    id: Optional[int] = Field(default=None, primary_key=True)
+    note_id: int = Field(foreign_key="datadb.id", nullable=False)
+    user_id: int = Field(foreign_key="userdb.id", nullable=False)
+    filename: str = Field(nullable=False)
+    content_type: str = Field(nullable=False)
+    size: int = Field(default=0, sa_type=BigInteger, nullable=False)  # Plaintext bytes
+    chunk_size: int = Field(nullable=False)  # Plaintext bytes per chunk
+    content_hash: bytes = Field(sa_type=BINARY(32), nullable=False)  # Keyed, for ETags
+    created_at: datetime = Field(default_factory=utc_now, nullable=False)
+
+
+class AttachmentChunkDb(SQLModel, table=True):
+    # The chunks of an attachment, in order; identical chunks share one file.
+    attachment_id: int = Field(primary_key=True, foreign_key="attachmentdb.id")
+    position: int = Field(primary_key=True)
+    chunk_id: bytes = Field(sa_type=BINARY(32), nullable=False)
+
+
+class RevisionDb(SQLModel, table=True):
+    # A past version of a note, stored whole or as a delta, see AsyncRevisionSQL.
+    __table_args__ = (
+        Index("ix_revisiondb_note_id_revision", "note_id", "revision", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    note_id: int = Field(foreign_key="datadb.id", nullable=False)
+    user_id: int = Field(foreign_key="userdb.id", nullable=False)
+    revision: int = Field(nullable=False)  # The note's version
+    title: str = Field(nullable=False)
+    is_snapshot: bool = Field(nullable=False)
+    # Encrypted content, or encrypted delta rebuilding it from the next newer version.
+    payload: bytes = Field(sa_type=CONTENT_TYPE, nullable=False)
+    payload_length: int = Field(nullable=False)  # Stored bytes
+    created_at: datetime = Field(nullable=False)  # When the version was saved
 
 
+class ShardDirectoryDb(SQLModel, table=True):
+    # The shard of a user placed otherwise than by hash, on shard 0, see src/db/shards.py.
+    username: str = Field(primary_key=True)
+    shard: int = Field(nullable=False)
+    moving_to: Optional[int] = Field(default=None)  # Set while the user is moved
+    updated_at: datetime = Field(default_factory=utc_now, nullable=False)
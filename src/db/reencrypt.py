@@ -0,0 +1,192 @@
+"""
+Re-encrypts every note with the primary (first) key of `SECRET_FERNET`.
+
+To rotate keys, put the new key in front of `SECRET_FERNET` (keeping the old
+ones after it), restart the app, and run:
+
+    python -m src.db.reencrypt --workers 4 --checkpoint reencrypt.json
+
+Rows are read in batches ordered by id. Each batch is re-encrypted on a
+process pool and written back in one transaction. The id of the last
+committed row is saved to the checkpoint file, so an interrupted run resumes
+where it stopped. Once it finishes, the old keys can be removed.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from cryptography.fernet import Fernet, MultiFernet
+from sqlalchemy import bindparam, create_engine, select, update
+from .models import DataDb
+
+_CYPHER: MultiFernet | None = None
+
+
+def _init_worker(keys: list[str]) -> None:
+    global _CYPHER
+    _CYPHER = MultiFernet([Fernet(key) for key in keys])
+
+
+def _rotate(tokens: list[bytes]) -> list[bytes]:
+    return [_CYPHER.rotate(token) for token in tokens]
+
+
+def read_checkpoint(path: str | None) -> int:
+    """
+    Returns the id of the last re-encrypted row saved in `path`, or 0.
+    """
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as file:
+        return json.load(file)["last_id"]
+
+
+def write_checkpoint(path: str | None, last_id: int) -> None:
+    """
+    Atomically saves the id of the last re-encrypted row to `path`.
+    """
+    if not path:
+        return
+    with open(f"{path}.tmp", "w") as file:
+        json.dump({"last_id": last_id}, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def reencrypt(
+    engine,
+    keys: list[str],
+    batch_size: int = 1000,
+    workers: int = os.cpu_count() or 1,
+    checkpoint: str | None = None,
+    report=print,
+) -> dict:
+    """
+    Re-encrypts all the notes with the first of `keys`.
+
+    Rows are only written back if their `version` didn't change while they were
+    re-encrypted. The rows of a batch that changed meanwhile are read again
+    and re-encrypted once more until none is left, since an edit doesn't
+    always rewrite the content (a title-only edit keeps the old ciphertext).
+
+    Args:
+        engine: A synchronous SQLAlchemy engine.
+        keys (list[str]): The Fernet keys, the new primary key first.
+        batch_size (int): The number of rows read, re-encrypted and committed together.
+        workers (int): The number of processes encrypting in parallel.
+        checkpoint (str | None): The file used to resume an interrupted run.
+        report: Called with a progress line after every batch.
+
+    Returns:
+        dict: The number of rows re-encrypted and retried after a concurrent
+              edit, the elapsed seconds and the throughput in rows per second.
+    """
+    last_id = read_checkpoint(checkpoint)
+    rotated = retried = 0
+    started = time.perf_counter()
+    chunk = max(1, batch_size // (workers * 4))
+    columns = (DataDb.id, DataDb.version, DataDb.content)
+    statement = (
+        update(DataDb.__table__)
+        .where(
+            DataDb.id == bindparam("row_id"),
+            DataDb.version == bindparam("row_version"),
+        )
+        .values(content=bindparam("new_content"), content_length=bindparam("length"))
+    )
+
+    def rotate_rows(connection, rows: list) -> int:
+        """Writes `rows` back re-encrypted, returning how many were unchanged."""
+        if not rows:
+            return 0
+        tokens = [row.content for row in rows]
+        parts = [tokens[i : i + chunk] for i in range(0, len(tokens), chunk)]
+        contents = [token for part in pool.map(_rotate, parts) for token in part]
+        result = connection.execute(
+            statement,
+            [
+                {
+                    "row_id": row.id,
+                    "row_version": row.version,
+                    "new_content": content,
+                    "length": len(content),
+                }
+                for row, content in zip(rows, contents)
+            ],
+        )
+        return result.rowcount
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(keys,)
+    ) as pool:
+        while True:
+            with engine.begin() as connection:
+                rows = connection.execute(
+                    select(*columns)
+                    .where(DataDb.id > last_id)
+                    .order_by(DataDb.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                done = rotate_rows(connection, rows)
+            last_id = rows[-1].id
+            rotated += done
+            # A new transaction each time, so the rows are read as committed.
+            pending = rows
+            while done != len(pending):
+                versions = {row.id: row.version for row in pending}
+                with engine.begin() as connection:
+                    current = connection.execute(
+                        select(*columns).where(DataDb.id.in_(versions))
+                    ).all()
+                    pending = [
+                        row for row in current if row.version != versions[row.id]
+                    ]
+                    done = rotate_rows(connection, pending)
+                rotated += done
+                retried += len(pending)
+            write_checkpoint(checkpoint, last_id)
+            elapsed = time.perf_counter() - started
+            report(
+                f"re-encrypted {rotated} rows up to id {last_id}, "
+                f"{rotated / elapsed:.0f} rows/s"
+            )
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rotated": rotated,
+        "retried": retried,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(rotated / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    from src.utils.utilities import FernetUtility, settings
+
+    parser = argparse.ArgumentParser(
+        description="Re-encrypt notes with the primary key."
+    )
+    parser.add_argument("--url", help="Database URL, defaults to the application's.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--checkpoint", help="File used to resume an interrupted run.")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url or settings.DATABASE_URL)
+    summary = reencrypt(
+        engine,
+        FernetUtility.KEYS,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        checkpoint=args.checkpoint,
+    )
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+Compaction of the note revisions.
+
+    python -m src.db.revisions compact --keep-last 50 --keep-days 30
+
+For every note with revisions, keeps its `--keep-last` newest revisions and
+the ones saved in the last `--keep-days` days, drops the others, and
+rewrites the chain of the kept ones: deltas are recomputed against the next
+kept version, snapshots are placed every `REVISION_CHAIN_MAX` revisions and
+every payload is encrypted with the primary key, so the job also completes
+a key rotation for the history. Each note is rewritten in one transaction,
+with its `datadb` row locked so a concurrent edit waits for it.
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import timedelta
+from sqlalchemy import create_engine, delete, distinct, insert, select
+from .models import DataDb, RevisionDb, utc_now
+
+
+def rebuild(revisions: list, head: str) -> list[str]:
+    """
+    Rebuilds the content of every revision of a note.
+
+    Args:
+        revisions (list): The revision rows, newest first.
+        head (str): The plaintext of the current version.
+
+    Returns:
+        list[str]: The plaintext of each revision, in the order of `revisions`.
+    """
+    from src.utils.delta import apply_delta
+    from src.utils.utilities import FernetUtility
+
+    contents, newer = [], head
+    for row in revisions:
+        if row.is_snapshot:
+            newer = FernetUtility.fernet_decrypt(row.payload)
+        else:
+            newer = apply_delta(newer, FernetUtility.delta_decrypt(row.payload))
+        contents.append(newer)
+    return contents
+
+
+def encode(kept: list, head: str, chain_max: int) -> list[dict]:
+    """
+    Encodes the kept revisions of a note as a new chain.
+
+    Args:
+        kept (list): The kept revision rows with their plaintext, newest first.
+        head (str): The plaintext of the current version.
+        chain_max (int): The maximum number of payloads decrypted to rebuild
+                         a revision, as in `AsyncRevisionSQL.add_revision`.
+
+    Returns:
+        list[dict]: The column values of the new revision rows.
+    """
+    from src.utils.delta import make_delta
+    from src.utils.utilities import FernetUtility
+
+    rows, run = [], 0
+    oldest_first = kept[::-1]
+    for index, (row, content) in enumerate(oldest_first):
+        newer = oldest_first[index + 1][1] if index + 1 < len(kept) else head
+        payload = snapshot = FernetUtility.fernet_crypt(content)
+        if run < chain_max - 1:
+            delta = FernetUtility.delta_crypt(make_delta(newer, content))
+            if len(delta) < len(snapshot):
+                payload = delta
+        run = 0 if payload is snapshot else run + 1
+        rows.append(
+            {
+                # Kept, so ids stay unique across shards, see src/db/shards.py.
+                "id": row.id,
+                "note_id": row.note_id,
+                "user_id": row.user_id,
+                "revision": row.revision,
+                "title": row.title,
+                "is_snapshot": payload is snapshot,
+                "payload": payload,
+                "payload_length": len(payload),
+                "created_at": row.created_at,
+            }
+        )
+    return rows
+
+
+def compact(engine, keep_last: int, keep_days: float, chain_max: int) -> dict:
+    """
+    Drops the revisions outside of the retention and rewrites the others.
+
+    Args:
+        engine: A synchronous SQLAlchemy engine.
+        keep_last (int): The number of newest revisions always kept per note.
+        keep_days (float): Revisions saved in the last `keep_days` days are kept.
+        chain_max (int): The maximum number of payloads decrypted to rebuild a revision.
+
+    Returns:
+        dict: The number of notes compacted, revisions kept and dropped, stored
+              bytes before and after, and the duration in seconds.
+    """
+    from src.utils.utilities import FernetUtility
+
+    cutoff = utc_now() - timedelta(days=keep_days)
+    summary = {"notes": 0, "kept": 0, "dropped": 0, "bytes_before": 0, "bytes_after": 0}
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        statement = select(distinct(RevisionDb.note_id))
+        note_ids = connection.execute(statement).scalars().all()
+    for note_id in note_ids:
+        with engine.begin() as connection:
+            head = connection.execute(
+                select(DataDb.content).where(DataDb.id == note_id).with_for_update()
+            ).scalar()
+            revisions = connection.execute(
+                select(RevisionDb)
+                .where(RevisionDb.note_id == note_id)
+                .order_by(RevisionDb.revision.desc())
+            ).all()
+            new_rows = []
+            if head is not None:
+                head = FernetUtility.fernet_decrypt(head)
+                contents = rebuild(revisions, head)
+                kept = [
+                    (row, content)
+                    for index, (row, content) in enumerate(zip(revisions, contents))
+                    if index < keep_last or row.created_at >= cutoff
+                ]
+                new_rows = encode(kept, head, chain_max)
+            connection.execute(delete(RevisionDb).where(RevisionDb.note_id == note_id))
+            if new_rows:
+                connection.execute(insert(RevisionDb), new_rows)
+        summary["notes"] += 1
+        summary["kept"] += len(new_rows)
+        summary["dropped"] += len(revisions) - len(new_rows)
+        summary["bytes_before"] += sum(row.payload_length for row in revisions)
+        summary["bytes_after"] += sum(row["payload_length"] for row in new_rows)
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def main(argv: list[str] | None = None) -> int:
+    from src.utils.utilities import settings
+
+    parser = argparse.ArgumentParser(description="Note revision maintenance.")
+    parser.add_argument("command", choices=["compact"])
+    parser.add_argument("--url", help="Database URL, defaults to the application's.")
+    parser.add_argument("--keep-last", type=int, default=50)
+    parser.add_argument("--keep-days", type=float, default=30)
+    parser.add_argument("--chain-max", type=int, default=settings.REVISION_CHAIN_MAX)
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url or settings.DATABASE_URL)
+    summary = compact(engine, args.keep_last, args.keep_days, args.chain_max)
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,590 @@
+"""
+Horizontal sharding of the users and their data across several databases.
+
+Shard 0 is `DATABASE_URL` and `SHARD_URLS` lists the others. A user and
+everything they own (notes, search tokens, attachments and revisions) live
+on one shard. The shard of a user is the jump consistent hash of their
+username, so adding a shard only remaps about 1/N of the users, unless
+`sharddirectorydb` (on shard 0) records another one: for the users that
+were moved or pinned, and for every new user with `SHARD_STRATEGY=directory`.
+
+Requests are routed by `ShardRouter.route`, awaited when the user is
+authenticated or looked up, which stores the user's shard in a context
+variable. Sessions created with `ShardedSession` send their queries to
+that shard, so the `Async*SQL` methods don't change.
+
+Ids stay unique across shards, so a moved user keeps the ids of their
+notes: the ids of shard `i` are `i + 1` modulo `SHARD_ID_STRIDE`, through
+`auto_increment_increment`/`auto_increment_offset` on MySQL and an id
+computed in the INSERT on SQLite. Keep the stride once data was written.
+
+    python -m src.db.shards init             # create the tables, start the ids above the existing ones
+    python -m src.db.shards pin              # record where the users are, before adding a shard
+    python -m src.db.shards move alice 2     # move a user to shard 2, online
+    python -m src.db.shards status
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import sys
+import time
+from contextvars import ContextVar
+from typing import NamedTuple
+from fastapi import HTTPException, status
+from sqlalchemy import Engine, delete, event, func, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session, SQLModel
+from src.utils.cache import CacheBackend, LocalCacheBackend
+from src.utils.metrics import COLLECTORS
+from src.utils.utilities import settings
+from .models import (
+    AttachmentChunkDb,
+    AttachmentDb,
+    DataDb,
+    RevisionDb,
+    SearchTokenDb,
+    ShardDirectoryDb,
+    UserDb,
+    utc_now,
+)
+
+# The models whose ids are generated, and must be unique across shards.
+ID_MODELS = [UserDb, DataDb, AttachmentDb, RevisionDb]
+
+
+class Shard(NamedTuple):
+    index: int
+    engine: Engine  # Synchronous, for the maintenance commands
+    async_engine: AsyncEngine
+    async_read_engine: AsyncEngine
+
+
+class Route(NamedTuple):
+    shard: Shard
+    moving: bool  # Writes are refused while the user is moved to another shard
+
+
+# The route of the current request, set by `ShardRouter.route`.
+CURRENT_ROUTE: ContextVar[Route | None] = ContextVar("shard_route", default=None)
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping and Veach) of a 64-bit key into `buckets`."""
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) % 2**64
+        candidate = int((bucket + 1) * (2**31 / ((key >> 33) + 1)))
+    return bucket
+
+
+class ShardRouter:
+    """
+    Maps users to shards and routes the current request to the user's shard.
+
+    Placements read from the directory are cached per worker for
+    `SHARD_DIRECTORY_TTL` seconds, so a move waits that long after every
+    directory change. With a single shard nothing is looked up.
+    """
+
+    SHARDS: list[Shard] = []
+    DIRECTORY: CacheBackend = LocalCacheBackend(
+        maxsize=settings.USER_CACHE_SIZE, ttl=settings.SHARD_DIRECTORY_TTL
+    )
+    # The shard index of every engine, for the id generation.
+    ENGINES: dict[Engine, int] = {}
+    refused_writes = 0
+
+    @staticmethod
+    def configure(shards: list[Shard]) -> None:
+        """
+        Sets the shards, shard 0 first, and prepares their engines.
+
+        Args:
+            shards (list[Shard]): The shards, in order of their index.
+        """
+        ShardRouter.SHARDS = shards
+        ShardRouter.DIRECTORY.clear()
+        ShardRouter.ENGINES = {}
+        for shard in shards:
+            for engine in (
+                shard.engine,
+                shard.async_engine.sync_engine,
+                shard.async_read_engine.sync_engine,
+            ):
+                ShardRouter.ENGINES[engine] = shard.index
+                if len(shards) > 1 and engine.dialect.name == "mysql":
+                    event.listen(engine, "connect", _set_increment(shard.index))
+
+    @staticmethod
+    def hash_shard(username: str) -> int:
+        key = int.from_bytes(hashlib.sha256(username.encode()).digest()[:8], "big")
+        return jump_hash(key, len(ShardRouter.SHARDS))
+
+    @staticmethod
+    async def lookup(username: str) -> dict:
+        """
+        Finds the shard of a user, from the cache or the directory.
+
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            dict: The placement of the user, see `to_placement`.
+        """
+        placement = ShardRouter.DIRECTORY.get(username)
+        if placement is None:
+            async with ShardRouter.SHARDS[0].async_engine.connect() as connection:
+                row = (await connection.execute(directory_query(username))).first()
+            placement = to_placement(row)
+            ShardRouter.DIRECTORY.set(username, placement)
+        return placement
+
+    @staticmethod
+    async def route(username: str) -> Route | None:
+        """
+        Routes the queries of the current request to the shard of a user.
+
+        Args:
+            username (str): The username of the user the request acts for.
+
+        Returns:
+            Route | None: The route, or None with a single shard.
+        """
+        if len(ShardRouter.SHARDS) == 1:
+            return None
+        return ShardRouter.use(await ShardRouter.lookup(username), username)
+
+    @staticmethod
+    def route_sync(username: str) -> Route | None:
+        """Synchronous `route`, for the synchronous sessions."""
+        if len(ShardRouter.SHARDS) == 1:
+            return None
+        placement = ShardRouter.DIRECTORY.get(username)
+        if placement is None:
+            with ShardRouter.SHARDS[0].engine.connect() as connection:
+                row = connection.execute(directory_query(username)).first()
+            placement = to_placement(row)
+            ShardRouter.DIRECTORY.set(username, placement)
+        return ShardRouter.use(placement, username)
+
+    @staticmethod
+    def use(placement: dict, username: str) -> Route:
+        index = placement["shard"]
+        if index is None:
+            index = ShardRouter.hash_shard(username)
+        route = Route(ShardRouter.SHARDS[index], placement["moving_to"] is not None)
+        CURRENT_ROUTE.set(route)
+        return route
+
+    @staticmethod
+    async def place(username: str) -> Route | None:
+        """
+        Routes the current request to the shard of a new user.
+
+        The user goes to the shard of the hash of their username. With
+        `SHARD_STRATEGY=directory`, that shard is also recorded in the
+        directory, so the user stays there when shards are added.
+
+        Args:
+            username (str): The username of the new user.
+
+        Returns:
+            Route | None: The route, or None with a single shard.
+        """
+        if len(ShardRouter.SHARDS) == 1:
+            return None
+        placement = await ShardRouter.lookup(username)
+        if settings.SHARD_STRATEGY == "directory" and not placement["listed"]:
+            entry = {
+                "username": username,
+                "shard": ShardRouter.hash_shard(username),
+                "updated_at": utc_now(),
+            }
+            try:
+                async with ShardRouter.SHARDS[0].async_engine.begin() as connection:
+                    await connection.execute(insert(ShardDirectoryDb).values(entry))
+            except IntegrityError:
+                # Recorded by a concurrent registration of the same username.
+                pass
+            ShardRouter.DIRECTORY.delete(username)
+            placement = await ShardRouter.lookup(username)
+        return ShardRouter.use(placement, username)
+
+    @staticmethod
+    def current() -> Shard:
+        """Returns the shard of the current request, shard 0 when it isn't routed."""
+        route = CURRENT_ROUTE.get()
+        return route.shard if route else ShardRouter.SHARDS[0]
+
+    @staticmethod
+    def check_writable() -> None:
+        """
+        Refuses the writes of a user who is being moved to another shard.
+
+        Raises:
+            HTTPException: If the current request's user is being moved (503).
+        """
+        route = CURRENT_ROUTE.get()
+        if route is not None and route.moving:
+            ShardRouter.refused_writes += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The account is being moved, try again shortly",
+                headers={"Retry-After": str(math.ceil(settings.SHARD_DIRECTORY_TTL))},
+            )
+
+
+def to_placement(row) -> dict:
+    """
+    Builds the placement of a user from their directory entry.
+
+    Args:
+        row: The `shard` and `moving_to` of the user's directory entry, or
+             None for a user placed by the hash of their username.
+
+    Returns:
+        dict: The `shard` (None for the hash), `moving_to` (None unless the
+              user is being moved) and whether the user is `listed` in the directory.
+    """
+    if row is None:
+        return {"shard": None, "moving_to": None, "listed": False}
+    return {"shard": row.shard, "moving_to": row.moving_to, "listed": True}
+
+
+def directory_query(username: str):
+    return select(ShardDirectoryDb.shard, ShardDirectoryDb.moving_to).where(
+        ShardDirectoryDb.username == username
+    )
+
+
+def _set_increment(index: int):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(
+            f"SET SESSION auto_increment_increment = {settings.SHARD_ID_STRIDE}, "
+            f"auto_increment_offset = {index + 1}"
+        )
+        cursor.close()
+
+    return on_connect
+
+
+def _next_id(mapper, connection, target) -> None:
+    # SQLite has no increment settings: the id is computed in the INSERT, as the
+    # first id of the shard's residue above the largest one, and read back
+    # with RETURNING. The INSERT holds the write lock while computing it.
+    if target.id is not None or connection.dialect.name != "sqlite":
+        return
+    index = ShardRouter.ENGINES.get(connection.engine)
+    if index is None or len(ShardRouter.SHARDS) == 1:
+        return
+    stride, column = settings.SHARD_ID_STRIDE, mapper.local_table.c.id
+    above = func.coalesce(func.max(column), 0) + 1
+    target.id = select(
+        above + ((index + 1 - above) % stride + stride) % stride
+    ).scalar_subquery()
+
+
+for _model in ID_MODELS:
+    event.listen(_model, "before_insert", _next_id)
+
+
+class ShardedSession(Session):
+    """
+    Session sending its queries to the shard of the current request.
+
+    Sessions are created for the engines of shard 0, as without sharding,
+    and `get_bind` swaps them for their counterpart on the routed shard.
+    Requests that weren't routed, such as the login page, stay on shard 0.
+    """
+
+    def get_bind(self, mapper=None, **kwargs):
+        bind = super().get_bind(mapper, **kwargs)
+        route = CURRENT_ROUTE.get()
+        if route is None or route.shard.index == 0:
+            return bind
+        catalog = ShardRouter.SHARDS[0]
+        if bind is catalog.engine:
+            return route.shard.engine
+        if bind is catalog.async_read_engine.sync_engine:
+            return route.shard.async_read_engine.sync_engine
+        return route.shard.async_engine.sync_engine
+
+
+@event.listens_for(ShardedSession, "do_orm_execute")
+def _refuse_statement(orm_execute_state) -> None:
+    if not orm_execute_state.is_select:
+        ShardRouter.check_writable()
+
+
+@event.listens_for(ShardedSession, "before_flush")
+def _refuse_flush(session, flush_context, instances) -> None:
+    if session.new or session.dirty or session.deleted:
+        ShardRouter.check_writable()
+
+
+COLLECTORS.append(
+    lambda: {
+        "shard_refused_writes": ShardRouter.refused_writes,
+        **{
+            f"shard_directory_{key}": value
+            for key, value in getattr(ShardRouter.DIRECTORY, "stats", dict)().items()
+        },
+    }
+)
+
+
+def user_tables(user_id: int) -> list[tuple]:
+    """
+    Lists the rows of a user, parents first.
+
+    Args:
+        user_id (int): The ID of the user.
+
+    Returns:
+        list[tuple]: The table and the WHERE clause selecting the user's rows in it.
+    """
+    attachments = select(AttachmentDb.id).where(AttachmentDb.user_id == user_id)
+    return [
+        (UserDb.__table__, UserDb.id == user_id),
+        (DataDb.__table__, DataDb.user_id == user_id),
+        (SearchTokenDb.__table__, SearchTokenDb.user_id == user_id),
+        (AttachmentDb.__table__, AttachmentDb.user_id == user_id),
+        (
+            AttachmentChunkDb.__table__,
+            AttachmentChunkDb.attachment_id.in_(attachments),
+        ),
+        (RevisionDb.__table__, RevisionDb.user_id == user_id),
+    ]
+
+
+def prepare(shards: list[Shard]) -> dict:
+    """
+    Creates the missing tables of every shard and, on MySQL, starts the ids
+    of each shard above the largest id of any shard, so the ids allocated
+    before sharding can't be reused.
+
+    Args:
+        shards (list[Shard]): The shards, shard 0 first.
+
+    Returns:
+        dict: The first id of each table and shard that was moved up.
+    """
+    for shard in shards:
+        SQLModel.metadata.create_all(shard.engine)
+    floors = {model.__tablename__: 0 for model in ID_MODELS}
+    for shard in shards:
+        with shard.engine.connect() as connection:
+            for model in ID_MODELS:
+                highest = connection.execute(select(func.max(model.id))).scalar() or 0
+                floors[model.__tablename__] = max(floors[model.__tablename__], highest)
+    summary = {}
+    for shard in shards[1:]:
+        if shard.engine.dialect.name != "mysql":
+            continue
+        with shard.engine.begin() as connection:
+            for table, floor in floors.items():
+                connection.execute(
+                    text(f"ALTER TABLE {table} AUTO_INCREMENT = {floor + 1}")
+                )
+                summary[f"{table}@{shard.index}"] = floor + 1
+    return summary
+
+
+def set_entry(username: str, shard: int, moving_to: int | None) -> None:
+    """Records the shard of a user in the directory."""
+    values = {"shard": shard, "moving_to": moving_to, "updated_at": utc_now()}
+    with ShardRouter.SHARDS[0].engine.begin() as connection:
+        updated = connection.execute(
+            update(ShardDirectoryDb)
+            .where(ShardDirectoryDb.username == username)
+            .values(values)
+        )
+        if not updated.rowcount:
+            connection.execute(
+                insert(ShardDirectoryDb).values(username=username, **values)
+            )
+
+
+def copy_user(source: Shard, target: Shard, user_id: int, batch_size: int) -> dict:
+    """
+    Copies the rows of a user to another shard, replacing any earlier copy.
+
+    Args:
+        source (Shard): The shard the user is on.
+        target (Shard): The shard receiving the copy.
+        user_id (int): The ID of the user.
+        batch_size (int): The number of rows read and inserted at a time.
+
+    Returns:
+        dict: The number of rows copied per table.
+    """
+    copied = {}
+    with source.engine.connect() as reader, target.engine.begin() as writer:
+        for table, clause in reversed(user_tables(user_id)):
+            writer.execute(delete(table).where(clause))
+        for table, clause in user_tables(user_id):
+            result = reader.execution_options(yield_per=batch_size).execute(
+                select(table).where(clause)
+            )
+            copied[table.name] = 0
+            for rows in result.partitions():
+                writer.execute(insert(table), [row._asdict() for row in rows])
+                copied[table.name] += len(rows)
+    return copied
+
+
+def delete_user(shard: Shard, user_id: int) -> None:
+    """Deletes the rows of a user from a shard."""
+    with shard.engine.begin() as connection:
+        for table, clause in reversed(user_tables(user_id)):
+            connection.execute(delete(table).where(clause))
+
+
+def move_user(username: str, target: int, settle: float, batch_size: int) -> dict:
+    """
+    Moves a user and their data to another shard, while the application runs.
+
+    The user is marked as moving in the directory and, once every worker's
+    cache has seen it (`settle` seconds), their writes are refused with 503
+    while their rows are copied; reads are still served from the source.
+    The directory then points to the target, and the source rows are
+    deleted `settle` seconds later, once no worker reads them anymore. If
+    the copy fails, the user stays on the source and writes resume.
+
+    Args:
+        username (str): The username of the user.
+        target (int): The index of the shard to move the user to.
+        settle (float): Seconds to wait for the workers to see a directory
+                        change; at least `SHARD_DIRECTORY_TTL`.
+        batch_size (int): The number of rows copied at a time.
+
+    Returns:
+        dict: The source and target shards, the rows copied per table and the
+              seconds the user's writes were refused.
+
+    Raises:
+        ValueError: If the shard or the user doesn't exist, or the user is
+                    already being moved to another shard.
+    """
+    shards = ShardRouter.SHARDS
+    if not 0 <= target < len(shards):
+        raise ValueError(f"Shard {target} doesn't exist")
+    with shards[0].engine.connect() as connection:
+        row = connection.execute(directory_query(username)).first()
+    if row is not None and row.moving_to not in (None, target):
+        raise ValueError(f"{username} is being moved to shard {row.moving_to}")
+    source = row.shard if row is not None else ShardRouter.hash_shard(username)
+    summary = {"source": source, "target": target, "copied": {}, "frozen_seconds": 0}
+    if source == target:
+        return summary
+    with shards[source].engine.connect() as connection:
+        user_id = connection.execute(
+            select(UserDb.id).where(UserDb.username == username)
+        ).scalar()
+    if user_id is None:
+        raise ValueError(f"{username} doesn't exist on shard {source}")
+
+    set_entry(username, source, moving_to=target)
+    frozen = time.perf_counter()
+    time.sleep(settle)
+    try:
+        summary["copied"] = copy_user(
+            shards[source], shards[target], user_id, batch_size
+        )
+    except BaseException:
+        set_entry(username, source, moving_to=None)
+        raise
+    set_entry(username, target, moving_to=None)
+    summary["frozen_seconds"] = round(time.perf_counter() - frozen, 3)
+    time.sleep(settle)
+    delete_user(shards[source], user_id)
+    return summary
+
+
+def pin() -> dict:
+    """
+    Records in the directory the shard of every user it doesn't list yet
+    and who isn't on the shard of their hash (every user, with
+    `SHARD_STRATEGY=directory`). Run it after adding a shard to
+    `SHARD_URLS`, before the workers use the new configuration.
+
+    Returns:
+        dict: The number of users pinned per shard.
+    """
+    shards = ShardRouter.SHARDS
+    with shards[0].engine.connect() as connection:
+        listed = set(connection.execute(select(ShardDirectoryDb.username)).scalars())
+    summary = {}
+    for shard in shards:
+        with shard.engine.connect() as connection:
+            usernames = connection.execute(select(UserDb.username)).scalars().all()
+        entries = [
+            {"username": username, "shard": shard.index, "updated_at": utc_now()}
+            for username in usernames
+            if username not in listed
+            and (
+                settings.SHARD_STRATEGY == "directory"
+                or ShardRouter.hash_shard(username) != shard.index
+            )
+        ]
+        if entries:
+            with shards[0].engine.begin() as connection:
+                connection.execute(insert(ShardDirectoryDb), entries)
+        summary[shard.index] = len(entries)
+    return summary
+
+
+def shard_status() -> dict:
+    """Counts the users and notes of every shard and the users being moved."""
+    shards = ShardRouter.SHARDS
+    summary = {}
+    for shard in shards:
+        with shard.engine.connect() as connection:
+            summary[shard.index] = {
+                "users": connection.execute(select(func.count(UserDb.id))).scalar(),
+                "notes": connection.execute(select(func.count(DataDb.id))).scalar(),
+            }
+    with shards[0].engine.connect() as connection:
+        moving = connection.execute(
+            select(ShardDirectoryDb.username, ShardDirectoryDb.moving_to).where(
+                ShardDirectoryDb.moving_to.is_not(None)
+            )
+        ).all()
+    return {"shards": summary, "moving": dict(moving)}
+
+
+def main(argv: list[str] | None = None) -> int:
+    # Configures the shards of the application.
+    from . import database  # noqa: F401
+
+    parser = argparse.ArgumentParser(description="Shard maintenance.")
+    parser.add_argument("command", choices=["init", "pin", "move", "status"])
+    parser.add_argument("username", nargs="?")
+    parser.add_argument("target", nargs="?", type=int)
+    parser.add_argument(
+        "--settle", type=float, default=settings.SHARD_DIRECTORY_TTL + 1
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.command == "init":
+        summary = prepare(ShardRouter.SHARDS)
+    elif args.command == "pin":
+        summary = pin()
+    elif args.command == "move":
+        if args.username is None or args.target is None:
+            parser.error("move takes a username and a target shard")
+        summary = move_user(args.username, args.target, args.settle, args.batch_size)
+    else:
+        summary = shard_status()
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,25 @@
-from src.routes import auth, new_content, page, register
+import asyncio
+from src.routes import (
+    api,
+    attachments,
+    auth,
+    bulk,
+    metrics,
+    new_content,
+    page,
+    register,
+)
 
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse, RedirectResponse
-from src.db.database import create_db_and_tables
-from fastapi.staticfiles import StaticFiles
+from src.db.database import create_db_and_tables, prewarm_pools
+from src.utils.assets import STATIC_ASSETS
+from src.utils.utilities import PWD, TEMPLATES, settings
+from src.middleware import (
+    MetricsMiddleware,
+    RateLimitMiddleware,
+    TokenRefreshMiddleware,
+)
 
 
 app = FastAPI()
@@ -11,25 +27,51 @@ app.include_router(auth.router_auth)
 app.include_router(register.router_register)
 app.include_router(page.router_home)
 app.include_router(new_content.router_new_content)
+app.include_router(bulk.router_bulk)
+app.include_router(attachments.router_attachments)
+app.include_router(api.router_api)
+app.include_router(metrics.router_metrics)
+app.add_middleware(TokenRefreshMiddleware)
+# Outside the token refresh, so throttled requests do no work at all.
+app.add_middleware(RateLimitMiddleware)
+# Added last so it is the outermost middleware and times the whole request.
+app.add_middleware(MetricsMiddleware)
 
 """
-Mounts the "/static" route to serve static files from the specified directory.
+Mounts the "/static" route to serve the static assets of "src/static".
 
-- The directory "src/static" contains static resources (CSS and HTML).
+- The assets (CSS) are served from memory, precompressed, under fingerprinted
+  URLs cached as immutable; see `src/utils/assets.py`.
 - The name "static" is used to reference this route in the app.
 """
-app.mount("/static", StaticFiles(directory="src/static"), name="static")
+app.mount("/static", STATIC_ASSETS, name="static")
 
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     """
     Initializes the application during startup.
 
-    This function is triggered when the application starts. It ensures that
-    the database schema is created by invoking `create_db_and_tables()`.
+    This function is triggered when the application starts. Unless
+    `STARTUP_CREATE_TABLES` is off, as in production where the schema is
+    managed by the migrations, it creates the missing tables by invoking
+    `create_db_and_tables()`. It compiles every template, so the first
+    requests don't pay for it, and with `STARTUP_PREWARM` also opens
+    `DB_POOL_SIZE` connections per pool and loads the bcrypt backend. With
+    `PROFILER_ENABLED`, it also starts sampling the event loop's thread.
     """
-    create_db_and_tables()
+    if settings.STARTUP_CREATE_TABLES:
+        create_db_and_tables()
+    for name in TEMPLATES.env.list_templates(extensions=["html"]):
+        TEMPLATES.env.get_template(name)
+    if settings.STARTUP_PREWARM:
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            prewarm_pools(settings.DB_POOL_SIZE),
+            loop.run_in_executor(PWD.EXECUTOR, PWD.load_backend),
+        )
+    if settings.PROFILER_ENABLED:
+        metrics.PROFILER.start()
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -0,0 +1,3 @@
+from .tokens import TokenRefreshMiddleware
+from .metrics import MetricsMiddleware
+from .ratelimit import RateLimitMiddleware
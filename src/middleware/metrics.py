@@ -0,0 +1,43 @@
+import time
+from src.utils.metrics import REQUESTS
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the duration of every HTTP request under
+    `http_request_duration_seconds{method, route, status}`.
+
+    Requests are labelled with the path template of the route that handled
+    them (for example `/user/home/content/note/{note_id}`), so the number of
+    series doesn't grow with the ids in the URLs. Streamed responses are
+    timed until their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUESTS.observe(
+                (
+                    scope["method"],
+                    getattr(route, "path", "unmatched"),
+                    status,
+                ),
+                time.perf_counter() - started,
+            )
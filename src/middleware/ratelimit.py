@@ -0,0 +1,107 @@
+import math
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from src.utils.ratelimit import RateLimiter
+from src.utils.utilities import settings
+
+# Endpoints that verify or hash a password with bcrypt.
+THROTTLED_PATHS = frozenset({"/token", "/user/register", "/api/v1/token"})
+# Largest body read on those endpoints; their forms are a few hundred bytes.
+MAX_BODY_BYTES = 16 * 1024
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware throttling the login and registration endpoints with the
+    token buckets of `RateLimiter`, one per client IP and one per username.
+
+    The IP bucket is checked before the body is read, the username bucket
+    once the form is parsed, and both before the route runs, so a rejected
+    request never reaches the database or bcrypt. Rejections are answered
+    with 429 and a `Retry-After` header. The body is replayed to the route
+    unchanged. Bodies over `MAX_BODY_BYTES` are rejected with 413, before
+    being read when their `Content-Length` says so, so a worker never holds
+    more than that per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in THROTTLED_PATHS
+            or not settings.RATE_LIMIT_ENABLED
+        ):
+            return await self.app(scope, receive, send)
+
+        retry_after = RateLimiter.check_ip(self._client_ip(scope))
+        if retry_after:
+            return await self._reject(retry_after, scope, receive, send)
+
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > MAX_BODY_BYTES:
+            return await self._too_large(scope, receive, send)
+        body, size, more_body = [], 0, True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                return await self.app(scope, receive, send)
+            body.append(message.get("body", b""))
+            size += len(body[-1])
+            if size > MAX_BODY_BYTES:
+                return await self._too_large(scope, receive, send)
+            more_body = message.get("more_body", False)
+        body = b"".join(body)
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        username = await self._username(scope, body)
+        if username:
+            retry_after = RateLimiter.check_username(username)
+            if retry_after:
+                return await self._reject(retry_after, scope, receive, send)
+        await self.app(scope, replay, send)
+
+    @staticmethod
+    def _client_ip(scope) -> str:
+        if settings.RATE_LIMIT_TRUST_PROXY:
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    @staticmethod
+    async def _username(scope, body: bytes) -> str | None:
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        try:
+            async with Request(scope, receive).form() as form:
+                username = form.get("username")
+        except Exception:
+            # Malformed bodies are left for the route to reject.
+            return None
+        return username if isinstance(username, str) else None
+
+    @staticmethod
+    async def _reject(retry_after: float, scope, receive, send) -> None:
+        response = PlainTextResponse(
+            "Too many attempts, try again later",
+            status_code=429,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+        await response(scope, receive, send)
+
+    @staticmethod
+    async def _too_large(scope, receive, send) -> None:
+        response = PlainTextResponse("The request is too large", status_code=413)
+        await response(scope, receive, send)
@@ -0,0 +1,71 @@
+from fastapi import HTTPException
+from fastapi.responses import Response
+from starlette.requests import cookie_parser
+from src.routes.auth import set_token_cookies
+from src.utils.utilities import JWTUtility
+
+
+class TokenRefreshMiddleware:
+    """
+    ASGI middleware that rotates the token cookies when the access token is
+    missing or expired but the refresh token is still valid.
+
+    The new access token replaces the old one in the request's `Cookie`
+    header, so `verify_cookies` accepts the request that triggered the
+    refresh, and both new tokens are set on its response. Requests without a
+    refresh token, or with a valid access token, pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/static"):
+            return await self.app(scope, receive, send)
+
+        cookies = cookie_parser(
+            b"; ".join(
+                value for name, value in scope["headers"] if name == b"cookie"
+            ).decode("latin-1")
+        )
+        refresh_token = cookies.get("refresh_token")
+        if not refresh_token or self._is_valid(cookies.get("access_token")):
+            return await self.app(scope, receive, send)
+        try:
+            access_token, refresh_token = JWTUtility.refresh(refresh_token)
+        except HTTPException:
+            return await self.app(scope, receive, send)
+
+        cookies["access_token"] = access_token
+        cookie_header = "; ".join(f"{name}={value}" for name, value in cookies.items())
+        # Updated in place, so outer middleware sees what routing adds to the scope.
+        scope["headers"] = [
+            (name, value) for name, value in scope["headers"] if name != b"cookie"
+        ] + [(b"cookie", cookie_header.encode("latin-1"))]
+        new_cookies = Response()
+        set_token_cookies(new_cookies, access_token, refresh_token)
+        set_cookie_headers = [
+            (name, value)
+            for name, value in new_cookies.raw_headers
+            if name == b"set-cookie"
+        ]
+
+        async def send_with_cookies(message):
+            if message["type"] == "http.response.start":
+                message = dict(
+                    message,
+                    headers=list(message.get("headers", [])) + set_cookie_headers,
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookies)
+
+    @staticmethod
+    def _is_valid(access_token: str | None) -> bool:
+        if not access_token:
+            return False
+        try:
+            JWTUtility.decode_jwt(access_token)
+        except HTTPException:
+            return False
+        return True
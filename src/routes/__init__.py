@@ -2,3 +2,7 @@ from .register import router_register
 from .page import router_home
 from .new_content import router_new_content
 from .auth import router_auth
+from .bulk import router_bulk
+from .api import router_api
+from .metrics import router_metrics
+from .attachments import router_attachments
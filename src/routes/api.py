@@ -0,0 +1,529 @@
+import orjson
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from fastapi.security import OAuth2PasswordRequestForm
+from pydantic import BaseModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Annotated
+from src.db.models import UserDb
+from src.db.groupcommit import NOTE_WRITER
+from src.db.shards import ShardedSession
+from src.db.database import (
+    ASYNC_READ_ENGINE,
+    ASYNCREADSESSIONDEP,
+    ASYNCSESSIONDEP,
+    AsyncAttachmentSQL,
+    AsyncDataSQL,
+    AsyncRevisionSQL,
+    AsyncSearchSQL,
+)
+from src.utils.attachments import check_length
+from src.utils.utilities import FernetUtility, JWTUtility, settings
+from .attachments import attachment_response, save_attachment
+from .auth import authenticate_user, verify_api_token
+from .page import PAGE_SIZE
+
+router_api = APIRouter(
+    prefix="/api/v1", tags=["API"], default_response_class=ORJSONResponse
+)
+
+NDJSON = "application/x-ndjson"
+
+
+class NoteIn(BaseModel):
+    title: str
+    content: str
+
+
+class NoteUpdate(NoteIn):
+    version: int  # The version the change is based on
+
+
+def note_json(note) -> dict:
+    """
+    Serializes a note with its decrypted content.
+
+    Args:
+        note (DataDb): The note, as returned by `AsyncDataSQL.get_content_id`.
+
+    Returns:
+        dict: The note's fields, without the stored hash.
+    """
+    return {
+        "id": note.id,
+        "title": note.title,
+        "content": note.content,
+        "version": note.version,
+        "created_at": note.created_at,
+        "updated_at": note.updated_at,
+    }
+
+
+@router_api.post("/token")
+async def api_token(
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    session: ASYNCSESSIONDEP,
+) -> ORJSONResponse:
+    """
+    Exchanges a username and password for an access and refresh token pair.
+
+    Args:
+        form_data (Annotated[OAuth2PasswordRequestForm, Depends()]): The username and password.
+        session (ASYNCSESSIONDEP): The async database session dependency.
+
+    Returns:
+        ORJSONResponse: The `access_token` (sent as `Authorization: Bearer <token>`),
+                        the `refresh_token` and the lifetime of the access token.
+
+    Raises:
+        HTTPException: If the user does not exist (404), the password is incorrect (401)
+                       or the password worker pool is saturated (503).
+    """
+    user = await authenticate_user(form_data, session)
+    access_token, refresh_token = JWTUtility.create_tokens(user.username, user.id)
+    return ORJSONResponse(
+        {
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "token_type": "bearer",
+            "expires_in": settings.ACCESS_TOKEN_TTL,
+        }
+    )
+
+
+@router_api.post("/token/refresh")
+async def api_refresh_token(refresh_token: str = Form(...)) -> ORJSONResponse:
+    """
+    Exchanges a refresh token for a new token pair; the old one stops working.
+
+    Args:
+        refresh_token (str): The refresh token, from the form.
+
+    Returns:
+        ORJSONResponse: The new `access_token` and `refresh_token`.
+
+    Raises:
+        HTTPException: If the refresh token is invalid, expired or was already used (401).
+    """
+    access_token, refresh_token = JWTUtility.refresh(refresh_token)
+    return ORJSONResponse(
+        {
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "token_type": "bearer",
+            "expires_in": settings.ACCESS_TOKEN_TTL,
+        }
+    )
+
+
+@router_api.get("/notes")
+async def list_notes(
+    request: Request,
+    current_user: Annotated[UserDb, Depends(verify_api_token)],
+    session: ASYNCREADSESSIONDEP,
+    after: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = PAGE_SIZE,
+    content: bool = False,
+):
+    """
+    Lists the user's notes, one page at a time or streamed.
+
+    With `Accept: application/x-ndjson`, every note is streamed as one JSON
+    object per line, read in keyset-ordered batches so memory use doesn't grow
+    with the notebook. Otherwise one page of `id` and `title` is returned.
+
+    Args:
+        request (Request): The HTTP request, used for content negotiation.
+        current_user (Annotated[UserDb, Depends(verify_api_token)]): The authenticated user.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+        after (int | None): The cursor returned with the previous page.
+        limit (int): The maximum number of notes in the page, between 1 and 1000.
+        content (bool): Whether streamed notes include their decrypted content.
+
+    Returns:
+        ORJSONResponse | StreamingResponse: The page under `items` and `next_cursor`,
+                                            or the NDJSON stream of all notes.
+    """
+    if NDJSON in request.headers.get("accept", ""):
+        return StreamingResponse(
+            stream_notes(current_user.id, content), media_type=NDJSON
+        )
+    items, next_cursor = await AsyncDataSQL.get_titles_page(
+        user_id=current_user.id, session=session, after_id=after, limit=limit
+    )
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
+
+
+async def stream_notes(user_id: int, with_content: bool):
+    """
+    Yields the NDJSON lines of a user's notes, one batch at a time.
+
+    The stream opens its own session, because dependency sessions are closed
+    before the response body is sent.
+    """
+    async with AsyncSession(
+        ASYNC_READ_ENGINE, sync_session_class=ShardedSession
+    ) as session:
+        async for rows in AsyncDataSQL.iter_notes(
+            user_id=user_id,
+            session=session,
+            batch_size=settings.BULK_BATCH_SIZE,
+            with_content=with_content,
+        ):
+            notes = [
+                {
+                    "id": row.id,
+                    "title": row.title,
+                    "version": row.version,
+                    "created_at": row.created_at,
+                    "updated_at": row.updated_at,
+                }
+                for row in rows
+            ]
+            if with_content:
+                contents = await FernetUtility.fernet_decrypt_batch(
+                    [row.content for row in rows]
+                )
+                for note, text in zip(notes, contents):
+                    note["content"] = text
+            yield b"".join(
+                orjson.dumps(note, option=orjson.OPT_APPEND_NEWLINE) for note in notes
+            )
+
+
+@router_api.post("/notes", status_code=status.HTTP_201_CREATED)
+async def create_note(
+    note: NoteIn,
+    current_user: Annotated[UserDb, Depends(verify_api_token)],
+    session: ASYNCSESSIONDEP,
+) -> ORJSONResponse:
+    """
+    Creates a note, in a group commit with `GROUP_COMMIT_ENABLED`.
+
+    Args:
+        note (NoteIn): The title and content of the note.
+        current_user (Annotated[UserDb, Depends(verify_api_token)]): The authenticated user.
+        session (ASYNCSESSIONDEP): The async database session dependency.
+
+    Returns:
+        ORJSONResponse: The `id` and `version` of the new note, with status 201.
+    """
+    encrypted_content = FernetUtility.fernet_crypt(note.content)
+    if settings.GROUP_COMMIT_ENABLED:
+        note_id = await NOTE_WRITER.add(
+            title=note.title,
+            encrypted_content=encrypted_content,
+            user_id=current_user.id,
+            content=note.content,
+        )
+    else:
+        note_id = await AsyncDataSQL.add_data(
+            title=note.title,
+            encrypted_content=encrypted_content,
+            user_id=current_user.id,
+            session=session,
+            content=note.content,
+        )
+    return ORJSONResponse(
+        {"id": note_id, "version": 1}, status_code=status.HTTP_201_CREATED
+    )
+
+
+@router_api.get("/notes/{note_id}")
+async def read_note(
+    note_id: int,
+    current_user: Annotated[UserDb, Depends(verify_api_token)],
+    session: ASYNCREADSESSIONDEP,
+) -> ORJSONResponse:
+    """
+    Returns a note with its decrypted content.
+
+    Args:
+        note_id (int): The ID of the note.
+        current_user (Annotated[UserDb, Depends(verify_api_token)]): The authenticated user.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+
+    Returns:
+        ORJSONResponse: The note's `id`, `title`, `content`, `version` and timestamps.
+
+    Raises:
+        HTTPException: If the note does not exist or belongs to another user (404).
+    """
+    note = await AsyncDataSQL.get_content_id(
+        user_id=current_user.id, datadb_id=note_id, session=session
+    )
+    if note is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="The note does not exist"
+        )
+    return ORJSONResponse(note_json(note))
+
+
+@router_api.put("/notes/{note_id}")
+async def update_note(
+    note_id: int,
+    note: NoteUpdate,
+    current_user: Annotated[UserDb, Depends(verify_api_token)],
+    session: ASYNCSESSIONDEP,
+) -> ORJSONResponse:
+    """
+    Replaces the title and content of a note.
+
+    Args:
+        note_id (int): The ID of the note.
+        note (NoteUpdate): The new title and content, and the version they are based on.
+        current_user (Annotated[UserDb, Depends(verify_api_token)]): The authenticated user.
+        session (ASYNCSESSIONDEP): The async database session dependency.
+
+    Returns:
+        ORJSONResponse: The `id` and new `version` of the note.
+
+    Raises:
+        HTTPException: If the note does not exist (404) or was changed since `version` (409).
+    """
+    version = await AsyncDataSQL.update_data(
+        user_id=current_user.id,
+        datadb_id=note_id,
+        version=note.version,
+        title=note.title,
+        content=note.content,
+        session=session,
+    )
+    return ORJSONResponse({"id": note_id, "version": version})
+
+
+@router_api.delete("/notes/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_note(
+    note_id: int,
+    version: int,
+    current_user: Annotated[UserDb, Depends(verify_api_token)],
+    session: ASYNCSESSIONDEP,
+) -> Response:
+    """
+    Deletes a note.
+
+    Args:
+        note_id (int): The ID of the note.
+        version (int): The version of the note the client last saw, from the query string.
+        current_user (Annotated[UserDb, Depends(verify_api_token)]): The authenticated user.
+        session (ASYNCSESSIONDEP): The async database session dependency.
+
+    Returns:
+        Response: An empty response with status 204.
+
+    Raises:
+        HTTPException: If the note does not exist (404) or was changed since `version` (409).
+    """
+    await AsyncDataSQL.delete_data(
+        user_id=current_user.id, datadb_id=note_id, version=version, session=session
+    )
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router_api.get("/notes/{note_id}/revisions")
+async def list_revisions(
+    note_id: int,
+    current_user: Annotated[UserDb, Depends(verify_api_token)],
+    session: ASYNCREADSESSIONDEP,
+) -> ORJSONResponse:
+    """
+    Lists the past versions of a note.
+
+    Args:
+        note_id (int): The ID of the note.
+        current_user (Annotated[UserDb, Depends(verify_api_token)]): The authenticated user.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+
+    Returns:
+        ORJSONResponse: The `revision`, `title`, `created_at` and stored `size` of each
+                        version under `items`, newest first.
+    """
+    items = await AsyncRevisionSQL.get_history(
+        user_id=current_user.id, note_id=note_id, session=session
+    )
+    return ORJSONResponse({"items": items})
+
+
+@router_api.get("/notes/{note_id}/revisions/{revision}")
+async def read_revision(
+    note_id: int,
+    revision: int,
+    current_user: Annotated[UserDb, Depends(verify_api_token)],
+    session: ASYNCREADSESSIONDEP,
+) -> ORJSONResponse:
+    """
+    Returns a past version of a note.
+
+    Args:
+        note_id (int): The ID of the note.
+        revision (int): The version, as listed by `list_revisions`.
+        current_user (Annotated[UserDb, Depends(verify_api_token)]): The authenticated user.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+
+    Returns:
+        ORJSONResponse: The `revision`, `title`, `content` and `created_at` of the version.
+
+    Raises:
+        HTTPException: If the version is not kept (404).
+    """
+    found = await AsyncRevisionSQL.get_revision(
+        user_id=current_user.id, note_id=note_id, revision=revision, session=session
+    )
+    if found is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="The revision does not exist"
+        )
+    return ORJSONResponse(found)
+
+
+@router_api.get("/search")
+async def search(
+    q: str,
+    current_user: Annotated[UserDb, Depends(verify_api_token)],
+    session: ASYNCREADSESSIONDEP,
+    limit: Annotated[int, Query(ge=1, le=200)] = PAGE_SIZE,
+) -> ORJSONResponse:
+    """
+    Searches the user's notes, with the same syntax as the homepage search.
+
+    Args:
+        q (str): The words to search for; `term*` matches words starting with `term`.
+        current_user (Annotated[UserDb, Depends(verify_api_token)]): The authenticated user.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+        limit (int): The maximum number of results, between 1 and 200.
+
+    Returns:
+        ORJSONResponse: The `id` and `title` of the matching notes under `items`, newest first.
+    """
+    items = await AsyncSearchSQL.search(
+        user_id=current_user.id, query=q, session=session, limit=limit
+    )
+    return ORJSONResponse({"items": items})
+
+
+@router_api.get("/notes/{note_id}/attachments")
+async def list_attachments(
+    note_id: int,
+    current_user: Annotated[UserDb, Depends(verify_api_token)],
+    session: ASYNCREADSESSIONDEP,
+) -> ORJSONResponse:
+    """
+    Lists the attachments of a note.
+
+    Args:
+        note_id (int): The ID of the note.
+        current_user (Annotated[UserDb, Depends(verify_api_token)]): The authenticated user.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+
+    Returns:
+        ORJSONResponse: The `id`, `filename`, `content_type`, `size` and `created_at`
+                        of each attachment under `items`.
+    """
+    items = await AsyncAttachmentSQL.get_attachments(
+        user_id=current_user.id, note_id=note_id, session=session
+    )
+    return ORJSONResponse({"items": items})
+
+
+@router_api.post("/notes/{note_id}/attachments", status_code=status.HTTP_201_CREATED)
+async def create_attachment(
+    request: Request,
+    note_id: int,
+    filename: str,
+    current_user: Annotated[UserDb, Depends(verify_api_token)],
+    session: ASYNCSESSIONDEP,
+) -> ORJSONResponse:
+    """
+    Attaches the request body to a note, stored as it is streamed in.
+
+    Args:
+        request (Request): The HTTP request; its body is the file and its
+                           `Content-Type` the file's media type.
+        note_id (int): The ID of the note.
+        filename (str): The name of the file, from the query string.
+        current_user (Annotated[UserDb, Depends(verify_api_token)]): The authenticated user.
+        session (ASYNCSESSIONDEP): The async database session dependency.
+
+    Returns:
+        ORJSONResponse: The `id` and `size` of the new attachment, with status 201.
+
+    Raises:
+        HTTPException: If the note does not exist (404) or the file is too large (413).
+    """
+    check_length(request.headers, settings.ATTACHMENT_MAX_BYTES)
+    attachment = await save_attachment(
+        user_id=current_user.id,
+        note_id=note_id,
+        filename=filename,
+        content_type=request.headers.get("content-type"),
+        stream=request.stream(),
+        session=session,
+    )
+    return ORJSONResponse(
+        {"id": attachment.id, "size": attachment.size},
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
+@router_api.get("/notes/{note_id}/attachments/{attachment_id}")
+async def read_attachment(
+    request: Request,
+    note_id: int,
+    attachment_id: int,
+    current_user: Annotated[UserDb, Depends(verify_api_token)],
+    session: ASYNCREADSESSIONDEP,
+) -> Response:
+    """
+    Downloads an attachment; a `Range` header selects a byte range of it.
+
+    Args:
+        request (Request): The HTTP request, for its range headers.
+        note_id (int): The ID of the note.
+        attachment_id (int): The ID of the attachment.
+        current_user (Annotated[UserDb, Depends(verify_api_token)]): The authenticated user.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+
+    Returns:
+        Response: The attachment, streamed; see `attachment_response`.
+    """
+    return await attachment_response(
+        request=request,
+        user_id=current_user.id,
+        note_id=note_id,
+        attachment_id=attachment_id,
+        session=session,
+    )
+
+
+@router_api.delete(
+    "/notes/{note_id}/attachments/{attachment_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def delete_attachment(
+    note_id: int,
+    attachment_id: int,
+    current_user: Annotated[UserDb, Depends(verify_api_token)],
+    session: ASYNCSESSIONDEP,
+) -> Response:
+    """
+    Deletes an attachment.
+
+    Args:
+        note_id (int): The ID of the note.
+        attachment_id (int): The ID of the attachment.
+        current_user (Annotated[UserDb, Depends(verify_api_token)]): The authenticated user.
+        session (ASYNCSESSIONDEP): The async database session dependency.
+
+    Returns:
+        Response: An empty response with status 204.
+
+    Raises:
+        HTTPException: If the attachment does not exist (404).
+    """
+    await AsyncAttachmentSQL.delete_attachment(
+        user_id=current_user.id,
+        note_id=note_id,
+        attachment_id=attachment_id,
+        session=session,
+    )
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
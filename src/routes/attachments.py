@@ -0,0 +1,258 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from typing import Annotated, AsyncIterator
+from urllib.parse import quote
+from src.db.models import AttachmentDb, UserDb
+from src.db.database import ASYNCREADSESSIONDEP, ASYNCSESSIONDEP, AsyncAttachmentSQL
+from src.utils.attachments import (
+    ChunkStore,
+    check_length,
+    open_multipart_file,
+    parse_range,
+)
+from src.utils.utilities import settings
+from .auth import verify_cookies
+
+router_attachments = APIRouter(tags=["Attachments"])
+
+# Room for the boundaries and part headers around a file in a form upload.
+FORM_OVERHEAD = 64 * 1024
+
+
+async def save_attachment(
+    user_id: int,
+    note_id: int,
+    filename: str,
+    content_type: str | None,
+    stream: AsyncIterator[bytes],
+    session: ASYNCSESSIONDEP,
+) -> AttachmentDb:
+    """
+    Stores an uploaded file as chunks and records it as an attachment of a note.
+
+    Args:
+        user_id (int): The ID of the user who owns the note.
+        note_id (int): The ID of the note.
+        filename (str): The name of the file; directories are stripped.
+        content_type (str | None): The media type of the file.
+        stream (AsyncIterator[bytes]): The content of the file.
+        session (ASYNCSESSIONDEP): The async database session dependency.
+
+    Returns:
+        AttachmentDb: The new attachment.
+
+    Raises:
+        HTTPException: If the note does not exist (404) or the file exceeds
+                       `ATTACHMENT_MAX_BYTES` (413).
+    """
+    if not await AsyncAttachmentSQL.has_note(
+        user_id=user_id, note_id=note_id, session=session
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="The note does not exist"
+        )
+    chunk_size = settings.ATTACHMENT_CHUNK_SIZE
+    chunk_ids, size, content_hash = await ChunkStore.store(stream, chunk_size)
+    attachment = AttachmentDb(
+        note_id=note_id,
+        user_id=user_id,
+        filename=os.path.basename(filename.replace("\\", "/"))[:255] or "attachment",
+        content_type=(content_type or "application/octet-stream")[:255],
+        size=size,
+        chunk_size=chunk_size,
+        content_hash=content_hash,
+    )
+    await AsyncAttachmentSQL.add_attachment(
+        attachment=attachment, chunk_ids=chunk_ids, session=session
+    )
+    return attachment
+
+
+async def attachment_response(
+    request: Request,
+    user_id: int,
+    note_id: int,
+    attachment_id: int,
+    session: ASYNCREADSESSIONDEP,
+) -> Response:
+    """
+    Streams an attachment, decrypting one chunk at a time.
+
+    A `Range` header holding a single byte range is answered with 206 and
+    only the chunks overlapping the range are read. `If-Range` and
+    `If-None-Match` are matched against the attachment's ETag.
+
+    Args:
+        request (Request): The HTTP request, for its conditional and range headers.
+        user_id (int): The ID of the user who owns the note.
+        note_id (int): The ID of the note.
+        attachment_id (int): The ID of the attachment.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+
+    Returns:
+        Response: The attachment (200), a part of it (206), or 304.
+
+    Raises:
+        HTTPException: If the attachment does not exist (404) or the range
+                       selects none of its bytes (416).
+    """
+    attachment = await AsyncAttachmentSQL.get_attachment(
+        user_id=user_id,
+        note_id=note_id,
+        attachment_id=attachment_id,
+        session=session,
+    )
+    if attachment is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="The attachment does not exist",
+        )
+    etag = f'"{attachment.content_hash.hex()[:32]}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+        "X-Content-Type-Options": "nosniff",
+        "Content-Disposition": (
+            f"attachment; filename*=utf-8''{quote(attachment.filename)}"
+        ),
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    size, chunk_size = attachment.size, attachment.chunk_size
+    byte_range = None
+    if request.headers.get("if-range", etag) == etag:
+        byte_range = parse_range(request.headers.get("range"), size)
+    start, end = byte_range or (0, size - 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    chunk_ids = []
+    if size:
+        chunk_ids = await AsyncAttachmentSQL.get_chunk_ids(
+            attachment_id=attachment.id,
+            first=start // chunk_size,
+            last=end // chunk_size,
+            session=session,
+        )
+    return StreamingResponse(
+        ChunkStore.stream(chunk_ids, chunk_size, start, end),
+        status_code=(
+            status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK
+        ),
+        media_type=attachment.content_type,
+        headers=headers,
+    )
+
+
+@router_attachments.post("/user/home/content/note/{note_id}/attachments")
+async def upload_attachment(
+    request: Request,
+    note_id: int,
+    session: ASYNCSESSIONDEP,
+    current_user: Annotated[UserDb, Depends(verify_cookies)],
+) -> RedirectResponse:
+    """
+    Attaches a file uploaded with the note page's form to the note.
+
+    The form is parsed as it is received and the file stored chunk by chunk,
+    so it is never spooled to disk; a `Content-Length` above
+    `ATTACHMENT_MAX_BYTES` is refused before anything is read.
+
+    Args:
+        request (Request): The HTTP request; its body is the form, with the
+                           file in the `file` field.
+        note_id (int): The ID of the note.
+        session (ASYNCSESSIONDEP): The async database session dependency.
+        current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user.
+
+    Returns:
+        RedirectResponse: Redirects the user to the note.
+
+    Raises:
+        HTTPException: If the form has no file (400), the note does not exist
+                       (404) or the file is too large (413).
+    """
+    check_length(request.headers, settings.ATTACHMENT_MAX_BYTES + FORM_OVERHEAD)
+    filename, content_type, content = await open_multipart_file(
+        request.headers, request.stream(), "file"
+    )
+    await save_attachment(
+        user_id=current_user.id,
+        note_id=note_id,
+        filename=filename,
+        content_type=content_type,
+        stream=content,
+        session=session,
+    )
+    return RedirectResponse(
+        url=f"/user/home/content/note/{note_id}", status_code=status.HTTP_303_SEE_OTHER
+    )
+
+
+@router_attachments.get("/user/home/content/note/{note_id}/attachments/{attachment_id}")
+async def download_attachment(
+    request: Request,
+    note_id: int,
+    attachment_id: int,
+    session: ASYNCREADSESSIONDEP,
+    current_user: Annotated[UserDb, Depends(verify_cookies)],
+) -> Response:
+    """
+    Downloads an attachment, whole or a byte range of it.
+
+    Args:
+        request (Request): The HTTP request, for its range headers.
+        note_id (int): The ID of the note.
+        attachment_id (int): The ID of the attachment.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+        current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user.
+
+    Returns:
+        Response: The attachment, streamed; see `attachment_response`.
+    """
+    return await attachment_response(
+        request=request,
+        user_id=current_user.id,
+        note_id=note_id,
+        attachment_id=attachment_id,
+        session=session,
+    )
+
+
+@router_attachments.post(
+    "/user/home/content/note/{note_id}/attachments/{attachment_id}/delete"
+)
+async def delete_attachment(
+    note_id: int,
+    attachment_id: int,
+    session: ASYNCSESSIONDEP,
+    current_user: Annotated[UserDb, Depends(verify_cookies)],
+) -> RedirectResponse:
+    """
+    Deletes an attachment.
+
+    Args:
+        note_id (int): The ID of the note.
+        attachment_id (int): The ID of the attachment.
+        session (ASYNCSESSIONDEP): The async database session dependency.
+        current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user.
+
+    Returns:
+        RedirectResponse: Redirects the user to the note.
+
+    Raises:
+        HTTPException: If the attachment does not exist (404).
+    """
+    await AsyncAttachmentSQL.delete_attachment(
+        user_id=current_user.id,
+        note_id=note_id,
+        attachment_id=attachment_id,
+        session=session,
+    )
+    return RedirectResponse(
+        url=f"/user/home/content/note/{note_id}", status_code=status.HTTP_303_SEE_OTHER
+    )
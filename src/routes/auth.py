@@ -1,23 +1,26 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Request, Cookie
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Cookie, Header
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import Annotated
 from src.db import UserDb
-from src.db.database import UserSQL, SESSIONDEP
-from src.utils.utilities import TEMPLATES, PWD, JWTUtility
+from src.db.database import AsyncUserSQL, ASYNCSESSIONDEP
+from src.db.shards import ShardRouter
+from src.utils.utilities import TEMPLATES, PWD, JWTUtility, settings
 
 
 router_auth = APIRouter(tags=["Auth"])
 
 
-def authenticate_user(user: OAuth2PasswordRequestForm, session: SESSIONDEP) -> UserDb:
+async def authenticate_user(
+    user: OAuth2PasswordRequestForm, session: ASYNCSESSIONDEP
+) -> UserDb:
     """
     Authenticates a user by verifying their username and password.
 
     Args:
         user (OAuth2PasswordRequestForm): The user credentials provided via a login form.
                                           Contains the username and password.
-        session (SESSIONDEP): The database session dependency for interacting with the database.
+        session (ASYNCSESSIONDEP): The async database session dependency for interacting with the database.
 
     Returns:
         UserDb: The authenticated user's database object if the credentials are correct.
@@ -26,14 +29,15 @@ def authenticate_user(user: OAuth2PasswordRequestForm, session: SESSIONDEP) -> U
         HTTPException:
             - If the user does not exist (status code 404).
             - If the password is incorrect (status code 401).
+            - If the password worker pool is saturated (status code 503).
     """
-    user_db: UserDb = UserSQL.get_user(user.username, session)
+    user_db: UserDb = await AsyncUserSQL.get_user(user.username, session)
     if not user_db:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="The user does not exist"
         )
 
-    if not PWD.verify_hash(user.password, user_db.password):
+    if not await PWD.verify_hash_async(user.password, user_db.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Password is incorrect"
         )
@@ -41,34 +45,86 @@ def authenticate_user(user: OAuth2PasswordRequestForm, session: SESSIONDEP) -> U
 
 
 async def verify_cookies(
-    session: SESSIONDEP,
     access_token: Annotated[str | None, Cookie()] = None,
 ) -> UserDb:
     """
-    Verifies the user's authentication cookies by decoding the JWT and retrieving user data.
+    Verifies the user's access token cookie and returns the user it was issued to.
+
+    Access tokens are short-lived and carry the user's ID and username, so no
+    database query is made, apart from finding the user's shard when there
+    are several. Expired tokens are replaced by `TokenRefreshMiddleware`
+    before the request reaches the route.
 
     Args:
-        session (SESSIONDEP): The database session dependency for interacting with the database.
         access_token (Annotated[str | None, Cookie()]): The JWT access token extracted from cookies.
 
     Returns:
-        UserDb: The authenticated user's database object.
+        UserDb: The authenticated user, with only `id` and `username` set.
 
     Raises:
-        HTTPException: If the credentials cannot be validated or the user does not exist in the database.
+        HTTPException: If the token is missing, invalid, expired or revoked.
                        Returns status code 401 with a `WWW-Authenticate` header.
     """
-    payload: dict = JWTUtility.decode_jwt(access_token=access_token)
-    if payload.get("sub"):
-        username: str = payload.get("sub")
-    user: UserDb = UserSQL.get_user(username, session)
-    if user is None:
+    if not access_token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user
+    claims: dict = JWTUtility.decode_jwt(access_token=access_token)
+    await ShardRouter.route(claims["sub"])
+    return UserDb(id=claims["uid"], username=claims["sub"])
+
+
+async def verify_api_token(
+    authorization: Annotated[str | None, Header()] = None,
+    access_token: Annotated[str | None, Cookie()] = None,
+) -> UserDb:
+    """
+    Verifies the access token of an API request, sent as `Authorization: Bearer <token>`
+    by API clients or as the cookie set for the browser.
+
+    Args:
+        authorization (Annotated[str | None, Header()]): The `Authorization` header.
+        access_token (Annotated[str | None, Cookie()]): The JWT access token extracted from cookies.
+
+    Returns:
+        UserDb: The authenticated user, with only `id` and `username` set.
+
+    Raises:
+        HTTPException: If the token is missing, invalid, expired or revoked (401).
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        access_token = token
+    return await verify_cookies(access_token=access_token)
+
+
+def set_token_cookies(
+    response: Response, access_token: str, refresh_token: str
+) -> None:
+    """
+    Stores a new access and refresh token pair as HTTP-only cookies.
+
+    Args:
+        response (Response): The response that sets the cookies.
+        access_token (str): The access token, sent with every request.
+        refresh_token (str): The refresh token, only read by `TokenRefreshMiddleware`.
+    """
+    response.set_cookie(
+        key="access_token",
+        value=access_token,
+        max_age=settings.ACCESS_TOKEN_TTL,
+        httponly=True,
+        samesite="lax",
+    )
+    response.set_cookie(
+        key="refresh_token",
+        value=refresh_token,
+        max_age=settings.REFRESH_TOKEN_TTL,
+        httponly=True,
+        samesite="lax",
+    )
 
 
 @router_auth.get("/token", response_class=HTMLResponse)
@@ -92,7 +148,8 @@ async def show_register_page(
 
 @router_auth.post("/token")
 async def login_for_access_token(
-    form_data: Annotated[OAuth2PasswordRequestForm, Depends()], session: SESSIONDEP
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    session: ASYNCSESSIONDEP,
 ) -> RedirectResponse:
     """
     Handles user login, validates credentials, and sets an access token cookie.
@@ -100,26 +157,28 @@ async def login_for_access_token(
     Args:
         form_data (Annotated[OAuth2PasswordRequestForm, Depends()]): The login form data containing
                                                                      the username and password.
-        session (SESSIONDEP): The database session dependency for querying user data.
+        session (ASYNCSESSIONDEP): The async database session dependency for querying user data.
 
     Returns:
         RedirectResponse:
-            - Redirects to the user's home page (`/user/home`) with a valid access token set as an HTTP-only cookie.
+            - Redirects to the user's home page (`/user/home`) with access and refresh tokens set as HTTP-only cookies.
             - Redirects back to the login page (`/token`) with an error message in the query string if login fails.
 
     Raises:
         HTTPException: If authentication fails, captures and processes the exception to determine the error message.
     """
     try:
-        user = authenticate_user(form_data, session)
-        access_token = JWTUtility.create_jwt(data={"sub": user.username})
+        user = await authenticate_user(form_data, session)
+        access_token, refresh_token = JWTUtility.create_tokens(user.username, user.id)
         response = RedirectResponse(
             url="/user/home",
             status_code=status.HTTP_302_FOUND,
         )
-        response.set_cookie(key="access_token", value=access_token, httponly=True)
+        set_token_cookies(response, access_token, refresh_token)
         return response
     except HTTPException as e:
+        if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+            raise
         error_message = (
             e.detail
             if (
@@ -0,0 +1,203 @@
+import json
+import zipfile
+from itertools import islice
+from pathlib import PurePosixPath
+from typing import Annotated, Iterator
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.db.models import UserDb
+from src.db.database import ASYNC_READ_ENGINE, ASYNCSESSIONDEP, AsyncDataSQL
+from src.db.shards import ShardedSession
+from src.utils.search import note_tokens
+from src.utils.utilities import FernetUtility, settings
+from .auth import verify_cookies
+
+router_bulk = APIRouter(tags=["Bulk"])
+
+MARKDOWN_SUFFIXES = {".md", ".markdown", ".txt"}
+
+
+def read_jsonl(file) -> Iterator[tuple[str, str]]:
+    """
+    Reads notes from a JSON Lines file, one `{"title": ..., "content": ...}`
+    object per line.
+
+    Args:
+        file: A binary file object.
+
+    Yields:
+        tuple[str, str]: The title and content of each note.
+
+    Raises:
+        HTTPException: If a line is not a JSON object with string title and content (status code 400).
+    """
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            note = json.loads(line)
+            title, content = note["title"], note["content"]
+        except (ValueError, TypeError, KeyError):
+            note = None
+        if note is None or not isinstance(title, str) or not isinstance(content, str):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Line {number} is not a note with a title and content",
+            )
+        yield title, content
+
+
+def read_markdown_zip(file) -> Iterator[tuple[str, str]]:
+    """
+    Reads notes from a zip of Markdown or text files, one note per file.
+
+    The title is the first `# ` heading of the file, or its name without the
+    extension when it has none.
+
+    The uncompressed sizes recorded in the archive are checked against
+    `BULK_NOTE_MAX_BYTES` and `BULK_ZIP_MAX_BYTES` before any file is
+    inflated; `zipfile` never inflates an entry past its recorded size.
+
+    Args:
+        file: A seekable binary file object.
+
+    Yields:
+        tuple[str, str]: The title and content of each note.
+
+    Raises:
+        HTTPException: If a file or the whole archive is too large once
+                       uncompressed (status code 413).
+    """
+    with zipfile.ZipFile(file) as archive:
+        entries, total = [], 0
+        for info in archive.infolist():
+            path = PurePosixPath(info.filename)
+            if info.is_dir() or path.suffix.lower() not in MARKDOWN_SUFFIXES:
+                continue
+            entries.append((info, path))
+            total += info.file_size
+            if (
+                info.file_size > settings.BULK_NOTE_MAX_BYTES
+                or total > settings.BULK_ZIP_MAX_BYTES
+            ):
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"{info.filename} is too large once uncompressed",
+                )
+        for info, path in entries:
+            content = archive.read(info).decode("utf-8", errors="replace")
+            first_line = content.lstrip().split("\n", 1)[0]
+            title = first_line[2:].strip() if first_line.startswith("# ") else ""
+            yield title or path.stem, content
+
+
+def prepare_batch(
+    notes: Iterator[tuple[str, str]], user_id: int
+) -> list[tuple[str, bytes, bytes, set[bytes]]]:
+    """
+    Takes the next `BULK_BATCH_SIZE` notes and encrypts, hashes and tokenizes them.
+
+    Runs in a worker thread, so parsing, encryption and hashing stay off the
+    event loop.
+    """
+    return [
+        (
+            title,
+            FernetUtility.fernet_crypt(content),
+            FernetUtility.content_hash(content),
+            note_tokens(user_id, f"{title}\n{content}"),
+        )
+        for title, content in islice(notes, settings.BULK_BATCH_SIZE)
+    ]
+
+
+@router_bulk.post("/user/home/content/import")
+async def import_notes(
+    session: ASYNCSESSIONDEP,
+    current_user: Annotated[UserDb, Depends(verify_cookies)],
+    file: Annotated[UploadFile, File()],
+) -> dict:
+    """
+    Imports notes from a JSON Lines file or a zip of Markdown files.
+
+    Notes are encrypted in batches of `BULK_BATCH_SIZE` and every batch is
+    inserted in its own transaction, so an error stops the import after the
+    last complete batch.
+
+    Args:
+        session (ASYNCSESSIONDEP): The async database session dependency.
+        current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user.
+        file (UploadFile): The uploaded `.jsonl` or `.zip` file.
+
+    Returns:
+        dict: The number of imported notes under `imported`.
+
+    Raises:
+        HTTPException: If the file is not valid JSON Lines or zip (status code 400).
+    """
+    is_zip = await run_in_threadpool(zipfile.is_zipfile, file.file)
+    await file.seek(0)
+    notes = read_markdown_zip(file.file) if is_zip else read_jsonl(file.file)
+
+    imported = 0
+    while batch := await run_in_threadpool(prepare_batch, notes, current_user.id):
+        ids = await AsyncDataSQL.add_many(
+            user_id=current_user.id, notes=batch, session=session
+        )
+        imported += len(ids)
+    return {"imported": imported}
+
+
+@router_bulk.get("/user/home/content/export")
+async def export_notes(
+    current_user: Annotated[UserDb, Depends(verify_cookies)],
+) -> StreamingResponse:
+    """
+    Streams all the user's notes as JSON Lines, decrypted batch by batch.
+
+    Only one batch of `BULK_BATCH_SIZE` notes is held in memory at a time. The
+    output can be imported back through `/user/home/content/import`.
+
+    Args:
+        current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user.
+
+    Returns:
+        StreamingResponse: A `notes.jsonl` attachment with one note per line.
+    """
+
+    def encode(rows) -> bytes:
+        contents = FernetUtility.fernet_decrypt_many([row.content for row in rows])
+        return b"".join(
+            json.dumps(
+                {
+                    "id": row.id,
+                    "title": row.title,
+                    "content": content,
+                    "created_at": row.created_at.isoformat(),
+                    "updated_at": row.updated_at.isoformat(),
+                }
+            ).encode("utf-8")
+            + b"\n"
+            for row, content in zip(rows, contents)
+        )
+
+    async def stream():
+        # Dependency sessions are closed before the response body is sent, so
+        # the stream opens its own.
+        async with AsyncSession(
+            ASYNC_READ_ENGINE, sync_session_class=ShardedSession
+        ) as session:
+            async for rows in AsyncDataSQL.iter_notes(
+                user_id=current_user.id,
+                session=session,
+                batch_size=settings.BULK_BATCH_SIZE,
+            ):
+                yield await run_in_threadpool(encode, rows)
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="notes.jsonl"'},
+    )
@@ -0,0 +1,82 @@
+import hmac
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+from typing import Annotated
+from src.utils.metrics import SamplingProfiler, render
+from src.utils.utilities import settings
+
+
+async def verify_metrics_access(
+    request: Request, authorization: Annotated[str | None, Header()] = None
+) -> None:
+    """
+    Lets a request read the metrics if `METRICS_ENABLED` is set and it either
+    comes from an address of `METRICS_ALLOWED_IPS` or carries
+    `Authorization: Bearer <METRICS_TOKEN>`.
+
+    The address is the one of the TCP connection, `X-Forwarded-For` is not
+    trusted: behind a reverse proxy, use the token.
+
+    Args:
+        request (Request): The incoming request.
+        authorization (Annotated[str | None, Header()]): The `Authorization` header.
+
+    Raises:
+        HTTPException:
+            - If the metrics are disabled (status code 404).
+            - If the client is neither allowed nor authenticated (status code 403).
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    allowed = {ip.strip() for ip in settings.METRICS_ALLOWED_IPS.split(",")}
+    if request.client is not None and request.client.host in allowed - {""}:
+        return
+    token = settings.METRICS_TOKEN
+    if (
+        token
+        and authorization
+        and hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode())
+    ):
+        return
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to read the metrics"
+    )
+
+
+router_metrics = APIRouter(
+    tags=["Metrics"], dependencies=[Depends(verify_metrics_access)]
+)
+
+# Started on startup when PROFILER_ENABLED is set, see `src/main.py`.
+PROFILER = SamplingProfiler(interval=settings.PROFILER_INTERVAL)
+
+
+@router_metrics.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """
+    Exposes the metrics of this worker in the Prometheus text format.
+
+    Returns:
+        PlainTextResponse: The request, call and template histograms, and the
+                           password pool, connection pool, cache and token gauges.
+    """
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+
+@router_metrics.get("/metrics/profile", response_class=PlainTextResponse)
+async def profile() -> PlainTextResponse:
+    """
+    Returns the event loop stacks sampled since the previous call, as collapsed
+    stacks that flame graph tools can render.
+
+    Returns:
+        PlainTextResponse: One `frame;frame;frame count` line per distinct stack.
+
+    Raises:
+        HTTPException: If the profiler is disabled (status code 404).
+    """
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="The profiler is disabled"
+        )
+    return PlainTextResponse(PROFILER.collapsed())
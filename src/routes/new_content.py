@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Request, Depends, Form
+from fastapi import APIRouter, HTTPException, Request, Depends, Form, status
 from fastapi.responses import HTMLResponse, RedirectResponse
 from typing import Annotated
 from src.db.models import UserDb
-from src.db.database import SESSIONDEP, DataSQL, UserSQL
-from src.utils.utilities import TEMPLATES, FernetUtility
+from src.db.database import ASYNCSESSIONDEP, AsyncDataSQL
+from src.db.groupcommit import NOTE_WRITER
+from src.utils.utilities import TEMPLATES, FernetUtility, settings
 from .auth import verify_cookies
  
 router_new_content = APIRouter(tags=["Content"])
@@ -31,7 +32,7 @@ async def new_content(
 
 @router_new_content.post("/user/home/content/new")
 async def create_content(
-    session: SESSIONDEP,
+    session: ASYNCSESSIONDEP,
     current_user: Annotated[UserDb, Depends(verify_cookies)],
     title: str = Form(...),
     content: str = Form(...),
@@ -39,8 +40,11 @@ async def create_content(
     """
     Handles the creation of new user content by saving it in the database.
 
+    With `GROUP_COMMIT_ENABLED`, the note is committed along with the ones
+    created concurrently, see `src/db/groupcommit.py`.
+
     Args:
-        session (SESSIONDEP): The database session dependency.
+        session (ASYNCSESSIONDEP): The async database session dependency.
         current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user.
         title (str): The title of the new content, retrieved from the form.
         content (str): The actual content, retrieved from the form.
@@ -49,11 +53,121 @@ async def create_content(
         RedirectResponse: Redirects the user to their homepage after content creation.
     """
     encrypted_content: bytes = FernetUtility.fernet_crypt(content)
-    user_data: UserDb = UserSQL.get_user(current_user.username, session)
-    DataSQL.add_data(
+    if settings.GROUP_COMMIT_ENABLED:
+        await NOTE_WRITER.add(
+            title=title,
+            encrypted_content=encrypted_content,
+            user_id=current_user.id,
+            content=content,
+        )
+    else:
+        await AsyncDataSQL.add_data(
+            title=title,
+            encrypted_content=encrypted_content,
+            user_id=current_user.id,
+            session=session,
+            content=content,
+        )
+    return RedirectResponse(url="/user/home", status_code=303)
+
+
+@router_new_content.get(
+    "/user/home/content/note/{note_id}/edit", response_class=HTMLResponse
+)
+async def edit_content(
+    request: Request,
+    note_id: int,
+    session: ASYNCSESSIONDEP,
+    current_user: Annotated[UserDb, Depends(verify_cookies)],
+) -> HTMLResponse:
+    """
+    Serves the page for editing a note.
+
+    The form carries the version of the note it was loaded from, so saving it
+    after the note changed elsewhere fails instead of overwriting the change.
+
+    Args:
+        request (Request): The HTTP request object for rendering the template.
+        note_id (int): The ID of the note to edit.
+        session (ASYNCSESSIONDEP): The async database session dependency.
+        current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user.
+
+    Returns:
+        HTMLResponse: A rendered template with the note in an edit form.
+    """
+    note = await AsyncDataSQL.get_content_id(
+        user_id=current_user.id, datadb_id=note_id, session=session
+    )
+    if note is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="The note does not exist"
+        )
+    return TEMPLATES.TemplateResponse(
+        "D_edit_content.html",
+        {"request": request, "user": current_user, "data_list": note},
+    )
+
+
+@router_new_content.post("/user/home/content/note/{note_id}/edit")
+async def update_content(
+    note_id: int,
+    session: ASYNCSESSIONDEP,
+    current_user: Annotated[UserDb, Depends(verify_cookies)],
+    version: int = Form(...),
+    title: str = Form(...),
+    content: str = Form(...),
+) -> RedirectResponse:
+    """
+    Saves the changes made to a note.
+
+    Args:
+        note_id (int): The ID of the note to update.
+        session (ASYNCSESSIONDEP): The async database session dependency.
+        current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user.
+        version (int): The version of the note the edit is based on, from the form.
+        title (str): The new title, retrieved from the form.
+        content (str): The new content, retrieved from the form.
+
+    Returns:
+        RedirectResponse: Redirects the user to the updated note.
+
+    Raises:
+        HTTPException: If the note does not exist (404) or was changed since it was loaded (409).
+    """
+    await AsyncDataSQL.update_data(
+        user_id=current_user.id,
+        datadb_id=note_id,
+        version=version,
         title=title,
-        encrypted_content=encrypted_content,
-        user_id=user_data.id,
+        content=content,
         session=session,
     )
+    return RedirectResponse(url=f"/user/home/content/note/{note_id}", status_code=303)
+
+
+@router_new_content.post("/user/home/content/note/{note_id}/delete")
+async def delete_content(
+    note_id: int,
+    session: ASYNCSESSIONDEP,
+    current_user: Annotated[UserDb, Depends(verify_cookies)],
+    version: int = Form(...),
+) -> RedirectResponse:
+    """
+    Deletes a note.
+
+    Args:
+        note_id (int): The ID of the note to delete.
+        session (ASYNCSESSIONDEP): The async database session dependency.
+        current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user.
+        version (int): The version of the note the user saw, from the form.
+
+    Returns:
+        RedirectResponse: Redirects the user to their homepage.
+
+    Raises:
+        HTTPException: If the note does not exist (404) or was changed since it was loaded (409).
+    """
+    await AsyncDataSQL.delete_data(
+        user_id=current_user.id, datadb_id=note_id, version=version, session=session
+    )
     return RedirectResponse(url="/user/home", status_code=303)
@@ -1,77 +1,284 @@
-from fastapi import APIRouter, Request, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse
+import hashlib
+from fastapi import APIRouter, Cookie, HTTPException, Query, Request, Depends, status
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from typing import Annotated
 from src.db.models import UserDb
-from src.db.database import SESSIONDEP, DataSQL
-from src.utils.utilities import TEMPLATES
+from src.db.database import (
+    ASYNCREADSESSIONDEP,
+    AsyncAttachmentSQL,
+    AsyncDataSQL,
+    AsyncRevisionSQL,
+    AsyncSearchSQL,
+)
+from src.utils.assets import STATIC_ASSETS
+from src.utils.cache import NOTE_CACHE
+from src.utils.utilities import TEMPLATES, JWTUtility, RevokedTokens
 from .auth import verify_cookies
 
 
 router_home = APIRouter(tags=["Home"])
 
+# Number of notes rendered with the homepage and returned per page by `/user/home/notes`.
+PAGE_SIZE = 50
+
 
 @router_home.get("/user/home", response_class=HTMLResponse)
 async def home(
     request: Request,
     current_user: Annotated[UserDb, Depends(verify_cookies)],
-    session: SESSIONDEP,
+    session: ASYNCREADSESSIONDEP,
 ) -> HTMLResponse:
     """
-    Serves the user's homepage, displaying their private data.
+    Serves the user's homepage, listing the titles of their notes.
+
+    Only the first page of notes is rendered; the template loads the following
+    pages from `/user/home/notes` while the user scrolls. Note contents are not
+    loaded here; they are only decrypted when a single note is opened.
 
     Args:
         request (Request): The HTTP request object for rendering the template.
         current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user retrieved via cookies.
-        session (SESSIONDEP): The database session dependency.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
 
     Returns:
-        HTMLResponse: A rendered template of the homepage containing user data.
+        HTMLResponse: A rendered template of the homepage containing the user's note titles,
+                      or an empty 304 response if the browser's copy is still current.
     """
-    result: dict = DataSQL.get_data(username=current_user.username, session=session)
+    listing = await AsyncDataSQL.get_listing_version(
+        user_id=current_user.id, session=session
+    )
+    etag = listing_etag(current_user.id, listing)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    result, next_cursor = await AsyncDataSQL.get_titles_page(
+        user_id=current_user.id, session=session, limit=PAGE_SIZE
+    )
     return TEMPLATES.TemplateResponse(
-        "C_homepage.html", {"request": request, "user": current_user, "items": result}
+        "C_homepage.html",
+        {
+            "request": request,
+            "user": current_user,
+            "items": result,
+            "next_cursor": next_cursor,
+        },
+        headers=headers,
+    )
+
+
+def listing_etag(user_id: int, listing: str) -> str:
+    """
+    Builds the ETag of a user's homepage from the version of their listing and
+    of the templates and assets it is rendered with.
+
+    Args:
+        user_id (int): The ID of the user.
+        listing (str): The value returned by `AsyncDataSQL.get_listing_version`.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    key = f"{user_id}:{STATIC_ASSETS.version}:{listing}"
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:24]}"'
+
+
+@router_home.get("/user/home/notes")
+async def notes_page(
+    current_user: Annotated[UserDb, Depends(verify_cookies)],
+    session: ASYNCREADSESSIONDEP,
+    after: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=200)] = PAGE_SIZE,
+) -> dict:
+    """
+    Returns one page of the user's notes as JSON, for infinite scrolling.
+
+    Args:
+        current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user retrieved via cookies.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+        after (int | None): The cursor returned with the previous page; omitted for the first page.
+        limit (int): The maximum number of notes in the page, between 1 and 200.
+
+    Returns:
+        dict: The notes of the page under `items` (`id` and `title`) and the cursor
+              of the next page under `next_cursor`, which is null on the last page.
+    """
+    items, next_cursor = await AsyncDataSQL.get_titles_page(
+        user_id=current_user.id, session=session, after_id=after, limit=limit
     )
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router_home.get("/user/home/search")
+async def search_notes(
+    current_user: Annotated[UserDb, Depends(verify_cookies)],
+    session: ASYNCREADSESSIONDEP,
+    q: Annotated[str, Query(max_length=200)],
+    limit: Annotated[int, Query(ge=1, le=200)] = PAGE_SIZE,
+) -> dict:
+    """
+    Searches the user's notes without decrypting them.
+
+    Args:
+        current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user retrieved via cookies.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+        q (str): Space separated terms that must all appear; `term*` matches a prefix.
+        limit (int): The maximum number of notes returned, between 1 and 200.
+
+    Returns:
+        dict: The matching notes under `items` (`id` and `title`), newest first.
+    """
+    items = await AsyncSearchSQL.search(
+        user_id=current_user.id, query=q, session=session, limit=limit
+    )
+    return {"items": items}
 
 
 @router_home.get("/user/home/content/note/{note_id}", response_class=HTMLResponse)
 async def user_note(
     request: Request,
     note_id: int,
-    session: SESSIONDEP,
+    session: ASYNCREADSESSIONDEP,
     current_user: Annotated[UserDb, Depends(verify_cookies)],
 ) -> HTMLResponse:
     """
-    Serves the detailed view of a specific note.
+    Serves the detailed view of a specific note, with its attachments.
 
     Args:
         request (Request): The HTTP request object for rendering the template.
         note_id (int): The ID of the note to display.
-        session (SESSIONDEP): The database session dependency.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
         current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user.
 
     Returns:
         HTMLResponse: A rendered template containing the note details.
     """
-    list_data = DataSQL.get_content_id(
-        username=current_user.username, datadb_id=note_id, session=session
+    list_data = await AsyncDataSQL.get_content_id(
+        user_id=current_user.id, datadb_id=note_id, session=session
+    )
+    if list_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="The note does not exist"
+        )
+    attachments = await AsyncAttachmentSQL.get_attachments(
+        user_id=current_user.id, note_id=note_id, session=session
     )
     return TEMPLATES.TemplateResponse(
         "C_note_page.html",
-        {"request": request, "user": current_user, "data_list": list_data},
+        {
+            "request": request,
+            "user": current_user,
+            "data_list": list_data,
+            "attachments": attachments,
+        },
+    )
+
+
+@router_home.get(
+    "/user/home/content/note/{note_id}/history", response_class=HTMLResponse
+)
+async def note_history(
+    request: Request,
+    note_id: int,
+    session: ASYNCREADSESSIONDEP,
+    current_user: Annotated[UserDb, Depends(verify_cookies)],
+) -> HTMLResponse:
+    """
+    Serves the list of the past versions of a note.
+
+    Args:
+        request (Request): The HTTP request object for rendering the template.
+        note_id (int): The ID of the note.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+        current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user.
+
+    Returns:
+        HTMLResponse: A rendered template listing the versions, newest first.
+    """
+    revisions = await AsyncRevisionSQL.get_history(
+        user_id=current_user.id, note_id=note_id, session=session
+    )
+    return TEMPLATES.TemplateResponse(
+        "C_history.html",
+        {
+            "request": request,
+            "user": current_user,
+            "note_id": note_id,
+            "revisions": revisions,
+        },
+    )
+
+
+@router_home.get(
+    "/user/home/content/note/{note_id}/history/{revision}",
+    response_class=HTMLResponse,
+)
+async def note_revision(
+    request: Request,
+    note_id: int,
+    revision: int,
+    session: ASYNCREADSESSIONDEP,
+    current_user: Annotated[UserDb, Depends(verify_cookies)],
+) -> HTMLResponse:
+    """
+    Serves a past version of a note.
+
+    Args:
+        request (Request): The HTTP request object for rendering the template.
+        note_id (int): The ID of the note.
+        revision (int): The version to display.
+        session (ASYNCREADSESSIONDEP): The async read-only database session dependency.
+        current_user (Annotated[UserDb, Depends(verify_cookies)]): The authenticated user.
+
+    Returns:
+        HTMLResponse: A rendered template with the version's title and content.
+
+    Raises:
+        HTTPException: If the version is not kept (404).
+    """
+    found = await AsyncRevisionSQL.get_revision(
+        user_id=current_user.id, note_id=note_id, revision=revision, session=session
+    )
+    if found is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="The revision does not exist"
+        )
+    return TEMPLATES.TemplateResponse(
+        "C_revision_page.html",
+        {"request": request, "user": current_user, "note_id": note_id, **found},
     )
 
 
 @router_home.post("/user/home/logout", response_class=HTMLResponse)
-async def logout() -> RedirectResponse:
+async def logout(
+    access_token: Annotated[str | None, Cookie()] = None,
+    refresh_token: Annotated[str | None, Cookie()] = None,
+) -> RedirectResponse:
     """
-    Logs the user out by deleting the authentication cookie and redirecting to the login page.
+    Logs the user out by revoking and deleting the token cookies and redirecting to the login page.
+
+    The user's decrypted notes are also dropped from `NOTE_CACHE`.
+
+    Args:
+        access_token (Annotated[str | None, Cookie()]): The JWT access token extracted from cookies.
+        refresh_token (Annotated[str | None, Cookie()]): The JWT refresh token extracted from cookies.
 
     Returns:
-        RedirectResponse: A response that deletes the user's cookie and redirects to the specified URL.
+        RedirectResponse: A response that deletes the user's cookies and redirects to the specified URL.
     """
+    for token, token_type in ((access_token, "access"), (refresh_token, "refresh")):
+        if not token:
+            continue
+        try:
+            claims = JWTUtility.decode_jwt(token, token_type=token_type)
+        except HTTPException:
+            continue
+        RevokedTokens.revoke(claims)
+        NOTE_CACHE.invalidate_user(claims["uid"])
+
     response = RedirectResponse(url="/", status_code=302)
-    response.delete_cookie(
-        key="access_token",  # The name of the cookie to be deleted, in this case, "access_token".
-    )
+    response.delete_cookie(key="access_token")
+    response.delete_cookie(key="refresh_token")
 
     return response
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, HTTPException, status, Request, Depends
 from fastapi.responses import RedirectResponse, HTMLResponse
-from src.db.database import SESSIONDEP, UserSQL
+from src.db.database import ASYNCSESSIONDEP, AsyncUserSQL
 from src.utils.utilities import PWD, TEMPLATES, JWTUtility
 from typing import Annotated
 from fastapi.security import OAuth2PasswordRequestForm
+from .auth import set_token_cookies
 
 
 router_register = APIRouter(tags=["Register"])
@@ -26,7 +27,7 @@ async def show_register_page(request: Request) -> HTMLResponse:
 @router_register.post("/user/register")
 async def register_acces(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    session: SESSIONDEP,
+    session: ASYNCSESSIONDEP,
 ) -> RedirectResponse:
     """
     Handles user registration by validating input, creating a new user in the database,
@@ -35,39 +36,44 @@ async def register_acces(
     Args:
         form_data (Annotated[OAuth2PasswordRequestForm, Depends()]): The form data containing the user's
                                                                      username and password.
-        session (SESSIONDEP): The database session dependency for interacting with the user database.
+        session (ASYNCSESSIONDEP): The async database session dependency for interacting with the user database.
 
     Returns:
         RedirectResponse: Redirects the user to the home page after successful registration,
-                          setting an access token in the response cookie.
+                          setting access and refresh token cookies.
 
     Raises:
         HTTPException: If the user already exists, raises an HTTP 400 Bad Request error.
+                       If the password worker pool is saturated, an HTTP 503 is returned as is.
     """
     try:
-        user_db = UserSQL.get_user(username=form_data.username, session=session)
+        user_db = await AsyncUserSQL.get_user(
+            username=form_data.username, session=session
+        )
         if user_db:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="The user already exists.",
             )
 
-        hashed_password = PWD.hash(secret=form_data.password)
-        UserSQL.add_user(
+        hashed_password = await PWD.hash_async(secret=form_data.password)
+        user = await AsyncUserSQL.add_user(
             username=form_data.username,
             hashed_password=hashed_password,
             session=session,
         )
 
-        access_token = JWTUtility.create_jwt(data={"sub": form_data.username})
+        access_token, refresh_token = JWTUtility.create_tokens(user.username, user.id)
         response = RedirectResponse(
             url="/user/home",
             status_code=status.HTTP_302_FOUND,
         )
-        response.set_cookie(key="access_token", value=access_token, httponly=True)
+        set_token_cookies(response, access_token, refresh_token)
         return response
 
     except HTTPException as e:
+        if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+            raise
         error_message = (
             e.detail
             if e.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import NamedTuple
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from src.utils.utilities import TEMPLATES
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip is always available.
+    brotli = None
+
+# Files served under /static; the templates' HTML sources are not.
+ASSET_EXTENSIONS = {".css", ".js", ".svg", ".png", ".ico", ".woff2"}
+# Fingerprinted URLs change with their content, so they can be cached forever.
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+
+class Asset(NamedTuple):
+    media_type: str
+    etag: str
+    cache_control: str
+    # Body by content coding: "identity", "gzip" and, if smaller, "br".
+    bodies: dict[str, bytes]
+
+
+class StaticAssets:
+    """
+    ASGI app serving the static assets from memory.
+
+    Every asset is read once, hashed and precompressed with gzip (and brotli
+    when the `brotli` package is installed). It is reachable under its plain
+    path, revalidated through its ETag, and under a fingerprinted path such as
+    `styles/home.1a2b3c4d5e.css`, cached as immutable. Templates link to the
+    fingerprinted path through the `asset_url` global.
+
+    Args:
+        directory (str): The directory the assets are read from.
+        prefix (str): The URL path the app is mounted at.
+    """
+
+    def __init__(self, directory: str, prefix: str = "/static"):
+        self.prefix = prefix
+        self.assets: dict[str, Asset] = {}
+        self.urls: dict[str, str] = {}
+        digests = hashlib.sha256()
+        for root, _, files in sorted(os.walk(directory)):
+            for name in sorted(files):
+                base, extension = os.path.splitext(name)
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, directory).replace(os.sep, "/")
+                with open(full_path, "rb") as file:
+                    body = file.read()
+                digest = hashlib.sha256(body).hexdigest()[:10]
+                digests.update(digest.encode())
+                if extension not in ASSET_EXTENSIONS:
+                    continue
+                fingerprinted = f"{path[: -len(name)]}{base}.{digest}{extension}"
+                media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                bodies = self._compress(body)
+                self.assets[path] = Asset(media_type, f'"{digest}"', REVALIDATE, bodies)
+                self.assets[fingerprinted] = Asset(
+                    media_type, f'"{digest}"', IMMUTABLE, bodies
+                )
+                self.urls[path] = f"{prefix}/{fingerprinted}"
+        # Changes with any file in `directory`, templates included, so rendered
+        # pages can use it in their ETag.
+        self.version = digests.hexdigest()[:10]
+
+    def url(self, path: str) -> str:
+        """Returns the fingerprinted URL of an asset, given its path in `directory`."""
+        return self.urls.get(path, f"{self.prefix}/{path}")
+
+    async def __call__(self, scope, receive, send):
+        asset = self.assets.get(scope["path"].removeprefix(self.prefix).lstrip("/"))
+        if scope["method"] not in ("GET", "HEAD") or asset is None:
+            response = PlainTextResponse("Not Found", status_code=404)
+            return await response(scope, receive, send)
+
+        request_headers = Headers(scope=scope)
+        headers = {
+            "ETag": asset.etag,
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if request_headers.get("if-none-match") == asset.etag:
+            return await Response(status_code=304, headers=headers)(
+                scope, receive, send
+            )
+
+        accepted = self._accepted(request_headers.get("accept-encoding", ""))
+
+        def quality(coding: str) -> float:
+            if coding not in asset.bodies:
+                return 0
+            return accepted.get(coding, accepted.get("*", 0))
+
+        # The best accepted coding, brotli on a tie; identity if none is.
+        coding = max(("br", "gzip"), key=quality)
+        if not quality(coding):
+            coding = "identity"
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        body = asset.bodies[coding] if scope["method"] == "GET" else b""
+        response = Response(body, media_type=asset.media_type, headers=headers)
+        if scope["method"] == "HEAD":
+            response.headers["Content-Length"] = str(len(asset.bodies[coding]))
+        await response(scope, receive, send)
+
+    @staticmethod
+    def _accepted(header: str) -> dict[str, float]:
+        # Content coding -> q-value; "gzip;q=0" refuses gzip rather than accepting it.
+        accepted = {}
+        for item in header.split(","):
+            coding, *params = (part.strip() for part in item.split(";"))
+            q = 1.0
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            if coding:
+                accepted[coding.lower()] = q
+        return accepted
+
+    @staticmethod
+    def _compress(body: bytes) -> dict[str, bytes]:
+        bodies = {"identity": body}
+        compressed = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(compressed) < len(body):
+            bodies["gzip"] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(body, quality=11)
+            if len(compressed) < len(body):
+                bodies["br"] = compressed
+        return bodies
+
+
+STATIC_ASSETS = StaticAssets("src/static")
+TEMPLATES.env.globals["asset_url"] = STATIC_ASSETS.url
@@ -0,0 +1,305 @@
+"""
+Content-addressed storage of attachment chunks on local disk.
+
+Attachments are split into fixed-size plaintext chunks. Each chunk is
+named after a keyed hash of its plaintext, so identical chunks (the same
+file attached twice, or shared blocks) are stored once, and encrypted with
+`FernetUtility.cypher` on its own, so any byte range is served by
+decrypting only the chunks it overlaps. At most one chunk per transfer is
+held in memory, whatever the size of the file.
+
+Chunk files are never deleted when an attachment is; unreferenced chunks
+are removed by `python -m src.db.chunks gc`.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import tempfile
+from collections import deque
+from typing import AsyncIterator
+from fastapi import HTTPException, status
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from src.utils.metrics import instrument
+from src.utils.utilities import FernetUtility, settings
+
+
+@instrument("chunks")
+class ChunkStore:
+    """
+    Encrypted chunk files under `DIRECTORY`, as `<id[:2]>/<id>` with the hex id.
+
+    Fernet tokens are stored base64-decoded, a third smaller than the tokens
+    kept in the database. Encryption, decryption and file I/O run on
+    `FernetUtility.DECRYPT_EXECUTOR`, off the event loop.
+    """
+
+    DIRECTORY: str = settings.ATTACHMENT_DIR
+    HASH_KEY: bytes = hashlib.sha256(f"chunk:{settings.SECRET_KEY}".encode()).digest()
+
+    @staticmethod
+    def chunk_id(data: bytes) -> bytes:
+        return hmac.new(ChunkStore.HASH_KEY, data, hashlib.sha256).digest()
+
+    @staticmethod
+    def path(chunk_id: bytes) -> str:
+        name = chunk_id.hex()
+        return os.path.join(ChunkStore.DIRECTORY, name[:2], name)
+
+    @staticmethod
+    def write(data: bytes) -> bytes:
+        """
+        Stores a plaintext chunk unless an identical one is already stored.
+
+        Returns:
+            bytes: The chunk id.
+        """
+        chunk_id = ChunkStore.chunk_id(data)
+        path = ChunkStore.path(chunk_id)
+        if os.path.exists(path):
+            # Marks the chunk as recently used for the garbage collection.
+            os.utime(path)
+            return chunk_id
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        token = base64.urlsafe_b64decode(FernetUtility.cypher.encrypt(data))
+        # Written aside and renamed, so readers never see a partial chunk.
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(token)
+        os.replace(temporary, path)
+        return chunk_id
+
+    @staticmethod
+    def read(chunk_id: bytes) -> bytes:
+        """Returns the plaintext of a stored chunk."""
+        with open(ChunkStore.path(chunk_id), "rb") as file:
+            token = base64.urlsafe_b64encode(file.read())
+        return FernetUtility.cypher.decrypt(token)
+
+    @staticmethod
+    async def put(data: bytes) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(
+            FernetUtility.DECRYPT_EXECUTOR, ChunkStore.write, data
+        )
+
+    @staticmethod
+    async def get(chunk_id: bytes) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(
+            FernetUtility.DECRYPT_EXECUTOR, ChunkStore.read, chunk_id
+        )
+
+    @staticmethod
+    async def store(
+        stream: AsyncIterator[bytes], chunk_size: int
+    ) -> tuple[list[bytes], int, bytes]:
+        """
+        Splits a stream into chunks of `chunk_size` bytes and stores them.
+
+        Chunks already written when the upload fails stay on disk until the
+        garbage collection removes them.
+
+        Args:
+            stream (AsyncIterator[bytes]): The content, in pieces of any size.
+            chunk_size (int): The number of plaintext bytes per chunk.
+
+        Returns:
+            tuple[list[bytes], int, bytes]: The chunk ids in order, the size of
+                                            the content and its keyed hash.
+
+        Raises:
+            HTTPException: If the content exceeds `ATTACHMENT_MAX_BYTES` (413).
+        """
+        chunk_ids, size, buffer = [], 0, bytearray()
+        async for piece in stream:
+            size += len(piece)
+            if size > settings.ATTACHMENT_MAX_BYTES:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="The file is too large",
+                )
+            buffer += piece
+            while len(buffer) >= chunk_size:
+                chunk_ids.append(await ChunkStore.put(bytes(buffer[:chunk_size])))
+                del buffer[:chunk_size]
+        if buffer:
+            chunk_ids.append(await ChunkStore.put(bytes(buffer)))
+        content_hash = hmac.new(
+            ChunkStore.HASH_KEY, b"".join(chunk_ids), hashlib.sha256
+        ).digest()
+        return chunk_ids, size, content_hash
+
+    @staticmethod
+    async def stream(
+        chunk_ids: list[bytes], chunk_size: int, start: int, end: int
+    ) -> AsyncIterator[bytes]:
+        """
+        Yields the bytes `start` to `end` (inclusive) of an attachment.
+
+        Args:
+            chunk_ids (list[bytes]): The ids of the chunks overlapping the range,
+                                     the first one holding byte `start`.
+            chunk_size (int): The number of plaintext bytes per chunk.
+            start (int): The offset of the first byte in the attachment.
+            end (int): The offset of the last byte in the attachment.
+        """
+        offset = start - start % chunk_size
+        for chunk_id in chunk_ids:
+            data = await ChunkStore.get(chunk_id)
+            yield data[max(start - offset, 0) : end - offset + 1]
+            offset += chunk_size
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parses a `Range` header holding a single byte range.
+
+    Args:
+        header (str | None): The value of the header.
+        size (int): The size of the resource.
+
+    Returns:
+        tuple[int, int] | None: The first and last byte of the range, or None
+                                to send the whole resource (no header, or a
+                                syntax this parser ignores, such as several ranges).
+
+    Raises:
+        HTTPException: If the range selects no byte of the resource (416).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    if not (first or last).isdigit() or (last and not last.isdigit()):
+        return None
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # A suffix range holding the last `last` bytes; "-0" selects nothing.
+        start, end = max(size - int(last), 0) if int(last) else size, size - 1
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def check_length(headers, limit: int) -> None:
+    """
+    Rejects a request whose `Content-Length` exceeds `limit`, before its body
+    is read. Bodies without the header are limited as they are read.
+
+    Raises:
+        HTTPException: If the declared body is larger than `limit` (413).
+    """
+    length = headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > limit:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="The file is too large",
+        )
+
+
+async def open_multipart_file(
+    headers, body: AsyncIterator[bytes], field: str
+) -> tuple[str, str | None, AsyncIterator[bytes]]:
+    """
+    Finds a file in a `multipart/form-data` body as it is received, without
+    spooling it to disk: the body is parsed up to the headers of the file's
+    part, and its content is then yielded as the parsing goes on.
+
+    Args:
+        headers: The request headers, for the `Content-Type` and its boundary.
+        body (AsyncIterator[bytes]): The request body.
+        field (str): The name of the form field holding the file.
+
+    Returns:
+        tuple[str, str | None, AsyncIterator[bytes]]: The file name, its media
+                                                      type and its content.
+
+    Raises:
+        HTTPException: If the body isn't a well-formed form or has no such file
+                       (400).
+    """
+    content_type, options = parse_options_header(headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a form upload"
+        )
+    events: deque = deque()
+
+    def add(kind: str):
+        def callback(data: bytes = b"", start: int = 0, end: int = 0) -> None:
+            events.append((kind, data[start:end]))
+
+        return callback
+
+    parser = MultipartParser(
+        options[b"boundary"],
+        {
+            name: add(name)
+            for name in (
+                "on_part_begin",
+                "on_header_field",
+                "on_header_value",
+                "on_header_end",
+                "on_headers_finished",
+                "on_part_data",
+                "on_part_end",
+            )
+        },
+    )
+
+    async def parse() -> AsyncIterator[tuple[str, bytes]]:
+        async for piece in body:
+            try:
+                parser.write(piece)
+            except MultipartParseError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed form"
+                )
+            while events:
+                yield events.popleft()
+        parser.finalize()
+        while events:
+            yield events.popleft()
+
+    parts = parse()
+    part_headers, name, value = {}, b"", b""
+    async for kind, data in parts:
+        if kind == "on_part_begin":
+            part_headers, name, value = {}, b"", b""
+        elif kind == "on_header_field":
+            name += data
+        elif kind == "on_header_value":
+            value += data
+        elif kind == "on_header_end":
+            part_headers[name.lower()] = value
+            name, value = b"", b""
+        elif kind == "on_headers_finished":
+            disposition = part_headers.get(b"content-disposition", b"")
+            _, parameters = parse_options_header(disposition)
+            if parameters.get(b"name") == field.encode() and b"filename" in parameters:
+                break
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"No file in {field!r}"
+        )
+
+    async def content() -> AsyncIterator[bytes]:
+        async for kind, data in parts:
+            if kind == "on_part_data":
+                yield data
+            elif kind == "on_part_end":
+                return
+
+    part_type = part_headers.get(b"content-type")
+    return (
+        parameters[b"filename"].decode("utf-8", "replace"),
+        part_type.decode("latin-1") if part_type else None,
+        content(),
+    )
@@ -0,0 +1,247 @@
+import time
+from collections import OrderedDict
+from cachetools import TTLCache
+from src.utils.metrics import COLLECTORS
+from src.utils.utilities import settings
+
+
+class CacheBackend:
+    """
+    Interface of the key/value stores used by the application caches.
+
+    Values are plain dictionaries so that a shared backend (for example a
+    Redis client) can serialize them. `LocalCacheBackend` is the in-process
+    stand-in used by default.
+    """
+
+    def get(self, key: str) -> dict | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: dict) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class _CountingTTLCache(TTLCache):
+    """
+    `TTLCache` that counts the entries evicted to make room for new ones.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+
+class LocalCacheBackend(CacheBackend):
+    """
+    In-process LRU cache whose entries also expire after `ttl` seconds.
+
+    Args:
+        maxsize (int): The maximum number of entries; the least recently used
+                       entry is evicted when it is reached.
+        ttl (float): The number of seconds an entry stays valid.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = _CountingTTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> dict | None:
+        value = self._cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: dict) -> None:
+        self._cache[key] = value
+
+    def delete(self, key: str) -> None:
+        self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self._cache.evictions,
+        }
+
+
+class UserCache:
+    """
+    Cache of authenticated users keyed by username.
+
+    Users are stored as dictionaries of their columns. Replace `BACKEND`
+    (for example with a shared backend in multi-worker deployments) through
+    `set_backend`.
+    """
+
+    BACKEND: CacheBackend = LocalCacheBackend(
+        maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL
+    )
+
+    @staticmethod
+    def get(username: str) -> dict | None:
+        return UserCache.BACKEND.get(username)
+
+    @staticmethod
+    def put(username: str, user: dict) -> None:
+        UserCache.BACKEND.set(username, user)
+
+    @staticmethod
+    def invalidate(username: str) -> None:
+        UserCache.BACKEND.delete(username)
+
+    @staticmethod
+    def set_backend(backend: CacheBackend) -> None:
+        UserCache.BACKEND = backend
+
+
+class NoteCache:
+    """
+    LRU cache of decrypted notes, keyed by user and note, with a hard budget
+    on the bytes of plaintext it holds and a TTL.
+
+    Plaintext is kept in `bytearray` buffers that are overwritten with zeros
+    when an entry is evicted, expires or is invalidated. Expired entries are
+    swept on every `get` and `put`, oldest first, whichever key is asked
+    for. The `str` copies handed to callers can't be cleared. The cache is
+    disabled, and every method is a no-op, unless `NOTE_CACHE_ENABLED` is set.
+
+    Args:
+        max_bytes (int): The maximum number of plaintext bytes held.
+        ttl (float): The number of seconds an entry stays valid.
+        enabled (bool): Whether the cache stores anything.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, enabled: bool = True):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: OrderedDict = OrderedDict()
+        # Deadline of every entry, in the order they were put, which with a
+        # single TTL is also the order in which they expire.
+        self._deadlines: OrderedDict = OrderedDict()
+        self._notes_by_user: dict[int, set[int]] = {}
+
+    def get(self, user_id: int, note_id: int) -> dict | None:
+        """
+        Returns the cached note as a dict of its columns, with `content` decoded.
+        """
+        if not self.enabled:
+            return None
+        self.expire()
+        entry = self._entries.get((user_id, note_id))
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((user_id, note_id))
+        self.hits += 1
+        note, buffer = entry
+        return note | {"content": buffer.decode("utf-8")}
+
+    def put(self, user_id: int, note_id: int, note: dict) -> None:
+        """
+        Caches a note, given as a dict of its columns with a `str` content.
+        Notes larger than the whole budget are not cached.
+        """
+        if not self.enabled:
+            return
+        self.expire()
+        buffer = bytearray(note["content"].encode("utf-8"))
+        if len(buffer) > self.max_bytes:
+            return
+        self._remove((user_id, note_id))
+        while self.bytes + len(buffer) > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        metadata = {key: value for key, value in note.items() if key != "content"}
+        self._entries[(user_id, note_id)] = (metadata, buffer)
+        self._deadlines[(user_id, note_id)] = time.monotonic() + self.ttl
+        self._notes_by_user.setdefault(user_id, set()).add(note_id)
+        self.bytes += len(buffer)
+
+    def invalidate(self, user_id: int, note_id: int) -> None:
+        """Drops a note, after it was changed or deleted."""
+        self._remove((user_id, note_id))
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drops every note of a user, when they log out."""
+        for note_id in list(self._notes_by_user.get(user_id, ())):
+            self._remove((user_id, note_id))
+
+    def expire(self) -> None:
+        """Zeroes and drops the entries whose TTL has passed."""
+        now = time.monotonic()
+        while self._deadlines:
+            key, deadline = next(iter(self._deadlines.items()))
+            if deadline >= now:
+                break
+            self._remove(key)
+            self.expirations += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _remove(self, key: tuple[int, int]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        del self._deadlines[key]
+        buffer = entry[1]
+        self.bytes -= len(buffer)
+        buffer[:] = bytes(len(buffer))
+        notes = self._notes_by_user.get(key[0])
+        if notes is not None:
+            notes.discard(key[1])
+            if not notes:
+                del self._notes_by_user[key[0]]
+
+
+NOTE_CACHE = NoteCache(
+    max_bytes=settings.NOTE_CACHE_MAX_BYTES,
+    ttl=settings.NOTE_CACHE_TTL,
+    enabled=settings.NOTE_CACHE_ENABLED,
+)
+
+
+def cache_stats() -> dict:
+    """Returns the counters of `UserCache` (when its backend keeps them) and `NOTE_CACHE`."""
+    stats = {f"note_cache_{key}": value for key, value in NOTE_CACHE.stats().items()}
+    if hasattr(UserCache.BACKEND, "stats"):
+        stats |= {
+            f"user_cache_{key}": value
+            for key, value in UserCache.BACKEND.stats().items()
+        }
+    return stats
+
+
+COLLECTORS.append(cache_stats)
@@ -0,0 +1,229 @@
+"""
+In-process metrics in the Prometheus text format, with no dependency.
+
+Hot paths are timed with `timed` (a context manager) or `instrument` (a class
+decorator timing every static method). Each observation is a `bisect` and
+three additions under a lock, as calls are also timed on the thread pools,
+so the instrumentation can stay on in production. The counters are per
+worker process, like the rest of the in-memory state.
+"""
+
+import bisect
+import collections
+import functools
+import inspect
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """
+    Latency histogram of one metric, with one series per set of label values.
+
+    Args:
+        name (str): The metric name.
+        help (str): The description exported with the metric.
+        labels (tuple[str, ...]): The label names, in the order of the values
+                                  passed to `observe`.
+    """
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        # Label values -> [count per bucket..., count above the last bucket, count, sum]
+        self.series: dict[tuple, list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, values: tuple, seconds: float) -> None:
+        bucket = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            series = self.series.get(values)
+            if series is None:
+                series = self.series[values] = [0] * (len(BUCKETS) + 2) + [0.0]
+            series[bucket] += 1
+            series[-2] += 1
+            series[-1] += seconds
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = [
+                (values, list(series)) for values, series in self.series.items()
+            ]
+        for values, series in sorted(snapshot):
+            labels = ",".join(
+                f'{name}="{escape(value)}"' for name, value in zip(self.labels, values)
+            )
+            cumulative = 0
+            for bound, count in zip(BUCKETS, series):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-2]}')
+            lines.append(f"{self.name}_count{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-1]:.6f}")
+        return lines
+
+
+REQUESTS = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling HTTP requests.",
+    ("method", "route", "status"),
+)
+CALLS = Histogram(
+    "call_duration_seconds",
+    "Time spent in database, encryption, hashing and rendering calls.",
+    ("component", "call"),
+)
+HISTOGRAMS = [REQUESTS, CALLS]
+# Functions returning {name: value} exported as gauges; a name may carry
+# labels, as in 'db_pool_checked_out{pool="primary"}'.
+COLLECTORS: list = []
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+@contextmanager
+def timed(component: str, call: str):
+    """Records the duration of the block under `call_duration_seconds`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        CALLS.observe((component, call), time.perf_counter() - started)
+
+
+def instrument(component: str):
+    """
+    Class decorator recording the duration of every static method of the
+    class, sync or async, under `call_duration_seconds{component, call}`.
+    Private methods and async generators are left as they are.
+    """
+
+    def decorate(cls):
+        for name, attribute in list(vars(cls).items()):
+            if isinstance(attribute, staticmethod) and not name.startswith("_"):
+                setattr(
+                    cls,
+                    name,
+                    staticmethod(_timed_function(attribute.__func__, component, name)),
+                )
+        return cls
+
+    return decorate
+
+
+def _timed_function(func, component: str, call: str):
+    key = (component, call)
+    if inspect.isasyncgenfunction(func):
+        return func
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                CALLS.observe(key, time.perf_counter() - started)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            CALLS.observe(key, time.perf_counter() - started)
+
+    return wrapper
+
+
+def render() -> str:
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    gauges = {}
+    for collect in COLLECTORS:
+        gauges.update(collect())
+    declared = set()
+    for name, value in sorted(gauges.items()):
+        base = name.split("{")[0]
+        if base not in declared:
+            declared.add(base)
+            lines.append(f"# TYPE {base} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling the stack of one thread (the event loop's)
+    every `interval` seconds from a background thread. Samples are aggregated
+    as collapsed stacks (`outer;inner;leaf count`), the input format of
+    flame graph tools.
+
+    Args:
+        interval (float): The number of seconds between samples.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: collections.Counter = collections.Counter()
+        self._thread_id: int | None = None
+        self._stop = threading.Event()
+
+    def start(self, thread_id: int | None = None) -> None:
+        self._thread_id = thread_id or threading.get_ident()
+        self._stop.clear()
+        threading.Thread(target=self._run, name="profiler", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def collapsed(self, reset: bool = True) -> str:
+        """Returns the samples taken so far as collapsed stacks, most frequent first."""
+        stacks = self.stacks
+        if reset:
+            self.stacks = collections.Counter()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(
+                    f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
@@ -0,0 +1,123 @@
+import time
+from collections import OrderedDict
+from src.utils.metrics import COLLECTORS
+from src.utils.utilities import settings
+
+
+class RateLimitBackend:
+    """
+    Interface of the token bucket stores used by `RateLimitMiddleware`.
+
+    A shared backend (for example one running a Lua script on Redis) makes
+    the limits global across workers; `LocalRateLimitBackend` keeps them per
+    worker process.
+    """
+
+    def take(self, key: str, rate: float, capacity: float) -> float:
+        """
+        Takes one token from the bucket `key`, which holds up to `capacity`
+        tokens and refills at `rate` tokens per second.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the number of seconds
+                   until one is available.
+        """
+        raise NotImplementedError
+
+
+class LocalRateLimitBackend(RateLimitBackend):
+    """
+    In-process token buckets, stored as `[tokens, updated_at, full_at]` per key.
+
+    A bucket that has refilled is the same as no bucket, so buckets are
+    dropped once full, by a sweep every `sweep_interval` seconds. At most
+    `max_keys` buckets are kept; the least recently used are dropped first,
+    which at worst hands a fresh bucket to a key under attack.
+
+    Args:
+        max_keys (int): The maximum number of buckets kept.
+        sweep_interval (float): The number of seconds between sweeps.
+    """
+
+    def __init__(self, max_keys: int, sweep_interval: float = 60):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self.rejected = 0
+        self._buckets: OrderedDict = OrderedDict()
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def take(self, key: str, rate: float, capacity: float) -> float:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = capacity
+            bucket = self._buckets[key] = [tokens, now, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+
+        if tokens < 1:
+            self.rejected += 1
+            bucket[0], bucket[1] = tokens, now
+            return (1 - tokens) / rate
+        tokens -= 1
+        bucket[0], bucket[1], bucket[2] = tokens, now, now + (capacity - tokens) / rate
+        return 0.0
+
+    def sweep(self, now: float | None = None) -> None:
+        """Drops the buckets that have refilled."""
+        now = time.monotonic() if now is None else now
+        for key in [key for key, bucket in self._buckets.items() if bucket[2] <= now]:
+            del self._buckets[key]
+        self._next_sweep = now + self.sweep_interval
+
+    def stats(self) -> dict:
+        return {"keys": len(self._buckets), "rejected": self.rejected}
+
+
+class RateLimiter:
+    """
+    Token bucket limits of the login and registration endpoints.
+
+    Replace `BACKEND` (for example with a shared backend in multi-worker
+    deployments) through `set_backend`.
+    """
+
+    BACKEND: RateLimitBackend = LocalRateLimitBackend(
+        max_keys=settings.RATE_LIMIT_MAX_KEYS
+    )
+
+    @staticmethod
+    def check_ip(ip: str) -> float:
+        return RateLimiter.BACKEND.take(
+            f"ip:{ip}", settings.RATE_LIMIT_IP_RATE, settings.RATE_LIMIT_IP_BURST
+        )
+
+    @staticmethod
+    def check_username(username: str) -> float:
+        return RateLimiter.BACKEND.take(
+            f"user:{username.lower()}",
+            settings.RATE_LIMIT_USER_RATE,
+            settings.RATE_LIMIT_USER_BURST,
+        )
+
+    @staticmethod
+    def set_backend(backend: RateLimitBackend) -> None:
+        RateLimiter.BACKEND = backend
+
+
+def ratelimit_stats() -> dict:
+    """Returns the counters of `RateLimiter.BACKEND`, when it keeps them."""
+    if not hasattr(RateLimiter.BACKEND, "stats"):
+        return {}
+    return {
+        f"ratelimit_{key}": value for key, value in RateLimiter.BACKEND.stats().items()
+    }
+
+
+COLLECTORS.append(ratelimit_stats)
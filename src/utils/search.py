@@ -0,0 +1,95 @@
+import hashlib
+import hmac
+import re
+from src.utils.utilities import settings
+
+WORD_RE = re.compile(r"\w+")
+MAX_WORD_LENGTH = 64
+
+# Keyed hashes stand in for the words of a note, so the index reveals neither
+# the words nor, since the user id is part of the message, which users share them.
+# The key must outlive Fernet key rotations, so it isn't derived from SECRET_FERNET.
+SEARCH_KEY: bytes = hashlib.sha256(
+    (settings.SEARCH_KEY or f"search:{settings.SECRET_KEY}").encode("utf-8")
+).digest()
+
+
+def words(text: str) -> set[str]:
+    """
+    Splits a text into its distinct, case-folded words.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        set[str]: The words, without the ones longer than `MAX_WORD_LENGTH`.
+    """
+    return {
+        word.casefold()
+        for word in WORD_RE.findall(text)
+        if len(word) <= MAX_WORD_LENGTH
+    }
+
+
+def token_hash(user_id: int, kind: str, term: str) -> bytes:
+    """
+    Computes the 16-byte keyed hash stored in the index for a term.
+
+    Args:
+        user_id (int): The owner of the note, part of the hashed message.
+        kind (str): "w" for whole words, "p" for prefixes.
+        term (str): The word or prefix.
+
+    Returns:
+        bytes: The truncated HMAC-SHA256 of the term.
+    """
+    message = f"{user_id}:{kind}:{term}".encode("utf-8")
+    return hmac.new(SEARCH_KEY, message, hashlib.sha256).digest()[:16]
+
+
+def note_tokens(user_id: int, text: str) -> set[bytes]:
+    """
+    Computes the index tokens of a note: one per word plus one per prefix of
+    `SEARCH_PREFIX_MIN` to `SEARCH_PREFIX_MAX` characters.
+
+    Args:
+        user_id (int): The owner of the note.
+        text (str): The plaintext title and content of the note.
+
+    Returns:
+        set[bytes]: The distinct tokens of the note.
+    """
+    tokens = set()
+    for word in words(text):
+        tokens.add(token_hash(user_id, "w", word))
+        longest = min(len(word), settings.SEARCH_PREFIX_MAX)
+        for length in range(settings.SEARCH_PREFIX_MIN, longest + 1):
+            tokens.add(token_hash(user_id, "p", word[:length]))
+    return tokens
+
+
+def query_tokens(user_id: int, query: str) -> set[bytes]:
+    """
+    Computes the tokens that a note must all contain to match a query.
+
+    Terms ending with `*` are prefix queries. Prefixes shorter than
+    `SEARCH_PREFIX_MIN` are ignored and longer ones are truncated to
+    `SEARCH_PREFIX_MAX` characters, so they may match slightly more notes.
+
+    Args:
+        user_id (int): The user searching their notes.
+        query (str): Space separated terms, e.g. `budget trav*`.
+
+    Returns:
+        set[bytes]: The tokens to look up; empty if the query has no usable term.
+    """
+    tokens = set()
+    for term in query.split():
+        prefix = term.endswith("*")
+        for word in words(term):
+            if not prefix:
+                tokens.add(token_hash(user_id, "w", word))
+            elif len(word) >= settings.SEARCH_PREFIX_MIN:
+                word = word[: settings.SEARCH_PREFIX_MAX]
+                tokens.add(token_hash(user_id, "p", word))
+    return tokens
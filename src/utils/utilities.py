@@ -1,56 +1,448 @@
-from passlib.context import CryptContext
+import asyncio
+import functools
+import hashlib
+import hmac
+import secrets
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 import jwt
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
 from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
 from fastapi import HTTPException, status
 from src.settings import Settings
-
-TEMPLATES = Jinja2Templates(directory="src/static/templates")
+from src.utils.metrics import COLLECTORS, instrument, timed
 
 settings = Settings()
 
 
+class TimedTemplate(Template):
+    """Template recording its render time under `call_duration_seconds`."""
+
+    def render(self, *args, **kwargs) -> str:
+        with timed("template", self.name):
+            return super().render(*args, **kwargs)
+
+# Compiled templates are kept in memory and their bytecode on disk, so new
+# workers skip compiling them. Changed templates are only picked up with
+# TEMPLATE_AUTO_RELOAD.
+TEMPLATES = Jinja2Templates(
+    env=Environment(
+        loader=FileSystemLoader("src/static/templates"),
+        autoescape=True,
+        auto_reload=settings.TEMPLATE_AUTO_RELOAD,
+        bytecode_cache=FileSystemBytecodeCache(settings.TEMPLATE_CACHE_DIR),
+    )
+)
+TEMPLATES.env.template_class = TimedTemplate
+
+
+class RevokedTokens:
+    """
+    In-process set of revoked token ids (`jti`), each kept until the token
+    would have expired anyway, plus a per-user cutoff that revokes every token
+    issued before it. Lookups are dictionary hits.
+
+    The pair issued by each refresh is also kept for `REFRESH_REUSE_GRACE`
+    seconds under the `jti` of the refresh token it replaced, so concurrent
+    requests presenting that token get the same pair instead of being taken
+    for a stolen token being replayed.
+
+    Each worker keeps its own set; multi-worker deployments need a shared
+    store to make a revocation visible to all of them.
+    """
+
+    TOKENS: dict[str, float] = {}
+    USERS: dict[int, int] = {}
+    ROTATED: dict[str, tuple[float, str, tuple[str, str]]] = {}
+
+    @staticmethod
+    def revoke(claims: dict) -> None:
+        RevokedTokens.TOKENS[claims["jti"]] = claims["exp"]
+        if len(RevokedTokens.TOKENS) % 1024 == 0:
+            RevokedTokens.purge()
+
+    @staticmethod
+    def revoke_user(user_id: int) -> None:
+        # Whole seconds, like the `iat` claim it is compared with.
+        RevokedTokens.USERS[user_id] = int(time.time())
+
+    @staticmethod
+    def is_revoked(claims: dict) -> bool:
+        if claims["jti"] in RevokedTokens.TOKENS:
+            return True
+        cutoff = RevokedTokens.USERS.get(claims["uid"])
+        return cutoff is not None and claims["iat"] < cutoff
+
+    @staticmethod
+    def rotate(claims: dict, tokens: tuple[str, str], successor: str) -> None:
+        """
+        Revokes a refresh token, remembering the pair that replaced it.
+
+        Args:
+            claims (dict): The claims of the refresh token.
+            tokens (tuple[str, str]): The new access and refresh tokens.
+            successor (str): The `jti` of the new refresh token.
+        """
+        RevokedTokens.revoke(claims)
+        expires = time.time() + settings.REFRESH_REUSE_GRACE
+        RevokedTokens.ROTATED[claims["jti"]] = (expires, successor, tokens)
+
+    @staticmethod
+    def rotated(jti: str) -> tuple[str, str] | None:
+        """
+        Returns the pair that replaced a refresh token less than
+        `REFRESH_REUSE_GRACE` seconds ago, unless that pair was revoked since.
+        """
+        entry = RevokedTokens.ROTATED.get(jti)
+        if entry is None or entry[0] < time.time():
+            return None
+        _, successor, tokens = entry
+        if successor in RevokedTokens.TOKENS:
+            return None
+        return tokens
+
+    @staticmethod
+    def purge() -> None:
+        """Forgets the revoked tokens that have expired."""
+        now = time.time()
+        for jti, exp in list(RevokedTokens.TOKENS.items()):
+            if exp < now:
+                del RevokedTokens.TOKENS[jti]
+        for jti, (expires, _, _) in list(RevokedTokens.ROTATED.items()):
+            if expires < now:
+                del RevokedTokens.ROTATED[jti]
+
+
+@instrument("jwt")
 class JWTUtility:
+    # Claims every token must carry, see `create_jwt`.
+    REQUIRED_CLAIMS: list[str] = ["sub", "uid", "typ", "jti", "iat", "exp"]
+
     @staticmethod
-    def create_jwt(data: dict) -> str:
+    def create_jwt(data: dict, expires_in: float | None = None) -> str:
+        """
+        Signs `data` as a JWT that expires after `expires_in` seconds
+        (`ACCESS_TOKEN_TTL` by default), adding `iat`, `exp`, a unique `jti`
+        and, unless given, `typ="access"`.
+        """
+        now = int(time.time())
+        ttl = settings.ACCESS_TOKEN_TTL if expires_in is None else expires_in
+        payload = {
+            "typ": "access",
+            **data,
+            "jti": secrets.token_urlsafe(16),
+            "iat": now,
+            "exp": now + int(ttl),
+        }
         return jwt.encode(
-            payload=data, key=settings.SECRET_KEY, algorithm=settings.ALGORITHM
+            payload=payload, key=settings.SECRET_KEY, algorithm=settings.ALGORITHM
+        )
+
+    @staticmethod
+    def create_tokens(username: str, user_id: int) -> tuple[str, str]:
+        """Returns a new access token and refresh token for a user."""
+        claims = {"sub": username, "uid": user_id}
+        return (
+            JWTUtility.create_jwt(claims),
+            JWTUtility.create_jwt(
+                claims | {"typ": "refresh"}, expires_in=settings.REFRESH_TOKEN_TTL
+            ),
         )
 
     @staticmethod
-    def decode_jwt(access_token: str) -> dict:
+    def decode_jwt(access_token: str, token_type: str = "access") -> dict:
         try:
-            return jwt.decode(
-                jwt=access_token, key=settings.SECRET_KEY, algorithms=settings.ALGORITHM
+            claims = jwt.decode(
+                jwt=access_token,
+                key=settings.SECRET_KEY,
+                algorithms=settings.ALGORITHM,
+                options={"require": JWTUtility.REQUIRED_CLAIMS},
             )
-        except jwt.PyJWKError:
+        except jwt.PyJWTError:
+            claims = None
+        if (
+            claims is None
+            or claims["typ"] != token_type
+            or RevokedTokens.is_revoked(claims)
+        ):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired token",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        return claims
 
+    @staticmethod
+    def refresh(refresh_token: str) -> tuple[str, str]:
+        """
+        Exchanges a refresh token for a new access and refresh token pair.
+
+        The refresh token is revoked, so it can only be used once. Within
+        `REFRESH_REUSE_GRACE` seconds it returns the pair it was exchanged
+        for again, as concurrent requests of one page all present it. If a
+        revoked refresh token is presented later it was probably stolen, and
+        every token of its user is revoked.
+        """
+        try:
+            claims = JWTUtility.decode_jwt(refresh_token, token_type="refresh")
+        except HTTPException:
+            reused = JWTUtility._revoked_refresh_claims(refresh_token)
+            if reused is not None:
+                tokens = RevokedTokens.rotated(reused["jti"])
+                if tokens is not None:
+                    return tokens
+                RevokedTokens.revoke_user(reused["uid"])
+            raise
+        tokens = JWTUtility.create_tokens(claims["sub"], claims["uid"])
+        successor = jwt.decode(tokens[1], options={"verify_signature": False})["jti"]
+        RevokedTokens.rotate(claims, tokens, successor)
+        return tokens
 
+    @staticmethod
+    def _revoked_refresh_claims(refresh_token: str) -> dict | None:
+        try:
+            claims = jwt.decode(
+                jwt=refresh_token,
+                key=settings.SECRET_KEY,
+                algorithms=settings.ALGORITHM,
+                options={"require": JWTUtility.REQUIRED_CLAIMS},
+            )
+        except jwt.PyJWTError:
+            return None
+        if claims["typ"] == "refresh" and claims["jti"] in RevokedTokens.TOKENS:
+            return claims
+        return None
+
+
+@instrument("fernet")
 class FernetUtility:
-    cypher: Fernet = Fernet(key=settings.SECRET_FERNET)
+    # Encrypts with the first key of SECRET_FERNET and decrypts with any of them,
+    # so a new key can be put in front while `python -m src.db.reencrypt` runs.
+    KEYS: list[str] = [key.strip() for key in settings.SECRET_FERNET.split(",")]
+    cypher: MultiFernet = MultiFernet([Fernet(key=key) for key in KEYS])
+    # Keyed, so stored hashes can't be matched against guessed contents.
+    HASH_KEY: bytes = hashlib.sha256(f"content:{settings.SECRET_KEY}".encode()).digest()
+
+    # Payloads starting with 0xFF carry a codec byte after it. Any other payload
+    # is the note's plain UTF-8, as in older rows: 0xFF never occurs in UTF-8,
+    # so no note, whatever its first character, can be mistaken for a header.
+    HEADER: bytes = b"\xff"
+    ZLIB: bytes = b"\xff\x01"
+    # Keeps large batches off the event loop. Chunks decrypt in parallel as far
+    # as the native AES and HMAC code runs without the GIL.
+    DECRYPT_EXECUTOR: ThreadPoolExecutor = ThreadPoolExecutor(
+        max_workers=settings.DECRYPT_POOL_SIZE, thread_name_prefix="fernet"
+    )
 
     @staticmethod
     def fernet_crypt(data: str) -> bytes:
-        return FernetUtility.cypher.encrypt(data.encode("utf-8"))
+        return FernetUtility.cypher.encrypt(FernetUtility.pack(data))
 
     @staticmethod
     def fernet_decrypt(data: bytes) -> str:
-        bytes_text: bytes = FernetUtility.cypher.decrypt(data)
+        bytes_text: bytes = FernetUtility.unpack(FernetUtility.cypher.decrypt(data))
         return bytes_text.decode("utf-8")
 
+    @staticmethod
+    def fernet_decrypt_many(data: list[bytes]) -> list[str]:
+        """
+        Decrypts a batch of tokens, splitting large batches across
+        `DECRYPT_EXECUTOR`. Results are in the same order as `data`.
+        """
+        if len(data) <= settings.DECRYPT_CHUNK_SIZE:
+            return [FernetUtility.fernet_decrypt(token) for token in data]
+        futures = [
+            FernetUtility.DECRYPT_EXECUTOR.submit(FernetUtility._decrypt_chunk, chunk)
+            for chunk in FernetUtility._chunks(data)
+        ]
+        return [text for future in futures for text in future.result()]
+
+    @staticmethod
+    async def fernet_decrypt_stream(data: list[bytes]):
+        """
+        Decrypts a batch of tokens on `DECRYPT_EXECUTOR` without blocking the
+        event loop, yielding `(index, text)` pairs as each chunk finishes.
+        """
+        loop = asyncio.get_running_loop()
+        tasks = [
+            loop.run_in_executor(
+                FernetUtility.DECRYPT_EXECUTOR, FernetUtility._decrypt_chunk, chunk
+            )
+            for chunk in FernetUtility._chunks(data)
+        ]
+        offsets = {
+            task: i * settings.DECRYPT_CHUNK_SIZE for i, task in enumerate(tasks)
+        }
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                for i, text in enumerate(task.result(), start=offsets[task]):
+                    yield i, text
+
+    @staticmethod
+    async def fernet_decrypt_batch(data: list[bytes]) -> list[str]:
+        """
+        Decrypts a batch of tokens off the event loop, in the order of `data`.
+        Batches of up to `DECRYPT_CHUNK_SIZE` tokens are decrypted inline.
+        """
+        if len(data) <= settings.DECRYPT_CHUNK_SIZE:
+            return [FernetUtility.fernet_decrypt(token) for token in data]
+        texts: list[str] = [""] * len(data)
+        async for i, text in FernetUtility.fernet_decrypt_stream(data):
+            texts[i] = text
+        return texts
+
+    @staticmethod
+    def _chunks(data: list[bytes]) -> list[list[bytes]]:
+        size = settings.DECRYPT_CHUNK_SIZE
+        return [data[i : i + size] for i in range(0, len(data), size)]
+
+    @staticmethod
+    def _decrypt_chunk(chunk: list[bytes]) -> list[str]:
+        return [FernetUtility.fernet_decrypt(token) for token in chunk]
+
+    @staticmethod
+    def pack(data: str) -> bytes:
+        """
+        Encodes a note, compressed with zlib if `NOTE_COMPRESSION` is set and
+        that makes it smaller.
+        """
+        raw = data.encode("utf-8")
+        if (
+            settings.NOTE_COMPRESSION
+            and len(raw) >= settings.NOTE_COMPRESSION_MIN_BYTES
+        ):
+            compressed = zlib.compress(raw, settings.NOTE_COMPRESSION_LEVEL)
+            if len(compressed) + len(FernetUtility.ZLIB) < len(raw):
+                return FernetUtility.ZLIB + compressed
+        return raw
+
+    @staticmethod
+    def unpack(payload: bytes) -> bytes:
+        """Returns the UTF-8 bytes of a payload written by `pack`."""
+        if not payload.startswith(FernetUtility.HEADER):
+            return payload
+        header, body = payload[:2], payload[2:]
+        if header == FernetUtility.ZLIB:
+            return zlib.decompress(body)
+        raise ValueError(f"Unknown note payload format {header!r}")
+
+    @staticmethod
+    def delta_crypt(delta: bytes) -> bytes:
+        """Encrypts a revision delta (see `src.utils.delta`), compressed with zlib."""
+        return FernetUtility.cypher.encrypt(zlib.compress(delta))
+
+    @staticmethod
+    def delta_decrypt(token: bytes) -> bytes:
+        return zlib.decompress(FernetUtility.cypher.decrypt(token))
+
+    @staticmethod
+    def content_hash(data: str) -> bytes:
+        return hmac.new(
+            FernetUtility.HASH_KEY, data.encode("utf-8"), hashlib.sha256
+        ).digest()
 
+
+@instrument("pwd")
 class PWD:
-    PWD_CONTEXT: CryptContext = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    # bcrypt releases the GIL, so a thread pool keeps it off the event loop
+    # without the pickling overhead of a process pool.
+    EXECUTOR: ThreadPoolExecutor = ThreadPoolExecutor(
+        max_workers=settings.PWD_POOL_SIZE, thread_name_prefix="pwd"
+    )
+    METRICS: dict = {
+        "queue_depth": 0,
+        "queue_depth_max": 0,
+        "rejected": 0,
+        "calls": 0,
+        "wait_seconds_total": 0.0,
+        "hash_seconds_total": 0.0,
+        "hash_seconds_max": 0.0,
+    }
+
+    @staticmethod
+    @functools.cache
+    def _context():
+        # Built on first use, so importing the app doesn't import passlib.
+        from passlib.context import CryptContext
+
+        return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+    @staticmethod
+    def load_backend() -> None:
+        """Loads the bcrypt backend, which the first hash would do otherwise."""
+        PWD._context().handler().get_backend()
 
     @staticmethod
     def verify_hash(password: str, hashed_password: str) -> bool:
-        return PWD.PWD_CONTEXT.verify(password, hashed_password)
+        return PWD._context().verify(password, hashed_password)
 
     @staticmethod
     def hash(secret: str) -> str:
-        return PWD.PWD_CONTEXT.hash(secret)
+        return PWD._context().hash(secret)
+
+    @staticmethod
+    async def verify_hash_async(password: str, hashed_password: str) -> bool:
+        return await PWD._run_in_pool(PWD.verify_hash, password, hashed_password)
+
+    @staticmethod
+    async def hash_async(secret: str) -> str:
+        return await PWD._run_in_pool(PWD.hash, secret)
+
+    @staticmethod
+    async def _run_in_pool(func, *args):
+        """
+        Runs a bcrypt call on `EXECUTOR`, rejecting it with a 503 once
+        `PWD_QUEUE_LIMIT` calls are already queued or running.
+        """
+        metrics = PWD.METRICS
+        if metrics["queue_depth"] >= settings.PWD_QUEUE_LIMIT:
+            metrics["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many login attempts in progress, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        # Written by the pool thread, recorded on the event loop: every metric
+        # is updated from the loop only, so concurrent calls can't lose updates.
+        timings = {}
+
+        def _timed_call():
+            timings["started"] = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                timings["finished"] = time.perf_counter()
+
+        metrics["queue_depth"] += 1
+        metrics["queue_depth_max"] = max(
+            metrics["queue_depth_max"], metrics["queue_depth"]
+        )
+        submitted = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(PWD.EXECUTOR, _timed_call)
+        finally:
+            metrics["queue_depth"] -= 1
+            metrics["calls"] += 1
+            # Missing if the caller was cancelled before the call finished.
+            if "finished" in timings:
+                elapsed = timings["finished"] - timings["started"]
+                metrics["hash_seconds_total"] += elapsed
+                metrics["hash_seconds_max"] = max(metrics["hash_seconds_max"], elapsed)
+                metrics["wait_seconds_total"] += timings["started"] - submitted
+
+
+COLLECTORS.append(
+    lambda: {f"pwd_{name}": value for name, value in PWD.METRICS.items()}
+    | {
+        "jwt_revoked_tokens": len(RevokedTokens.TOKENS),
+        "jwt_revoked_users": len(RevokedTokens.USERS),
+    }
+)
@@ -0,0 +1,42 @@
+"""
+Shared fixtures. The settings are read when `src` is first imported, so the
+environment is set here, before any test module imports it: the tests run on
+a throwaway SQLite database with rate limiting off.
+"""
+
+import os
+import tempfile
+import uuid
+from cryptography.fernet import Fernet
+
+TEST_DIR = tempfile.mkdtemp(prefix="pn-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DIR}/test.db"
+os.environ["ATTACHMENT_DIR"] = f"{TEST_DIR}/attachments"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("SECRET_FERNET", Fernet.generate_key().decode())
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+from src.main import app  # noqa: E402
+from src.db.database import ENGINE, create_db_and_tables  # noqa: E402
+from src.db.models import UserDb  # noqa: E402
+
+create_db_and_tables()
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def user() -> UserDb:
+    """A new user, stored without hashing a password."""
+    with Session(ENGINE, expire_on_commit=False) as session:
+        user = UserDb(username=f"user-{uuid.uuid4().hex[:12]}", password="unused")
+        session.add(user)
+        session.commit()
+    return user
@@ -0,0 +1,59 @@
+import pytest
+from src.utils.utilities import JWTUtility, settings
+
+
+@pytest.fixture
+def note(client, user) -> str:
+    """The page of a new note, with the client signed in as its owner."""
+    access_token, refresh_token = JWTUtility.create_tokens(user.username, user.id)
+    response = client.post(
+        "/api/v1/notes",
+        json={"title": "files", "content": "body"},
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    assert response.status_code == 201, response.text
+    client.cookies.update(
+        {"access_token": access_token, "refresh_token": refresh_token}
+    )
+    return f"/user/home/content/note/{response.json()['id']}"
+
+
+def test_form_upload_is_streamed_into_chunks(client, note, monkeypatch):
+    monkeypatch.setattr(settings, "ATTACHMENT_CHUNK_SIZE", 1000)
+    content = bytes(range(256)) * 20
+    response = client.post(
+        f"{note}/attachments",
+        data={"before": "ignored"},
+        files={"file": ("data.bin", content, "application/x-test")},
+        follow_redirects=False,
+    )
+    assert response.status_code == 303, response.text
+    assert response.headers["location"] == note
+    page = client.get(note).text
+    link = page[page.index(f"{note}/attachments/") :].split('"')[0]
+    download = client.get(link)
+    assert download.content == content
+    assert download.headers["content-type"] == "application/x-test"
+
+
+def test_form_upload_without_a_file_is_refused(client, note):
+    response = client.post(f"{note}/attachments", files={"other": ("a", b"x")})
+    assert response.status_code == 400
+
+
+def test_oversized_uploads_are_refused_before_reading(client, note, monkeypatch):
+    monkeypatch.setattr(settings, "ATTACHMENT_MAX_BYTES", 10)
+    response = client.post(
+        f"{note}/attachments",
+        files={"file": ("big.bin", b"x" * 200_000)},
+        follow_redirects=False,
+    )
+    assert response.status_code == 413
+    token = client.cookies["access_token"]
+    note_id = note.rsplit("/", 1)[1]
+    response = client.post(
+        f"/api/v1/notes/{note_id}/attachments?filename=big.bin",
+        content=b"x" * 11,
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 413
@@ -0,0 +1,48 @@
+import io
+import zipfile
+import pytest
+from src.utils.utilities import JWTUtility, settings
+
+
+def archive(files: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def signed_in(client, user):
+    access_token, refresh_token = JWTUtility.create_tokens(user.username, user.id)
+    client.cookies.update(
+        {"access_token": access_token, "refresh_token": refresh_token}
+    )
+    return client
+
+
+def upload(client, data: bytes):
+    return client.post("/user/home/content/import", files={"file": ("notes.zip", data)})
+
+
+def test_zip_import_reads_markdown_files(signed_in):
+    data = archive({"a.md": b"# First\nbody", "b.txt": b"plain", "c.png": b"x"})
+    response = upload(signed_in, data)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"imported": 2}
+
+
+def test_zip_bombs_are_refused_before_being_inflated(signed_in, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_NOTE_MAX_BYTES", 1024 * 1024)
+    monkeypatch.setattr(settings, "BULK_ZIP_MAX_BYTES", 2 * 1024 * 1024)
+    bomb = archive({"bomb.md": bytes(50 * 1024 * 1024)})
+    assert len(bomb) < 100 * 1024
+    response = upload(signed_in, bomb)
+    assert response.status_code == 413
+
+    # Files under the per-file limit that add up to more than the total.
+    many = archive({f"{i}.md": bytes(900 * 1024) for i in range(3)})
+    response = upload(signed_in, many)
+    assert response.status_code == 413
+    # Refused before the first batch, so nothing was imported.
+    assert signed_in.get("/api/v1/notes").json()["items"] == []
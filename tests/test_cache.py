@@ -0,0 +1,61 @@
+import asyncio
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.db import database
+from src.utils import cache
+from src.utils.cache import NoteCache
+from src.utils.utilities import FernetUtility
+
+
+def test_expired_notes_are_zeroed_without_being_read(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    notes = NoteCache(max_bytes=1024, ttl=60)
+    notes.put(1, 1, {"id": 1, "title": "a", "content": "secret"})
+    buffer = notes._entries[(1, 1)][1]
+
+    now[0] += 30
+    notes.put(1, 2, {"id": 2, "title": "b", "content": "other"})
+    assert buffer == bytearray(b"secret")
+
+    now[0] += 31
+    assert notes.get(2, 9) is None
+    assert buffer == bytearray(len("secret"))
+    assert notes.stats()["expirations"] == 1
+    assert notes.stats()["bytes"] == len("other")
+    assert notes.get(1, 2)["content"] == "other"
+
+
+def test_a_read_during_an_update_does_not_cache_the_old_note(user, monkeypatch):
+    monkeypatch.setattr(database, "NOTE_CACHE", NoteCache(max_bytes=1024, ttl=60))
+    index_note = database.AsyncSearchSQL.index_note
+
+    async def read(user_id, note_id):
+        async with AsyncSession(
+            database.ASYNC_ENGINE, expire_on_commit=False
+        ) as session:
+            note = await database.AsyncDataSQL.get_content_id(
+                user_id=user_id, datadb_id=note_id, session=session
+            )
+            return note.content
+
+    async def index_then_read(user_id, note_id, text, session):
+        await index_note(user_id=user_id, note_id=note_id, text=text, session=session)
+        # Another request reads the note before the update commits.
+        assert await read(user_id, note_id) == "old"
+
+    async def scenario():
+        async with AsyncSession(
+            database.ASYNC_ENGINE, expire_on_commit=False
+        ) as session:
+            note_id = await database.AsyncDataSQL.add_data(
+                "note", FernetUtility.fernet_crypt("old"), user.id, session, "old"
+            )
+            monkeypatch.setattr(
+                database.AsyncSearchSQL, "index_note", staticmethod(index_then_read)
+            )
+            await database.AsyncDataSQL.update_data(
+                user.id, note_id, 1, "note", "new", session
+            )
+        return await read(user.id, note_id)
+
+    assert asyncio.run(scenario()) == "new"
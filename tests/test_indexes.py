@@ -0,0 +1,89 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, text
+from sqlmodel import Session, SQLModel
+from src.db import database
+from src.db.migrate import check_indexes, upgrade
+from src.db.models import DataDb, utc_now
+from src.utils.utilities import JWTUtility
+
+
+@pytest.fixture
+def queries():
+    """The SELECT statements sent by the app, with their parameters."""
+    seen = []
+
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT"):
+            seen.append((statement, parameters))
+
+    engine = database.ASYNC_ENGINE.sync_engine
+    event.listen(engine, "before_cursor_execute", capture)
+    yield seen
+    event.remove(engine, "before_cursor_execute", capture)
+
+
+def plan(queries: list, marker: str) -> str:
+    """The query plan of the last statement containing `marker`."""
+    statement, parameters = next(
+        query for query in reversed(queries) if marker in query[0]
+    )
+    with database.ENGINE.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return "\n".join(row.detail for row in rows)
+
+
+def test_listing_paging_and_search_use_their_indexes(client, user, queries):
+    access_token, _ = JWTUtility.create_tokens(user.username, user.id)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    for i in range(30):
+        note = {"title": f"note {i}", "content": "budget review"}
+        assert client.post("/api/v1/notes", json=note, headers=headers).is_success
+
+    # The index also gives the order: no sort step (TEMP B-TREE) in the plans.
+    page = client.get("/api/v1/notes?limit=10", headers=headers).json()
+    listing = plan(queries, "FROM datadb")
+    assert listing == "SEARCH datadb USING INDEX ix_datadb_user_id_id (user_id=?)"
+    cursor = page["next_cursor"]
+    client.get(f"/api/v1/notes?limit=10&after={cursor}", headers=headers)
+    paging = plan(queries, "datadb.id > ?")
+    assert (
+        paging == "SEARCH datadb USING INDEX ix_datadb_user_id_id (user_id=? AND id>?)"
+    )
+    client.get("/api/v1/search?q=budget", headers=headers)
+    search = plan(queries, "FROM datadb JOIN")
+    assert "INDEX sqlite_autoindex_searchtokendb_1 (user_id=? AND token=?)" in search
+    assert "SEARCH datadb USING INTEGER PRIMARY KEY" in search
+    client.get("/user/home", cookies={"access_token": access_token})
+    # One row read whatever the number of notes.
+    etag = plan(queries, "listing_version")
+    assert etag == "SEARCH userdb USING INTEGER PRIMARY KEY (rowid=?)"
+
+
+def test_migrated_schema_serves_the_checked_queries(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/migrated.db")
+    SQLModel.metadata.create_all(engine)
+    upgrade(engine)
+    report = check_indexes(engine)
+    assert all(result["ok"] for result in report.values()), report
+
+
+def test_backfilled_timestamps_match_the_ones_the_app_writes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    upgrade(engine, target=1)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO userdb VALUES (1, 'legacy', 'x')"))
+        connection.execute(text("INSERT INTO datadb VALUES (1, 'old', x'00', 1)"))
+    upgrade(engine)
+    with Session(engine) as session:
+        session.add(DataDb(title="new", content=b"\x00", user_id=1))
+        session.commit()
+    with engine.connect() as connection:
+        rows = connection.execute(
+            text("SELECT updated_at, created_at FROM datadb ORDER BY id")
+        ).all()
+    (old, old_created), (new, _) = rows
+    # Same UTC clock and the same text format, so they sort as they were written.
+    assert len(old) == len(new) and old == old_created
+    assert old <= new
+    assert abs(datetime.fromisoformat(old) - utc_now()) < timedelta(minutes=1)
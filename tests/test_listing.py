@@ -0,0 +1,46 @@
+from src.utils.assets import STATIC_ASSETS
+from src.utils.utilities import JWTUtility
+
+
+def test_homepage_etag_changes_with_every_note_write(client, user):
+    access_token, refresh_token = JWTUtility.create_tokens(user.username, user.id)
+    client.cookies.update(
+        {"access_token": access_token, "refresh_token": refresh_token}
+    )
+    headers = {"Authorization": f"Bearer {access_token}"}
+    etags = [client.get("/user/home").headers["etag"]]
+    response = client.get("/user/home", headers={"If-None-Match": etags[0]})
+    assert response.status_code == 304
+
+    note = client.post(
+        "/api/v1/notes", json={"title": "note", "content": "body"}, headers=headers
+    ).json()
+    etags.append(client.get("/user/home").headers["etag"])
+    edit = {"title": "note", "content": "edited", "version": note["version"]}
+    response = client.put(f"/api/v1/notes/{note['id']}", json=edit, headers=headers)
+    assert response.status_code == 200, response.text
+    etags.append(client.get("/user/home").headers["etag"])
+    version = response.json()["version"]
+    response = client.delete(
+        f"/api/v1/notes/{note['id']}?version={version}", headers=headers
+    )
+    assert response.status_code == 204, response.text
+    etags.append(client.get("/user/home").headers["etag"])
+    assert len(set(etags)) == len(etags)
+
+
+def test_static_assets_honour_the_accept_encoding_q_values(client):
+    path = next(p for p, a in STATIC_ASSETS.assets.items() if "gzip" in a.bodies)
+    url = STATIC_ASSETS.url(path)
+
+    def coding(accept_encoding: str) -> str | None:
+        response = client.get(url, headers={"Accept-Encoding": accept_encoding})
+        assert response.status_code == 200
+        return response.headers.get("content-encoding")
+
+    assert coding("gzip") == "gzip"
+    assert coding("gzip;q=0") is None
+    assert coding("gzip; q=0.0, identity") is None
+    assert coding("br;q=0, *") == "gzip"
+    assert coding("*;q=0") is None
+    assert coding("deflate") is None
@@ -0,0 +1,38 @@
+import threading
+from src.utils.metrics import Histogram
+from src.utils.utilities import settings
+
+
+def test_metrics_are_off_by_default(client):
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics/profile").status_code == 404
+
+
+def test_metrics_need_an_allowed_ip_or_the_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_ENABLED", True)
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 403
+    response = client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 403
+    response = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert "http_request_duration_seconds" in response.text
+    # The test client connects from the "testclient" host.
+    monkeypatch.setattr(settings, "METRICS_ALLOWED_IPS", "10.0.0.1, testclient")
+    assert client.get("/metrics").status_code == 200
+
+
+def test_histogram_observations_from_threads_are_all_counted():
+    histogram = Histogram("test_seconds", "Test.", ("call",))
+
+    def observe():
+        for _ in range(20_000):
+            histogram.observe(("x",), 0.001)
+
+    threads = [threading.Thread(target=observe) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert histogram.series[("x",)][-2] == 160_000
+    assert sum(histogram.series[("x",)][:-2]) == 160_000
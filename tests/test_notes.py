@@ -0,0 +1,21 @@
+import pytest
+from src.utils.utilities import FernetUtility, settings
+
+
+@pytest.mark.parametrize(
+    "note", ["", "plain", "\x00\x01not zlib", "\x00\x00kept whole", "\x00", "é" * 500]
+)
+def test_legacy_rows_starting_with_any_character_still_decrypt(note):
+    # Rows written before compression are the encrypted UTF-8 of the note.
+    legacy = FernetUtility.cypher.encrypt(note.encode("utf-8"))
+    assert FernetUtility.fernet_decrypt(legacy) == note
+
+
+@pytest.mark.parametrize("compression", [False, True])
+def test_notes_round_trip_with_and_without_compression(compression, monkeypatch):
+    monkeypatch.setattr(settings, "NOTE_COMPRESSION", compression)
+    monkeypatch.setattr(settings, "NOTE_COMPRESSION_MIN_BYTES", 0)
+    for note in ["\x00\x01" + "a" * 1000, "\x00", "short", "ü" * 1000]:
+        assert FernetUtility.fernet_decrypt(FernetUtility.fernet_crypt(note)) == note
+    payload = FernetUtility.pack("a" * 1000)
+    assert payload.startswith(FernetUtility.ZLIB) == compression
@@ -0,0 +1,20 @@
+import asyncio
+import time
+from src.utils.utilities import PWD, settings
+
+
+def test_concurrent_pool_calls_are_all_recorded(monkeypatch):
+    metrics = dict.fromkeys(PWD.METRICS, 0)
+    monkeypatch.setattr(PWD, "METRICS", metrics)
+    monkeypatch.setattr(settings, "PWD_QUEUE_LIMIT", 100)
+
+    async def calls():
+        return await asyncio.gather(
+            *(PWD._run_in_pool(time.sleep, 0.01) for _ in range(40))
+        )
+
+    asyncio.run(calls())
+    assert metrics["calls"] == 40
+    assert metrics["queue_depth"] == 0
+    assert metrics["hash_seconds_total"] >= 40 * 0.01
+    assert 0.01 <= metrics["hash_seconds_max"] < metrics["hash_seconds_total"]
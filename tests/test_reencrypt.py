@@ -0,0 +1,41 @@
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine, event, insert, select
+from sqlmodel import SQLModel
+from src.db.models import DataDb, UserDb
+from src.db.reencrypt import reencrypt
+
+
+def test_rows_edited_during_a_batch_are_reencrypted(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/reencrypt.db")
+    SQLModel.metadata.create_all(engine)
+    old_key, new_key = Fernet.generate_key(), Fernet.generate_key()
+    with engine.begin() as connection:
+        connection.execute(insert(UserDb), {"id": 1, "username": "a", "password": "-"})
+        connection.execute(
+            insert(DataDb),
+            [
+                {"title": f"note {i}", "content": Fernet(old_key).encrypt(b"text")}
+                | {"user_id": 1}
+                for i in range(5)
+            ],
+        )
+    edited = []
+
+    # A title-only edit committed between the read and the write of the batch:
+    # it bumps the version but keeps the old ciphertext.
+    @event.listens_for(engine, "before_cursor_execute")
+    def edit_title(connection, cursor, statement, parameters, context, executemany):
+        if executemany and statement.startswith("UPDATE datadb") and not edited:
+            edited.append(True)
+            cursor.execute(
+                "UPDATE datadb SET title = 'edited', version = version + 1 WHERE id = 3"
+            )
+
+    summary = reencrypt(
+        engine, [new_key.decode(), old_key.decode()], workers=1, report=lambda _: None
+    )
+    assert summary["rotated"] == 5 and summary["retried"] == 1
+    with engine.connect() as connection:
+        rows = connection.execute(select(DataDb.title, DataDb.content)).all()
+    assert "edited" in [row.title for row in rows]
+    assert all(Fernet(new_key).decrypt(row.content) == b"text" for row in rows)
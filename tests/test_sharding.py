@@ -0,0 +1,197 @@
+import asyncio
+import httpx
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.main import app
+from src.db import database
+from src.db.database import AsyncUserSQL, engine_options, to_async_url
+from src.db.models import DataDb, ShardDirectoryDb, UserDb
+from src.db.shards import (
+    Shard,
+    ShardedSession,
+    ShardRouter,
+    move_user,
+    prepare,
+    set_entry,
+)
+from src.utils.cache import LocalCacheBackend
+from src.utils.utilities import JWTUtility, settings
+
+USERNAMES = [f"user{i}" for i in range(12)]
+
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    """Three SQLite shards, shard 0 standing in for the application's database."""
+    shards = []
+    for index in range(3):
+        url = f"sqlite:///{tmp_path}/shard{index}.db"
+        engine = create_async_engine(to_async_url(url), **engine_options(url))
+        shards.append(
+            Shard(index, create_engine(url, **engine_options(url)), engine, engine)
+        )
+    monkeypatch.setattr(database, "ENGINE", shards[0].engine)
+    monkeypatch.setattr(database, "ASYNC_ENGINE", shards[0].async_engine)
+    monkeypatch.setattr(database, "ASYNC_READ_ENGINE", shards[0].async_engine)
+    monkeypatch.setattr(ShardRouter, "DIRECTORY", LocalCacheBackend(100, ttl=0.05))
+    original = ShardRouter.SHARDS
+    ShardRouter.configure(shards)
+    prepare(shards)
+    yield shards
+    ShardRouter.configure(original)
+    for shard in shards:
+        shard.engine.dispose()
+
+
+async def create_user(username: str) -> dict:
+    # Each call runs in its own task, so its route doesn't leak to the others.
+    async with AsyncSession(
+        database.ASYNC_ENGINE, expire_on_commit=False, sync_session_class=ShardedSession
+    ) as session:
+        user = await AsyncUserSQL.add_user(username, "unused", session)
+    access_token, _ = JWTUtility.create_tokens(user.username, user.id)
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+async def populate(client, notes: int = 2) -> dict:
+    """Creates the users of `USERNAMES` with `notes` notes each."""
+    tasks = (asyncio.ensure_future(create_user(name)) for name in USERNAMES)
+    headers = dict(zip(USERNAMES, await asyncio.gather(*tasks)))
+    for username in USERNAMES:
+        for i in range(notes):
+            response = await client.post(
+                "/api/v1/notes",
+                json={"title": f"{username} {i}", "content": "text"},
+                headers=headers[username],
+            )
+            assert response.status_code == 201, response.text
+    return headers
+
+
+def run(scenario):
+    async def main():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            try:
+                await scenario(client)
+            finally:
+                for shard in ShardRouter.SHARDS:
+                    await shard.async_engine.dispose()
+
+    asyncio.run(main())
+
+
+def rows(shard: Shard, statement) -> list:
+    with shard.engine.connect() as connection:
+        return connection.execute(statement).all()
+
+
+def test_users_and_their_notes_live_on_the_shard_of_their_hash(shards):
+    async def scenario(client):
+        headers = await populate(client)
+        for username in USERNAMES:
+            response = await client.get("/api/v1/notes", headers=headers[username])
+            titles = {item["title"] for item in response.json()["items"]}
+            assert titles == {f"{username} 0", f"{username} 1"}
+
+    run(scenario)
+    placements = {}
+    for shard in shards:
+        for (username,) in rows(shard, select(UserDb.username)):
+            placements[username] = shard.index
+        for (title,) in rows(shard, select(DataDb.title)):
+            assert placements[title.split()[0]] == shard.index
+    assert placements == {name: ShardRouter.hash_shard(name) for name in USERNAMES}
+    assert len(set(placements.values())) > 1
+
+
+def test_ids_are_unique_across_shards(shards):
+    run(populate)
+    ids = {"users": [], "notes": []}
+    for shard in shards:
+        for key, model in (("users", UserDb), ("notes", DataDb)):
+            shard_ids = [row.id for row in rows(shard, select(model.id))]
+            assert all(
+                id % settings.SHARD_ID_STRIDE == shard.index + 1 for id in shard_ids
+            )
+            ids[key] += shard_ids
+    assert len(ids["notes"]) == len(set(ids["notes"])) == 2 * len(USERNAMES)
+    assert len(ids["users"]) == len(set(ids["users"])) == len(USERNAMES)
+
+
+def test_writes_are_refused_while_a_user_is_moved(shards):
+    username = USERNAMES[0]
+    source = ShardRouter.hash_shard(username)
+    # Another user of the same shard, who isn't moved.
+    other = next(n for n in USERNAMES[1:] if ShardRouter.hash_shard(n) == source)
+    new_note = {"title": "t", "content": "new"}
+
+    async def scenario(client):
+        headers = await populate(client)
+        listing = await client.get("/api/v1/notes", headers=headers[username])
+        note_id = listing.json()["items"][0]["id"]
+        set_entry(username, source, moving_to=(source + 1) % len(shards))
+        ShardRouter.DIRECTORY.clear()
+
+        response = await client.get(
+            f"/api/v1/notes/{note_id}", headers=headers[username]
+        )
+        assert response.status_code == 200
+        response = await client.put(
+            f"/api/v1/notes/{note_id}",
+            json={"title": "t", "content": "edited", "version": 1},
+            headers=headers[username],
+        )
+        assert response.status_code == 503
+        assert response.headers["Retry-After"]
+        response = await client.post(
+            "/api/v1/notes", json=new_note, headers=headers[username]
+        )
+        assert response.status_code == 503
+        response = await client.post(
+            "/api/v1/notes", json=new_note, headers=headers[other]
+        )
+        assert response.status_code == 201
+
+    run(scenario)
+
+
+def test_move_copies_the_user_switches_the_directory_and_cleans_up(shards):
+    username = USERNAMES[0]
+    source = ShardRouter.hash_shard(username)
+    target = (source + 1) % len(shards)
+
+    async def scenario(client):
+        headers = (await populate(client))[username]
+        before = (await client.get("/api/v1/notes", headers=headers)).json()["items"]
+        summary = await asyncio.to_thread(move_user, username, target, 0.1, 1)
+        assert summary["copied"]["userdb"] == 1
+        assert summary["copied"]["datadb"] == 2
+        await asyncio.sleep(0.1)
+
+        after = (await client.get("/api/v1/notes", headers=headers)).json()["items"]
+        assert after == before
+        response = await client.put(
+            f"/api/v1/notes/{before[0]['id']}",
+            json={"title": "moved", "content": "edited", "version": 1},
+            headers=headers,
+        )
+        assert response.status_code == 200
+        response = await client.post(
+            "/api/v1/notes", json={"title": "t", "content": "new"}, headers=headers
+        )
+        assert response.json()["id"] % settings.SHARD_ID_STRIDE == target + 1
+
+    run(scenario)
+    user = select(UserDb.id).where(UserDb.username == username)
+    assert rows(shards[source], user) == []
+    user_id = rows(shards[target], user)[0].id
+    notes = select(DataDb.title).where(DataDb.user_id == user_id)
+    assert rows(shards[source], notes) == []
+    assert len(rows(shards[target], notes)) == 3
+    directory = select(ShardDirectoryDb).where(ShardDirectoryDb.username == username)
+    entry = rows(shards[0], directory)[0]
+    assert (entry.shard, entry.moving_to) == (target, None)
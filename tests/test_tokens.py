@@ -0,0 +1,52 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import HTTPException
+from src.main import app
+from src.utils.utilities import JWTUtility, RevokedTokens, settings
+
+
+def expired_cookies(user) -> dict:
+    claims = {"sub": user.username, "uid": user.id}
+    _, refresh_token = JWTUtility.create_tokens(user.username, user.id)
+    return {
+        "access_token": JWTUtility.create_jwt(claims, expires_in=-1),
+        "refresh_token": refresh_token,
+    }
+
+
+async def get_home(cookies: dict) -> httpx.Response:
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test", cookies=cookies
+    ) as client:
+        return await client.get("/user/home")
+
+
+def test_concurrent_refreshes_share_the_rotated_pair(user):
+    cookies = expired_cookies(user)
+
+    async def both():
+        return await asyncio.gather(get_home(cookies), get_home(cookies))
+
+    first, second = asyncio.run(both())
+    assert first.status_code == second.status_code == 200
+    assert first.cookies["access_token"] == second.cookies["access_token"]
+    response = asyncio.run(get_home(dict(first.cookies)))
+    assert response.status_code == 200
+
+
+def test_refresh_token_reused_after_the_grace_window_revokes_the_user(
+    user, monkeypatch
+):
+    _, refresh_token = JWTUtility.create_tokens(user.username, user.id)
+    monkeypatch.setattr(settings, "REFRESH_REUSE_GRACE", -1)
+    access_token, _ = JWTUtility.refresh(refresh_token)
+    with pytest.raises(HTTPException) as error:
+        JWTUtility.refresh(refresh_token)
+    assert error.value.status_code == 401
+    # The cutoff is in whole seconds, so tokens from the same second survive.
+    cutoff = RevokedTokens.USERS[user.id]
+    claims = JWTUtility.decode_jwt(access_token)
+    assert isinstance(cutoff, int)
+    assert RevokedTokens.is_revoked(claims | {"iat": cutoff - 1})
+    assert not RevokedTokens.is_revoked(claims | {"iat": cutoff})